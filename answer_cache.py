@@ -0,0 +1,252 @@
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+from cache import snapshot_cache
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_NUMBER = re.compile(r"^[0-9]+(?:\.[0-9]+)?$")
+_STOP_WORDS = frozenset(
+    "a an the is are was what whats which who me my please show give tell can could you i of to do does "
+    "about current currently right now some any list"
+    .split()
+)
+
+# Tools called while answering the current request (see `track_tools`)
+_tools_used: ContextVar[Optional[Set[str]]] = ContextVar("tools_used", default=None)
+
+
+def track_tools() -> Set[str]:
+    """
+    Starts recording the tools called for the current request context.
+
+    Returns:
+        Set[str]: The set that `record_tools` will add tool names to.
+    """
+    tools: Set[str] = set()
+    _tools_used.set(tools)
+    return tools
+
+
+def record_tools(names: Iterable[str]) -> None:
+    """Adds the names of the tools about to be called to the current request's set."""
+    tools = _tools_used.get()
+    if tools is not None:
+        tools.update(names)
+
+
+def _stem(token: str) -> str:
+    # Crude plural folding so "stablecoins" and "stablecoin" share a term
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(prompt: str) -> Tuple[Counter, FrozenSet[str]]:
+    """Returns the term counts of a prompt (stop words removed) and the numbers it contains."""
+    terms: Counter = Counter()
+    numbers = set()
+    for token in _TOKEN.findall(prompt.lower()):
+        if _NUMBER.match(token):
+            numbers.add(token)
+        elif token not in _STOP_WORDS:
+            terms[_stem(token)] += 1
+    return terms, frozenset(numbers)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Canonical form used for exact matching: stemmed terms in order, plus numbers."""
+    return " ".join(
+        token if _NUMBER.match(token) else _stem(token)
+        for token in _TOKEN.findall(prompt.lower())
+        if token not in _STOP_WORDS
+    )
+
+
+class AnswerEntry:
+    __slots__ = ("key", "terms", "numbers", "answer", "versions", "expires_at")
+
+    def __init__(self, key: str, terms: Counter, numbers: FrozenSet[str], answer: Any,
+                 versions: Dict[str, int], expires_at: float):
+        self.key = key
+        self.terms = terms
+        self.numbers = numbers
+        self.answer = answer
+        self.versions = versions
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    """
+    Cache of final assistant answers for context-free prompts.
+
+    A prompt is matched by the hash of its normalized form first, then by
+    TF-IDF cosine similarity against the cached prompts that share a term.
+    Document frequencies are taken over every prompt looked up, not just the
+    cached ones, so qualifiers such as a chain or project name keep a high
+    weight even while the cache holds few entries. Once they cover more than
+    `max_terms` terms, only the most frequent half is kept, with halved counts.
+    Prompts only match when they mention the same numbers, so "top 5" never
+    answers "top 10". Each entry remembers the snapshot version of every
+    dataset its tools read and is dropped once any of them is replaced.
+
+    Args:
+        version_of (Callable[[str], int]): Returns the current snapshot version of a dataset key.
+        threshold (float): Minimum cosine similarity for a fuzzy hit.
+        ttl (float): Seconds an entry is kept regardless of dataset versions.
+        max_entries (int): LRU size limit.
+        max_terms (int): Size limit of the document frequency table.
+    """
+
+    def __init__(self, version_of: Callable[[str], int], threshold: float = 0.8, ttl: float = 300.0,
+                 max_entries: int = 1000, max_terms: int = 20000):
+        self.version_of = version_of
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_terms = max_terms
+        self._entries: "OrderedDict[str, AnswerEntry]" = OrderedDict()
+        self._postings: Dict[str, Set[str]] = {}
+        self._df: Counter = Counter()
+        self._documents = 0
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "invalidated": 0, "stores": 0}
+
+    @staticmethod
+    def _key(normalized: str) -> str:
+        return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+    def _valid(self, entry: AnswerEntry) -> bool:
+        if entry.expires_at <= time.time():
+            return False
+        return all(self.version_of(key) == version for key, version in entry.versions.items())
+
+    def _remove(self, entry: AnswerEntry) -> None:
+        self._entries.pop(entry.key, None)
+        for term in entry.terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.discard(entry.key)
+                if not postings:
+                    del self._postings[term]
+
+    def _count_document(self, terms: Counter) -> None:
+        self._documents += 1
+        self._df.update(terms.keys())
+        if len(self._df) > self.max_terms:
+            # Prompts are arbitrary user input: age the statistics rather than let the vocabulary grow
+            self._df = Counter({term: max(1, count // 2) for term, count in self._df.most_common(self.max_terms // 2)})
+            self._documents = max(1, self._documents // 2)
+
+    def _idf(self, term: str) -> float:
+        return math.log((self._documents + 1) / (self._df[term] + 1)) + 1.0
+
+    def _similarity(self, terms: Counter, entry: AnswerEntry) -> float:
+        """
+        TF-IDF cosine similarity, capped by the share of each side's weight
+        found in the other, so one unmatched rare term (a chain, a project)
+        is enough to reject the match.
+        """
+        query = {term: count * self._idf(term) for term, count in terms.items()}
+        cached = {term: count * self._idf(term) for term, count in entry.terms.items()}
+        dot = sum(weight * cached.get(term, 0.0) for term, weight in query.items())
+        norms = math.sqrt(sum(w * w for w in query.values())) * math.sqrt(sum(w * w for w in cached.values()))
+        if not norms:
+            return 0.0
+        query_coverage = sum(w for term, w in query.items() if term in cached) / sum(query.values())
+        cached_coverage = sum(w for term, w in cached.items() if term in query) / sum(cached.values())
+        return min(dot / norms, query_coverage, cached_coverage)
+
+    def get(self, prompt: str) -> Optional[Any]:
+        """
+        Returns the cached answer for `prompt`, or None on a miss.
+
+        Args:
+            prompt (str): The user's question.
+
+        Returns:
+            Optional[Any]: The answer stored for this prompt or a sufficiently similar one.
+        """
+        key = self._key(normalize_prompt(prompt))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._valid(entry):
+                    self._entries.move_to_end(key)
+                    self._counters["exact_hits"] += 1
+                    return entry.answer
+                self._remove(entry)
+                self._counters["invalidated"] += 1
+
+            terms, numbers = tokenize(prompt)
+            self._count_document(terms)
+            # Prompts reduced to a single term are too ambiguous to match fuzzily
+            candidates = set().union(*(self._postings.get(term, ()) for term in terms)) if len(terms) > 1 else set()
+            best, best_score = None, self.threshold
+            for candidate_key in candidates:
+                candidate = self._entries[candidate_key]
+                if candidate.numbers != numbers or len(candidate.terms) < 2:
+                    continue
+                if not self._valid(candidate):
+                    self._remove(candidate)
+                    self._counters["invalidated"] += 1
+                    continue
+                score = self._similarity(terms, candidate)
+                if score >= best_score:
+                    best, best_score = candidate, score
+            if best is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(best.key)
+            self._counters["similar_hits"] += 1
+            return best.answer
+
+    def set(self, prompt: str, answer: Any, datasets: Iterable[str] = (), ttl: Optional[float] = None) -> None:
+        """
+        Stores the answer to `prompt`.
+
+        Args:
+            prompt (str): The user's question.
+            answer (Any): The final answer.
+            datasets (Iterable[str]): Snapshot keys of the datasets the answer was built from.
+            ttl (Optional[float]): Shorter lifetime for answers built from data without a
+                snapshot version, such as search results; the cache's `ttl` if None.
+        """
+        normalized = normalize_prompt(prompt)
+        key = self._key(normalized)
+        terms, numbers = tokenize(prompt)
+        versions = {dataset: self.version_of(dataset) for dataset in datasets}
+        expires_at = time.time() + (self.ttl if ttl is None else min(ttl, self.ttl))
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._remove(existing)
+            self._entries[key] = AnswerEntry(key, terms, numbers, answer, versions, expires_at)
+            for term in terms:
+                self._postings.setdefault(term, set()).add(key)
+            self._counters["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries.values())))
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self._counters["exact_hits"] + self._counters["similar_hits"]
+        lookups = hits + self._counters["misses"]
+        return {
+            **self._counters,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "entries": len(self._entries),
+        }
+
+
+answer_cache = AnswerCache(
+    snapshot_cache.version,
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.8")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "300")),
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+)
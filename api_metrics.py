@@ -0,0 +1,38 @@
+import re
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+# Per-request tally of OpenAI API calls, keyed by "METHOD /path" with ids collapsed
+_api_calls: ContextVar[Optional[Counter]] = ContextVar("api_calls", default=None)
+
+_ID_SEGMENT = re.compile(r"/(thread|run|msg|asst|call|step)_[A-Za-z0-9]+")
+
+
+def track_api_calls() -> Counter:
+    """
+    Starts counting OpenAI API calls for the current request context.
+
+    Returns:
+        Counter: The counter that `count_api_call` hooks will update.
+    """
+    calls: Counter = Counter()
+    _api_calls.set(calls)
+    return calls
+
+
+def _record(request) -> None:
+    calls = _api_calls.get()
+    if calls is not None:
+        path = _ID_SEGMENT.sub(lambda match: f"/{{{match.group(1)}_id}}", request.url.path)
+        calls[f"{request.method} {path}"] += 1
+
+
+def count_api_call(request) -> None:
+    """httpx request hook for the sync OpenAI client."""
+    _record(request)
+
+
+async def count_api_call_async(request) -> None:
+    """httpx request hook for the async OpenAI client."""
+    _record(request)
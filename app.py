@@ -1,14 +1,101 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import  Optional
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
-from assistant import chat_with_assistant
+import json
+import logging
+import os
+import time
+from assistant import (async_client, chat_with_assistant, chat_with_assistant_async, client, get_assistant_id_async,
+                       stream_chat_with_assistant)
+from api_metrics import track_api_calls
+from answer_cache import answer_cache, track_tools
+from cache import snapshot_cache
+from http_client import upstream
+from prefetch import Prefetcher
+from run_scheduler import SchedulerSaturated, run_scheduler
+from search_cache import normalize_query, search_cache
+from shared_state import SHARED_STATE_DIR, FileLock
+from thread_store import thread_store
+from tool_registry import tool_registry
+from tools import prefetch_datasets
+from tracing import (PROFILING_ENABLED, TRACE_SLOW_MS, SamplingProfiler, configure_logging, span, stage_histogram,
+                     start_trace, trace_id_from_headers)
 load_dotenv()
 
-from openai import OpenAI
-client = OpenAI()
+configure_logging()
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Set ASYNC_PIPELINE=0 to fall back to the original blocking pipeline
+ASYNC_PIPELINE = os.getenv("ASYNC_PIPELINE", "1") != "0"
+
+# Set ANSWER_CACHE_ENABLED=1 to answer repeated questions in new conversations from the answer cache
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "0") == "1"
+
+# Set PREFETCH_ENABLED=0 to load DefiLlama datasets on demand only
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") != "0"
+
+# Seconds between attempts of a worker to take over refreshing the shared snapshots
+REFRESHER_RETRY = float(os.getenv("REFRESHER_RETRY", "15"))
+
+# Set WARMUP_ENABLED=0 to build the OpenAI clients and resolve the assistant on the first request instead
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") != "0"
+
+# Progress of the background warm-up, reported by /health/ready
+warmup = {"done": False, "seconds": None, "error": None}
+
+prefetcher = Prefetcher(snapshot_cache, prefetch_datasets())
+
+# With several workers sharing SHARED_STATE_DIR, only the holder of this lock runs the prefetcher
+refresher_lock = FileLock(os.path.join(SHARED_STATE_DIR, "refresher.lock")) if SHARED_STATE_DIR else None
+
+async def _refresh_when_elected():
+    """Starts the prefetcher once this worker holds the refresher lock, e.g. after the previous holder exited."""
+    while not refresher_lock.acquire(blocking=False):
+        await asyncio.sleep(REFRESHER_RETRY)
+    logger.info("refreshing the shared snapshots", extra={"pid": os.getpid()})
+    prefetcher.start()
+
+async def _warm_up():
+    """Builds the OpenAI clients and resolves the assistant once the server is up, retrying until it succeeds."""
+    started = time.perf_counter()
+    delay = 1.0
+    while True:
+        try:
+            # Building the first client imports the SDK; keep that off the event loop
+            await asyncio.to_thread(async_client.get)
+            await get_assistant_id_async()
+            break
+        except Exception as e:
+            warmup["error"] = str(e)
+            logger.warning("warm-up failed, retrying in %g s: %s", delay, e)
+            await asyncio.sleep(delay)
+            delay = min(60.0, delay * 2)
+    warmup.update(done=True, error=None, seconds=round(time.perf_counter() - started, 3))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep the DefiLlama snapshots warm so tool calls never wait on upstream
+    background = []
+    if PREFETCH_ENABLED:
+        if refresher_lock is None:
+            prefetcher.start()
+        else:
+            background.append(asyncio.ensure_future(_refresh_when_elected()))
+    # The port is bound without waiting for the SDK import or the assistant lookup; /health/ready tells when they are done
+    if WARMUP_ENABLED:
+        background.append(asyncio.ensure_future(_warm_up()))
+    yield
+    for task in background:
+        task.cancel()
+    await prefetcher.stop()
+    if refresher_lock is not None:
+        refresher_lock.release()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -19,20 +106,265 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Opens the request's trace, optionally profiles it, and logs one structured line once the body is sent."""
+    trace = start_trace(trace_id_from_headers(request.headers))
+    profiler = SamplingProfiler().start() if PROFILING_ENABLED and request.headers.get("x-profile") == "1" else None
+    request_span = span("request").__enter__()
+    try:
+        response = await call_next(request)
+    except BaseException as e:
+        request_span.__exit__(type(e), e, e.__traceback__)
+        raise
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    # Label by route template rather than raw path to keep the metric cardinality bounded
+    route = request.scope.get("route")
+    request_span.name = route.path if route is not None else "unmatched"
+    response.headers["X-Trace-Id"] = trace.trace_id
+    if profiler is not None:
+        response.headers["X-Profile"] = profiler.save(trace.trace_id)
+    # A streamed body (e.g. /get_information/stream) only runs once this returns
+    response.body_iterator = _finish_trace(response.body_iterator, trace, request_span, response.status_code)
+    return response
+
+async def _finish_trace(body, trace, request_span, status):
+    """Passes the response body through, then closes the request span and logs the finished request."""
+    error = None
+    try:
+        async for chunk in body:
+            yield chunk
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        request_span.__exit__(type(error) if error is not None else None, error, None)
+        duration_ms = round((time.perf_counter() - trace.started) * 1000, 1)
+        stages = {}
+        for stage, name, _, duration, _ in trace.spans:
+            if stage != "request":
+                stages[stage] = round(stages.get(stage, 0.0) + duration, 1)
+        fields = {"path": request_span.name, "status": status, "duration_ms": duration_ms, "stages": stages}
+        if duration_ms >= TRACE_SLOW_MS:
+            # Slow requests keep every span so the time can be placed precisely
+            fields["spans"] = trace.to_dict()["spans"]
+        logger.info("request finished", extra=fields)
+
 @app.get("/")
 async def read_root():
     return {"Hello": "World"}
 
+def _cache_stats():
+    return {
+        "snapshots": snapshot_cache.stats(),
+        "search": search_cache.stats(),
+        "threads": thread_store.stats(),
+        "answers": answer_cache.stats(),
+    }
+
+@app.get("/cache_stats")
+async def cache_stats():
+    # The shared stores are counted in SQLite, which may wait on another worker's lock
+    return await asyncio.to_thread(_cache_stats)
+
+@app.get("/http_stats")
+async def http_stats():
+    return upstream.stats()
+
+@app.get("/tool_stats")
+async def tool_stats():
+    return tool_registry.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of the stage latency histograms and run scheduler gauges."""
+    runs = run_scheduler.stats()
+    lines = [
+        "# TYPE app_runs_in_flight gauge",
+        f"app_runs_in_flight {runs['in_flight']}",
+        "# TYPE app_run_queue_depth gauge",
+        f"app_run_queue_depth {runs['queue_depth']}",
+        "# TYPE app_run_polls_total counter",
+        f"app_run_polls_total {runs['polls']}",
+        "# TYPE app_runs_rejected_total counter",
+        f"app_runs_rejected_total {runs['rejected'] + runs['queue_timeouts']}",
+    ]
+    return PlainTextResponse(
+        stage_histogram.render() + "\n".join(lines) + "\n",
+        media_type="text/plain; version=0.0.4",
+    )
+
+@app.get("/run_stats")
+async def run_stats():
+    return run_scheduler.stats()
+
+def _saturated(response: Response, error: SchedulerSaturated):
+    response.status_code = 429
+    response.headers["Retry-After"] = str(error.retry_after)
+    return {"error": str(error), "retry_after": error.retry_after}
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is serving requests. Never waits on OpenAI or upstream."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness(response: Response):
+    """
+    Readiness probe: the OpenAI clients are built, the assistant is resolved and,
+    when this worker runs the prefetcher, every dataset has been loaded once.
+    """
+    datasets = prefetcher.health()
+    datasets_ready = datasets["ready"] or not datasets["running"]
+    ready = (warmup["done"] or not WARMUP_ENABLED) and datasets_ready
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "warmup": warmup, "datasets_ready": datasets_ready}
+
+@app.get("/health/datasets")
+async def datasets_health(response: Response):
+    health = prefetcher.health()
+    if health["running"] and not health["ready"]:
+        response.status_code = 503
+    if snapshot_cache.shared is not None:
+        # Other workers read the snapshots the refreshing worker publishes
+        health["refresher"] = health["running"]
+        health["shared"] = snapshot_cache.shared.stats()
+    return health
+
 @app.get("/get_information")
-async def get_information(message: str, new: bool, id_thread: Optional[str] = None):
+async def get_information(message: str, new: bool, response: Response, id_thread: Optional[str] = None):
+    api_calls = track_api_calls()
+    try:
+        # Only new conversations are cached: follow-ups depend on the thread's history
+        if ANSWER_CACHE_ENABLED and new:
+            result = await _get_cached_information(message)
+        else:
+            async with run_scheduler.slot():
+                result = await _get_information(message, new, id_thread)
+    except SchedulerSaturated as e:
+        # Every run slot is busy and the queue is full: tell the client when to come back
+        return _saturated(response, e)
+    # Number of OpenAI API requests (including run polls) this request made
+    response.headers["X-OpenAI-API-Calls"] = str(sum(api_calls.values()))
+    return result
+
+async def _get_cached_information(message: str):
+    answer = answer_cache.get(message)
+    if answer is None:
+        tools_used = track_tools()
+        async with run_scheduler.slot():
+            result = await _get_information(message, True)
+        answer = result.get("response")
+        # Errors and the "No content available" placeholder are not worth replaying
+        if isinstance(answer, str) and answer != "No content available":
+            ttl = None
+            if "internet_search_tool" in tools_used:
+                # Search results have no snapshot version; expire with them (e.g. 60 s for prices)
+                ttl = search_cache.ttl_for(normalize_query(message, None)[0])
+            answer_cache.set(message, answer, tool_registry.datasets(tools_used), ttl=ttl)
+        return result
+
+    # No run is needed; the thread is seeded with the exchange so follow-ups keep their context
+    with span("thread.create"):
+        thread = await async_client.beta.threads.create(messages=[
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": answer},
+        ])
+    await thread_store.add_async(thread.id)
+    return {"id": thread.id, "response": answer, "cached": True}
+
+async def _resolve_thread(new: bool, id_thread: Optional[str] = None):
+    """Creates a thread, or looks up an existing one, calling threads.retrieve only for ids not seen before."""
+    if new:
+        with span("thread.create"):
+            thread = await async_client.beta.threads.create()
+    elif new==False and id_thread:
+        known = await thread_store.get_async(id_thread)
+        if known is not None:
+            return known
+        with span("thread.retrieve"):
+            thread = await async_client.beta.threads.retrieve(id_thread)
+    else:
+        return None
+    return await thread_store.add_async(thread.id)
+
+async def _get_information(message: str, new: bool, id_thread: Optional[str] = None):
+    if not ASYNC_PIPELINE:
+        return get_information_sync(message, new, id_thread)
+
+    thread = await _resolve_thread(new, id_thread)
+    if thread is None:
+        return {"error": "id_thread must be provided when new is False"}
+
+    return await chat_with_assistant_async(message, thread, thread.id)
+
+def get_information_sync(message: str, new: bool, id_thread: Optional[str] = None):
     if new:
-        thread = client.beta.threads.create()
+        with span("thread.create"):
+            thread = thread_store.add(client.beta.threads.create().id)
         id = thread.id
     elif new==False: 
-        thread = client.beta.threads.retrieve(id_thread)  
+        thread = thread_store.get(id_thread) if id_thread else None
+        if thread is None:
+            with span("thread.retrieve"):
+                thread = thread_store.add(client.beta.threads.retrieve(id_thread).id)
         id = thread.id
     else:
         return {"error": "id_thread must be provided when new is False"}
 
     response = chat_with_assistant(message, thread, id)
     return response
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/get_information/stream")
+async def get_information_stream(message: str, new: bool, response: Response, id_thread: Optional[str] = None):
+    """
+    Server-Sent Events version of /get_information.
+
+    Emits `thread`, then `delta` text chunks, `tool_start`/`tool_finish` around
+    tool calls, and a final `done` event carrying the time-to-first-token.
+    """
+    try:
+        await run_scheduler.acquire()
+    except SchedulerSaturated as e:
+        return _saturated(response, e)
+    admitted = time.monotonic()
+    try:
+        thread = await _resolve_thread(new, id_thread)
+    except Exception:
+        run_scheduler.release(time.monotonic() - admitted)
+        raise
+    if thread is None:
+        run_scheduler.release(time.monotonic() - admitted)
+        return {"error": "id_thread must be provided when new is False"}
+
+    async def events():
+        started = time.perf_counter()
+        first_token = None
+        yield _sse("thread", {"id": thread.id})
+        try:
+            async for event, data in stream_chat_with_assistant(message, thread.id):
+                if event == "delta" and first_token is None:
+                    first_token = time.perf_counter()
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"Error": str(e)})
+        finally:
+            # The run slot is held until the stream ends
+            run_scheduler.release(time.monotonic() - admitted)
+        yield _sse("done", {
+            "id": thread.id,
+            "ttft_ms": round((first_token - started) * 1000, 1) if first_token else None,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
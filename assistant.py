@@ -1,78 +1,87 @@
 
 from dotenv import load_dotenv
-from duckduckgo_search import DDGS
+import asyncio
+import contextvars
 import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pydantic import BaseModel, Field
 from models import *
 from tools import *
+from registration import AssistantRegistry
+from tool_registry import tool_registry
+from thread_store import thread_store
+from answer_cache import record_tools
+from serialization import fit_to_budget
+from run_scheduler import run_scheduler
+from clients import async_client, client
+from tracing import span
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-from openai import OpenAI
-client = OpenAI()
-
-
-
-
-# Register the tools with OpenAI
-assistant = client.beta.assistants.create(
-    name="Stablecoin and Internet Search Assistant",
-    instructions="You are an assistant that helps retrieve information about stablecoins, liquidity pools, and can perform internet searches. Do not assume or hallucinate and tell any on your own. Use the tools to get the information and answer the prompt.",
-    tools=[{
-        "type": "function",
-        "function": {
-            "name": "fetch_stable_coins_tool",
-            "description": "Retrieve the top stablecoins by market cap.",
-            "parameters": GetStableCoinsInput.model_json_schema()
-        }
-    }, {
-        "type": "function",
-        "function": {
-            "name": "internet_search_tool",
-            "description": '''Perform an internet search for any news or information using DuckDuckGo.
-              Use this tool to search for information on the web from reliable and good sources.
-              Only use proper and good sources realted to crypto to get the information.
-              Also use this to fetch the price of any crypto coins''',
-            "parameters": InternetSearchInput.model_json_schema()
-        }
-    }, {
-        "type": "function",
-        "function": {
-            "name": "Get_Top_Pools_by_TVL",
-            "description": "Retrieve the top liquidity pools by Total Value Locked (TVL).",
-            "parameters": GetPoolsInput.model_json_schema()
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "Get_Stable_Coins",
-            "description": "Retrieve the top stablecoins by market cap.",
-            "parameters": GetStableCoinsInput.model_json_schema()
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "Get_Stable_Coin_Prices",
-            "description": "Retrieve the prices of stablecoins such as bitcoin, doge coin etc.",
-            "parameters":  GetStableCoinsPriceInput.model_json_schema()
-        }
-    }],
-    
-    model="gpt-4o-mini",
-)
+# Tool calls within one run execute concurrently, each bounded by TOOL_TIMEOUT seconds
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "20"))
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
 
-def handle_message(message_text, thread_id):
-    message = client.beta.threads.messages.create(
-  thread_id=thread_id,
-  role="user",
-  content=message_text
-)
+# Continue the original run after submitting tool outputs instead of starting a
+# second "summarize" run; set ASSISTANT_SINGLE_RUN=0 for the previous two-run flow
+SINGLE_RUN = os.getenv("ASSISTANT_SINGLE_RUN", "1") != "0"
+MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", "5"))
+
+
+
+
+ASSISTANT_NAME = "Stablecoin and Internet Search Assistant"
+ASSISTANT_INSTRUCTIONS = "You are an assistant that helps retrieve information about stablecoins, liquidity pools, and can perform internet searches. Do not assume or hallucinate and tell any on your own. Use the tools to get the information and answer the prompt."
+ASSISTANT_MODEL = "gpt-4o-mini"
+
+# Register the tools with OpenAI on first use, reusing an assistant whose fingerprint matches.
+# The tool schemas are generated from the tools registered in tools.py at that point, not at import.
+assistant_registry = AssistantRegistry(ASSISTANT_NAME, ASSISTANT_INSTRUCTIONS, ASSISTANT_MODEL, tool_registry.schemas)
+
+
+def get_assistant_id():
+    """Returns the registered assistant id, creating or updating the assistant only when its configuration changed."""
+    return assistant_registry.get_assistant_id(client)
+
+
+async def get_assistant_id_async():
+    """Async counterpart of `get_assistant_id`; only the first call leaves the event loop."""
+    if assistant_registry.assistant_id is not None:
+        return assistant_registry.assistant_id
+    return await asyncio.to_thread(get_assistant_id)
+
+# Follow-up prompt that turns the tool output into the final answer
+SUMMARIZE_PROMPT = '''Use the tool output and try to answer the prompt as a sentence. If the information is not available, tell it. Do not mention about the tools. 
+            Imagine you are presnting the information to a user as a markdown. Mentions about the sources and url of any information at thge last of the sentance. 
+            If the source and url not available, no need to mention it
+           IMPORTANT:  Do not give it as a json or a list. It should be only a sentance.
+            
+            '''
+
+
+def _run_options(additional_instructions):
+    return {"additional_instructions": additional_instructions} if additional_instructions else {}
+
+
+def handle_message(message_text, thread_id, additional_instructions=None):
+    with span("message.create"):
+        message = client.beta.threads.messages.create(
+            thread_id=thread_id,
+            role="user",
+            content=message_text
+        )
     
-    messagerun = client.beta.threads.runs.create_and_poll(
+    # Polled by the run scheduler with adaptive backoff instead of the SDK's fixed interval
+    messagerun = run_scheduler.create_and_poll(
+    client,
     thread_id=thread_id,
-    assistant_id=assistant.id
+    assistant_id=get_assistant_id(),
+    **_run_options(additional_instructions)
 )
     
     return messagerun
@@ -82,58 +91,93 @@ def handle_message(message_text, thread_id):
 def handle_tool_execution(tool_name, parsed_arguments):
     """Executes the tool based on its name and returns the result or an error message."""
     try:
-        if tool_name == "fetch_stable_coins_tool":
-            top_m = parsed_arguments.get("top_m", 5)
-            try:
-                result = fetch_stable_coins(top_m)
-                return result
-            except Exception as e:
-                return {"Error": f"Error executing fetch_stable_coins_tool: {e}"}
+        return tool_registry.execute(tool_name, parsed_arguments)
+    except Exception as overall_exception:
+        # Log or handle the exception as needed
+        return {"Error": f"An error occurred while handling the tool '{tool_name}': {overall_exception}"}
 
-        elif tool_name == "internet_search_tool":
-            query = parsed_arguments.get("query")
-            region = parsed_arguments.get("region", "wt-wt")
-            max_results = parsed_arguments.get("max_results", 5)
-            try:
-                result = internet_search(query, region, max_results)
-                return result
-            except Exception as e:
-                return {"Error": f"Error executing internet_search_tool: {e}"}
 
-        elif tool_name == "Get_Top_Pools_by_TVL":
-            top_n = parsed_arguments.get("top_n", 5)
-            try:
-                result = get_and_display_top_pools_by_tvl(top_n)
-                return result
-            except Exception as e:
-                return {"Error": f"Error executing Get_Top_Pools_by_TVL: {e}"}
+def _run_tool_call(tool_call):
+    """Parses the arguments of one tool call, executes it and returns the result with its duration."""
+    started = time.perf_counter()
+    try:
+        parsed_arguments = json.loads(tool_call.function.arguments)
+    except ValueError as e:
+        return {"Error": f"Invalid arguments for tool '{tool_call.function.name}': {e}"}, 0.0
+    result = handle_tool_execution(tool_call.function.name, parsed_arguments)
+    return result, time.perf_counter() - started
 
-        elif tool_name == "Get_Stable_Coins":
-            top_m = parsed_arguments.get("top_m", 5)
-            try:
-                result = get_stable_coins(top_m)
-                return result
-            except Exception as e:
-                return {"Error": f"Error executing Get_Stable_Coins: {e}"}
 
-        elif tool_name == "Get_Stable_Coin_Prices":
-            try:
-                result = get_stable_coin_prices(True)
-                return result
-            except Exception as e:
-                return {"Error": f"Error executing Get_Stable_Coin_Prices: {e}"}
+def _tool_output(tool_call, result):
+    """Builds the submit_tool_outputs entry for one tool call, cut down to the tool's output budget."""
+    name = tool_call.function.name
+    # Records and models are encoded without intermediate copies
+    with span("tool.encode", name):
+        output, size = fit_to_budget(result, tool_registry.output_budget(name))
+    fitted = len(output.encode("utf-8"))
+    tool_registry.record_output(name, size, fitted)
+    if fitted < size:
+        logger.info("tool output truncated", extra={"tool": name, "bytes_before": size, "bytes_after": fitted})
+    return {
+        "tool_call_id": tool_call.id,
+        "output": output,
+    }
 
-        else:
-            return {"Error": f"Tool '{tool_name}' is not recognized."}
-    except Exception as overall_exception:
-        # Log or handle the exception as needed
-        return {"Error": f"An error occurred while handling the tool '{tool_name}': {overall_exception}"}
+
+def _log_tool_timings(timings, started):
+    if timings and logger.isEnabledFor(logging.DEBUG):
+        slowest = max(timings, key=lambda timing: timing[2])
+        logger.debug("tool calls finished", extra={
+            "tools": {tool_call_id: [name, round(elapsed * 1000, 1)] for name, tool_call_id, elapsed in timings},
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            "critical_path": slowest[0],
+        })
+
+
+def execute_tool_calls(tool_calls):
+    """
+    Executes the tool calls of one run concurrently on a bounded thread pool.
+
+    A tool that fails or exceeds its timeout (TOOL_TIMEOUT unless the tool
+    declares one) returns its {"Error": ...} output without holding back the others.
+
+    Args:
+        tool_calls: The tool calls from `required_action.submit_tool_outputs`.
+
+    Returns:
+        list: One {"tool_call_id", "output"} entry per tool call, in the order of `tool_calls`.
+    """
+    started = time.perf_counter()
+    record_tools(tool_call.function.name for tool_call in tool_calls)
+    # Each worker runs in a copy of the request context so its spans land in the request's trace
+    futures = [
+        _tool_executor.submit(contextvars.copy_context().run, _run_tool_call, tool_call) for tool_call in tool_calls
+    ]
+
+    tool_outputs = []
+    timings = []
+    for tool_call, future in zip(tool_calls, futures):
+        timeout = tool_registry.timeout(tool_call.function.name, TOOL_TIMEOUT)
+        remaining = max(0.0, started + timeout - time.perf_counter())
+        try:
+            result, elapsed = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            tool_registry.record_timeout(tool_call.function.name)
+            result, elapsed = {"Error": f"Tool '{tool_call.function.name}' timed out after {timeout:g} seconds."}, timeout
+        except Exception as e:
+            result, elapsed = {"Error": f"An error occurred while handling the tool '{tool_call.function.name}': {e}"}, time.perf_counter() - started
+        timings.append((tool_call.function.name, tool_call.id, elapsed))
+        tool_outputs.append(_tool_output(tool_call, result))
+
+    _log_tool_timings(timings, started)
+    return tool_outputs
 
 
 def submit_tool_outputs(thread_id, run_id, tool_outputs):
     """Submits the tool outputs back to the assistant and polls the result."""
     # Submit the tool outputs and poll for further updates
-    client.beta.threads.runs.submit_tool_outputs_and_poll(
+    return run_scheduler.submit_tool_outputs_and_poll(
+        client,
         thread_id=thread_id,
         run_id=run_id,
         tool_outputs=tool_outputs
@@ -143,12 +187,16 @@ def submit_tool_outputs(thread_id, run_id, tool_outputs):
 def handle_run_response(thread_id, run):
     """Handles the response of a run based on its status."""
     if run.status == 'completed':
-        # Fetch the latest message in the thread if the run is completed
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
+        # Fetch only the newest message written by this run
+        with span("message.list"):
+            messages = client.beta.threads.messages.list(thread_id=thread_id, run_id=run.id, order="desc", limit=1)
+        if not messages.data:
+            return "No content available"
         latest_message = messages.data[0]
         
         # Access the content of the latest message
         latest_message_content = latest_message.content[-1].text.value if latest_message.content else "No content available"
+        thread_store.record_reply(thread_id, latest_message.id, latest_message_content)
         return latest_message_content
 
     elif run.status == 'requires_action':
@@ -159,70 +207,300 @@ def handle_run_response(thread_id, run):
             tool_calls = required_action.submit_tool_outputs.tool_calls
             
             if tool_calls:
-                tool_outputs = []
-                # Process each tool call in the list of tool calls
-                for tool_call in tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_arguments = tool_call.function.arguments
-                    
-                    # Parse the JSON arguments into a Python dictionary
-                    parsed_arguments = json.loads(tool_arguments)
-                    
-                    try:
-                        # Execute the tool and get the result
-                        result = handle_tool_execution(tool_name, parsed_arguments)
-
-                        # Convert Pydantic model result to a dictionary if needed
-                        if isinstance(result, BaseModel):
-                            result = result.model_dump()
-
-                        # Append the tool call output to the list
-                        tool_outputs.append({
-                            "tool_call_id": tool_call.id,
-                            "output": json.dumps(result)  # Convert the result to a JSON string
-                        })
-                    
-                    except ValueError as e:
-                        print(f"Error during tool execution: {e}")
-                        return {"Error": str(e)}
+                # Run every tool call concurrently; outputs come back in tool_calls order
+                tool_outputs = execute_tool_calls(tool_calls)
 
                 # Submit all tool outputs together
                 submit_tool_outputs(thread_id, run.id, tool_outputs)
                 return tool_outputs
             else:
-                print("No tool calls found in the required action.")
+                logger.warning("run requires action without tool calls", extra={"run_id": run.id})
         else:
-            print("No tool invocation required or recognized action.")
+            logger.warning("unrecognized required action", extra={"run_id": run.id})
     else:
-        print(f"Unhandled run status: {run.status}")
+        logger.warning("unhandled run status", extra={"run_id": run.id, "status": run.status})
+
+def _tool_rounds_exhausted(run):
+    return {"Error": f"The assistant requested tools more than {MAX_TOOL_ROUNDS} times for run {run.id}."}
+
+
+def chat_with_assistant_single_run(prompt, id_thread):
+    """
+    Answers `prompt` in one run: tool outputs are submitted back to the same
+    run, which is polled through as many requires_action rounds as it needs,
+    with the answer-formatting guidance passed as `additional_instructions`.
+    """
+    id = id_thread
+    run = handle_message(prompt, thread_id=id, additional_instructions=SUMMARIZE_PROMPT)
+    rounds = 0
+    while run.status == 'requires_action' and rounds < MAX_TOOL_ROUNDS:
+        tool_outputs = execute_tool_calls(run.required_action.submit_tool_outputs.tool_calls)
+        run = submit_tool_outputs(id, run.id, tool_outputs)
+        rounds += 1
+
+    if run.status == 'requires_action':
+        client.beta.threads.runs.cancel(run.id, thread_id=id)
+        return {"id": id, "response": _tool_rounds_exhausted(run)}
+    return {"id": id, "response": handle_run_response(thread_id=id, run=run)}
+
 
 def chat_with_assistant(prompt,thread,id_thread=None):
+    if SINGLE_RUN:
+        return chat_with_assistant_single_run(prompt, id_thread)
 
     id = id_thread
     messagerun = handle_message(prompt, thread_id=id)
-    print("hello")
     if messagerun.status == 'requires_action':
         response = handle_run_response(run=messagerun, thread_id=id)
 
         # Retrieve runInfo only if a thread object exists
         if thread:
             runInfo = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=messagerun.id)
-            print(runInfo)
+            logger.debug("first run finished", extra={"run_id": runInfo.id, "status": runInfo.status})
             if runInfo.completed_at is None:
                 client.beta.threads.runs.cancel(messagerun.id, thread_id=id)
-        print("hi")
         thread = None
-        messagerun_output = handle_message(
-            '''Use the tool output and try to answer the prompt as a sentence. If the information is not available, tell it. Do not mention about the tools. 
-            Imagine you are presnting the information to a user as a markdown. Mentions about the sources and url of any information at thge last of the sentance. 
-            If the source and url not available, no need to mention it
-           IMPORTANT:  Do not give it as a json or a list. It should be only a sentance.
-            
-            ''',
-            thread_id=id,
-        )
+        messagerun_output = handle_message(SUMMARIZE_PROMPT, thread_id=id)
         response = handle_run_response(run=messagerun_output, thread_id=id)
     else:
         response = handle_run_response(run=messagerun, thread_id=id)
 
     return {"id": id, "response": response}
+
+
+# Async pipeline: same flow as above on AsyncOpenAI and the async tools, so a
+# slow run or upstream fetch never blocks the event loop.
+
+async def handle_message_async(message_text, thread_id, additional_instructions=None):
+    with span("message.create"):
+        await async_client.beta.threads.messages.create(
+            thread_id=thread_id,
+            role="user",
+            content=message_text
+        )
+
+    messagerun = await run_scheduler.create_and_poll_async(
+        async_client,
+        thread_id=thread_id,
+        assistant_id=await get_assistant_id_async(),
+        **_run_options(additional_instructions)
+    )
+
+    return messagerun
+
+
+async def handle_tool_execution_async(tool_name, parsed_arguments):
+    """Async counterpart of `handle_tool_execution`."""
+    try:
+        return await tool_registry.execute_async(tool_name, parsed_arguments)
+    except Exception as overall_exception:
+        return {"Error": f"An error occurred while handling the tool '{tool_name}': {overall_exception}"}
+
+
+async def _run_tool_call_async(tool_call):
+    """Executes one tool call under its timeout and returns the result with its duration."""
+    name = tool_call.function.name
+    timeout = tool_registry.timeout(name, TOOL_TIMEOUT)
+    started = time.perf_counter()
+    try:
+        parsed_arguments = json.loads(tool_call.function.arguments)
+        result = await asyncio.wait_for(handle_tool_execution_async(name, parsed_arguments), timeout)
+    except asyncio.TimeoutError:
+        tool_registry.record_timeout(name)
+        result = {"Error": f"Tool '{name}' timed out after {timeout:g} seconds."}
+    except ValueError as e:
+        result = {"Error": f"Invalid arguments for tool '{name}': {e}"}
+    return result, time.perf_counter() - started
+
+
+async def execute_tool_calls_async(tool_calls):
+    """Async counterpart of `execute_tool_calls`, fanning the calls out with asyncio.gather."""
+    started = time.perf_counter()
+    record_tools(tool_call.function.name for tool_call in tool_calls)
+    results = await asyncio.gather(*(_run_tool_call_async(tool_call) for tool_call in tool_calls))
+
+    _log_tool_timings(
+        [(tool_call.function.name, tool_call.id, elapsed) for tool_call, (_, elapsed) in zip(tool_calls, results)],
+        started,
+    )
+    return [_tool_output(tool_call, result) for tool_call, (result, _) in zip(tool_calls, results)]
+
+
+async def submit_tool_outputs_async(thread_id, run_id, tool_outputs):
+    """Async counterpart of `submit_tool_outputs`."""
+    return await run_scheduler.submit_tool_outputs_and_poll_async(
+        async_client,
+        thread_id=thread_id,
+        run_id=run_id,
+        tool_outputs=tool_outputs
+    )
+
+
+async def handle_run_response_async(thread_id, run):
+    """Async counterpart of `handle_run_response`."""
+    if run.status == 'completed':
+        with span("message.list"):
+            messages = await async_client.beta.threads.messages.list(thread_id=thread_id, run_id=run.id, order="desc", limit=1)
+        if not messages.data:
+            return "No content available"
+        latest_message = messages.data[0]
+        latest_message_content = latest_message.content[-1].text.value if latest_message.content else "No content available"
+        await thread_store.record_reply_async(thread_id, latest_message.id, latest_message_content)
+        return latest_message_content
+
+    elif run.status == 'requires_action':
+        required_action = run.required_action
+
+        if required_action and hasattr(required_action, "submit_tool_outputs"):
+            tool_calls = required_action.submit_tool_outputs.tool_calls
+
+            if tool_calls:
+                tool_outputs = await execute_tool_calls_async(tool_calls)
+                await submit_tool_outputs_async(thread_id, run.id, tool_outputs)
+                return tool_outputs
+            else:
+                logger.warning("run requires action without tool calls", extra={"run_id": run.id})
+        else:
+            logger.warning("unrecognized required action", extra={"run_id": run.id})
+    else:
+        logger.warning("unhandled run status", extra={"run_id": run.id, "status": run.status})
+
+
+async def chat_with_assistant_single_run_async(prompt, id_thread):
+    """Async counterpart of `chat_with_assistant_single_run`."""
+    id = id_thread
+    run = await handle_message_async(prompt, thread_id=id, additional_instructions=SUMMARIZE_PROMPT)
+    rounds = 0
+    while run.status == 'requires_action' and rounds < MAX_TOOL_ROUNDS:
+        tool_outputs = await execute_tool_calls_async(run.required_action.submit_tool_outputs.tool_calls)
+        run = await submit_tool_outputs_async(id, run.id, tool_outputs)
+        rounds += 1
+
+    if run.status == 'requires_action':
+        await async_client.beta.threads.runs.cancel(run.id, thread_id=id)
+        return {"id": id, "response": _tool_rounds_exhausted(run)}
+    return {"id": id, "response": await handle_run_response_async(thread_id=id, run=run)}
+
+
+async def chat_with_assistant_async(prompt, thread, id_thread=None):
+    """Async counterpart of `chat_with_assistant`."""
+    if SINGLE_RUN:
+        return await chat_with_assistant_single_run_async(prompt, id_thread)
+
+    id = id_thread
+    messagerun = await handle_message_async(prompt, thread_id=id)
+    if messagerun.status == 'requires_action':
+        await handle_run_response_async(run=messagerun, thread_id=id)
+
+        if thread:
+            runInfo = await async_client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=messagerun.id)
+            if runInfo.completed_at is None:
+                await async_client.beta.threads.runs.cancel(messagerun.id, thread_id=id)
+
+        messagerun_output = await handle_message_async(SUMMARIZE_PROMPT, thread_id=id)
+        response = await handle_run_response_async(run=messagerun_output, thread_id=id)
+    else:
+        response = await handle_run_response_async(run=messagerun, thread_id=id)
+
+    return {"id": id, "response": response}
+
+
+async def _execute_tool_calls_streaming(tool_calls, events):
+    """
+    Runs the tool calls concurrently, putting a tool_finish event on the `events` queue as each one completes.
+
+    Returns:
+        list: The tool outputs, in the order of `tool_calls`.
+    """
+    started = time.perf_counter()
+    record_tools(tool_call.function.name for tool_call in tool_calls)
+    pending = {asyncio.ensure_future(_run_tool_call_async(tool_call)): tool_call for tool_call in tool_calls}
+    results = {}
+    timings = []
+    while pending:
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            tool_call = pending.pop(future)
+            try:
+                result, elapsed = future.result()
+            except Exception as e:
+                result, elapsed = {"Error": f"An error occurred while handling the tool '{tool_call.function.name}': {e}"}, 0.0
+            results[tool_call.id] = result
+            timings.append((tool_call.function.name, tool_call.id, elapsed))
+            events.put_nowait(("tool_finish", {
+                "tool": tool_call.function.name,
+                "tool_call_id": tool_call.id,
+                "elapsed_ms": round(elapsed * 1000, 1),
+                "error": isinstance(result, dict) and "Error" in result,
+            }))
+    _log_tool_timings(timings, started)
+    return [_tool_output(tool_call, results[tool_call.id]) for tool_call in tool_calls]
+
+
+async def stream_chat_with_assistant(prompt, thread_id):
+    """
+    Streams one assistant turn using the runs streaming API.
+
+    The original run is continued after the tool outputs are submitted, with
+    the answer-formatting guidance passed as `additional_instructions`, so no
+    second run is needed. A run still asking for tools after MAX_TOOL_ROUNDS
+    rounds is cancelled.
+
+    Args:
+        prompt (str): The user message.
+        thread_id (str): The thread to post it to.
+
+    Yields:
+        tuple: (event, data) pairs: "delta" with answer text, "tool_start" and
+        "tool_finish" around each tool call, and "error" if the run does not complete.
+    """
+    with span("message.create"):
+        await async_client.beta.threads.messages.create(
+            thread_id=thread_id,
+            role="user",
+            content=prompt
+        )
+    manager = async_client.beta.threads.runs.stream(
+        thread_id=thread_id,
+        assistant_id=await get_assistant_id_async(),
+        additional_instructions=SUMMARIZE_PROMPT,
+    )
+
+    rounds = 0
+    while manager is not None:
+        run = None
+        tool_calls = None
+        async with manager as stream, span("run.stream"):
+            async for event in stream:
+                if event.event == "thread.message.delta":
+                    for part in event.data.delta.content or []:
+                        if part.type == "text" and part.text and part.text.value:
+                            yield "delta", {"text": part.text.value}
+                elif event.event == "thread.message.completed":
+                    content = event.data.content
+                    await thread_store.record_reply_async(thread_id, event.data.id, content[-1].text.value if content and content[-1].type == "text" else None)
+                elif event.event == "thread.run.requires_action":
+                    run = event.data
+                    tool_calls = event.data.required_action.submit_tool_outputs.tool_calls
+                elif event.event in ("thread.run.failed", "thread.run.cancelled", "thread.run.expired", "thread.run.incomplete"):
+                    last_error = event.data.last_error
+                    yield "error", {"status": event.data.status, "Error": last_error.message if last_error else None}
+
+        manager = None
+        if tool_calls and rounds >= MAX_TOOL_ROUNDS:
+            await async_client.beta.threads.runs.cancel(run.id, thread_id=thread_id)
+            yield "error", {"status": run.status, **_tool_rounds_exhausted(run)}
+        elif tool_calls:
+            rounds += 1
+            for tool_call in tool_calls:
+                yield "tool_start", {"tool": tool_call.function.name, "tool_call_id": tool_call.id}
+            events = asyncio.Queue()
+            tool_outputs_task = asyncio.ensure_future(_execute_tool_calls_streaming(tool_calls, events))
+            # Forward tool_finish events while the remaining tools are still running
+            for _ in tool_calls:
+                yield await events.get()
+            manager = async_client.beta.threads.runs.submit_tool_outputs_stream(
+                thread_id=thread_id,
+                run_id=run.id,
+                tool_outputs=await tool_outputs_task,
+            )
@@ -0,0 +1,65 @@
+"""
+Offline replay of a recorded prompt log through the answer cache.
+
+Usage:
+    python benchmarks/bench_answer_cache.py [--log benchmarks/prompt_log.jsonl]
+        [--threshold 0.8] [--refresh-every 0]
+
+Each log line is {"prompt", "intent", "tools"}; prompts with the same intent
+have the same correct answer. A miss stores the prompt's intent as its answer,
+so a hit is correct exactly when the cached intent matches. With
+--refresh-every N every dataset snapshot is replaced after N prompts.
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+
+import fixtures  # noqa: F401  (puts the repo root on sys.path)
+from answer_cache import AnswerCache
+from tool_registry import tool_registry
+import tools  # noqa: F401  (registers the tools and their datasets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=os.path.join(os.path.dirname(__file__), "prompt_log.jsonl"))
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--refresh-every", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.log, encoding="utf-8") as f:
+        log = [json.loads(line) for line in f if line.strip()]
+
+    versions = Counter()
+    cache = AnswerCache(versions.__getitem__, threshold=args.threshold, ttl=3600)
+    correct = wrong = 0
+    lookup_time = 0.0
+    for i, entry in enumerate(log):
+        if args.refresh_every and i and i % args.refresh_every == 0:
+            for spec in tool_registry.specs.values():
+                versions.update(spec.datasets)
+
+        started = time.perf_counter()
+        answer = cache.get(entry["prompt"])
+        lookup_time += time.perf_counter() - started
+        if answer is None:
+            cache.set(entry["prompt"], entry["intent"], tool_registry.datasets(entry["tools"]))
+        elif answer == entry["intent"]:
+            correct += 1
+        else:
+            wrong += 1
+            print(f"  wrong hit: {entry['prompt']!r} answered as {answer!r}")
+
+    stats = cache.stats()
+    print(f"{len(log)} prompts, threshold {args.threshold}, refresh every {args.refresh_every or 'never'}")
+    print(f"  exact hits {stats['exact_hits']}, similar hits {stats['similar_hits']}, misses {stats['misses']}, "
+          f"invalidated {stats['invalidated']}")
+    print(f"  hit rate {stats['hit_rate']:.1%}, correct hits {correct}, wrong hits {wrong}")
+    print(f"  assistant runs avoided {correct + wrong} of {len(log)}, "
+          f"mean lookup {lookup_time / len(log) * 1e6:.1f} us, {stats['entries']} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+OpenAI API calls per /get_information request: the two-run summarize flow
+(ASSISTANT_SINGLE_RUN=0) versus the single continued run.
+
+Usage:
+    python benchmarks/bench_api_calls.py [--requests 10]
+
+Reports the app's own X-OpenAI-API-Calls header next to what the stub
+server observed, split into runs created, thread messages and polls.
+"""
+import argparse
+import statistics
+import time
+
+import httpx
+
+from load_test import free_port, start_app
+from stub_servers import StubServer, StubState
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--run-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    for mode, single_run in [("two-run", "0"), ("single-run", "1")]:
+        state = StubState(api_latency=0.01, run_latency=args.run_latency, upstream_latency=0.01)
+        with StubServer(state, free_port()) as stub:
+            port = free_port()
+            process = start_app({**stub.env, "ASSISTANT_SINGLE_RUN": single_run}, port)
+            try:
+                # Warm up the assistant registration and the snapshot cache
+                httpx.get(f"http://127.0.0.1:{port}/get_information", params={"message": "warm up", "new": "true"}, timeout=60)
+                state.calls.clear()
+
+                reported = []
+                latencies = []
+                for i in range(args.requests):
+                    started = time.perf_counter()
+                    response = httpx.get(f"http://127.0.0.1:{port}/get_information",
+                                         params={"message": f"top pools {i}", "new": "true"}, timeout=60)
+                    latencies.append(time.perf_counter() - started)
+                    reported.append(int(response.headers["X-OpenAI-API-Calls"]))
+            finally:
+                process.terminate()
+                process.wait()
+
+        openai_calls = {k: v for k, v in state.calls.items() if k.startswith("openai")}
+        runs = sum(v for k, v in openai_calls.items() if k.endswith("POST /v1/threads/{id}/runs"))
+        messages = sum(v for k, v in openai_calls.items() if k.endswith("POST /v1/threads/{id}/messages"))
+        polls = sum(v for k, v in openai_calls.items() if k.endswith("GET /v1/threads/{id}/runs/{id}"))
+        n = args.requests
+        print(f"{mode:>10}: {statistics.mean(reported):5.1f} API calls/request (header), "
+              f"{sum(openai_calls.values()) / n:5.1f} seen by stub; "
+              f"runs {runs / n:.1f}, messages posted {messages / n:.1f}, polls {polls / n:.1f}, "
+              f"p50 {statistics.median(latencies) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compares the previous full sort of the pools dataset against `PoolIndex`.
+
+Usage:
+    python benchmarks/bench_pool_index.py [--fixture pools.json] [--record pools.json] [--pools 20000]
+
+`--record` downloads yields.llama.fi/pools once into a fixture file; without a
+fixture a synthetic dataset of `--pools` entries is used.
+"""
+import argparse
+import timeit
+
+from fixtures import load_pools, record
+
+from pool_index import PoolIndex, select_top_pools
+from records import PoolRecord
+
+
+def full_sort(pools, top_n):
+    return sorted(pools, key=lambda x: x.get("tvlUsd", 0), reverse=True)[:top_n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="Recorded yields.llama.fi/pools response")
+    parser.add_argument("--record", help="Download the live pools response to this path and use it")
+    parser.add_argument("--pools", type=int, default=20000, help="Synthetic pool count when no fixture is given")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.record:
+        record("https://yields.llama.fi/pools", args.record)
+        args.fixture = args.record
+
+    pools = load_pools(args.fixture, args.pools)["data"]
+    records = [PoolRecord.from_api(pool) for pool in pools]
+    top_n = args.top_n
+    index = PoolIndex(records).build()
+    assert [p.tvl_usd for p in index.top(top_n)] == [p["tvlUsd"] or 0 for p in full_sort(pools, top_n)]
+
+    results = {
+        "full sort per call": timeit.timeit(lambda: full_sort(pools, top_n), number=args.repeat) / args.repeat,
+        "heapq partial selection (cold)": timeit.timeit(lambda: select_top_pools(records, top_n), number=args.repeat) / args.repeat,
+        "index build (once per refresh)": timeit.timeit(lambda: PoolIndex(records).build(), number=max(1, args.repeat // 10)) / max(1, args.repeat // 10),
+        "index top-N": timeit.timeit(lambda: index.top(top_n), number=args.repeat * 100) / (args.repeat * 100),
+        "index top-N by chain": timeit.timeit(lambda: index.top(top_n, chain="Ethereum"), number=args.repeat * 100) / (args.repeat * 100),
+    }
+
+    print(f"{len(pools)} pools, top_n={top_n}")
+    for name, seconds in results.items():
+        print(f"  {name:<34} {seconds * 1e6:>12.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Peak memory (tracemalloc) of parsing the pools payload: whole-document
+`response.json()` versus the streaming record projection and bounded heap.
+
+Usage:
+    python benchmarks/bench_pool_memory.py [--fixture pools.json] [--pools 100000]
+
+The body is written to a temporary file and read back in 64 KiB chunks, the
+same way `response.iter_content` hands it over, so only the parser's own
+allocations are measured for the streaming paths.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fixtures import load_pools
+
+from pool_index import PoolIndex
+from streaming import stream_pool_records, stream_top_pools
+
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_file(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def whole_document(path, top_n):
+    with open(path, "rb") as f:
+        pools = json.loads(f.read())["data"]
+    return sorted(pools, key=lambda x: x.get("tvlUsd", 0), reverse=True)[:top_n]
+
+
+def streaming_index(path, top_n):
+    return PoolIndex(list(stream_pool_records(iter_file(path)))).top(top_n)
+
+
+def streaming_heap(path, top_n):
+    return stream_top_pools(iter_file(path), top_n)
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="Recorded yields.llama.fi/pools response")
+    parser.add_argument("--pools", type=int, default=100000, help="Synthetic pool count when no fixture is given")
+    parser.add_argument("--top-n", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("wb", suffix=".json", delete=False) as f:
+        f.write(json.dumps(load_pools(args.fixture, args.pools)).encode("utf-8"))
+        path = f.name
+
+    try:
+        size = os.path.getsize(path)
+        print(f"payload {size / 1e6:.1f} MB, top_n={args.top_n}")
+        for name, func in [
+            ("response.json() + full sort", whole_document),
+            ("streaming records + PoolIndex", streaming_index),
+            ("streaming bounded top-N heap", streaming_heap),
+        ]:
+            peak, elapsed = measure(func, path, args.top_n)
+            print(f"  {name:<32} peak {peak / 1e6:>8.1f} MB  {elapsed:>6.2f} s")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Offline replay of the full /get_information pipeline.
+
+Usage:
+    python benchmarks/bench_replay.py [--requests 100] [--concurrency 1,10,50]
+        [--scenarios benchmarks/replay_scenarios.json] [--search benchmarks/search_results.json]
+        [--recorded DIR] [--env KEY=VALUE ...] [--output results.json] [--compare baseline.json]
+
+The app runs under uvicorn (benchmarks/replay_app.py) against the stub
+servers: the Assistants API replays each scenario's recorded tool-call rounds
+and answer, DefiLlama serves recorded bodies from --recorded (as saved by
+`fixtures.record`) or synthetic ones, and DuckDuckGo serves --search results.
+Every stub endpoint waits the configured latency.
+
+Requests cycle through the scenarios by weight. Each concurrency level gets
+a fresh app and stub, a few warm-up requests, then reports p50/p95/p99
+latency, throughput, errors, upstream calls per request and the app's peak
+RSS. --output writes the results as JSON with the commit they were measured
+on; --compare prints the change against such a file.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+from fixtures import ROOT
+from load_test import free_port, start_app
+from stub_servers import StubServer, StubState
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of already sorted `values`."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values) + 0.5)) - 1))]
+
+
+def schedule(scenarios, total):
+    """Deterministic request order: scenarios interleaved in proportion to their weight (smooth round robin)."""
+    weights = [scenario.get("weight", 1) for scenario in scenarios]
+    credit = [0] * len(scenarios)
+    order = []
+    for _ in range(total):
+        credit = [c + w for c, w in zip(credit, weights)]
+        best = max(range(len(scenarios)), key=credit.__getitem__)
+        credit[best] -= sum(weights)
+        order.append(scenarios[best])
+    return order
+
+
+def peak_rss_mb(pid):
+    """High-water mark of the process's resident memory, read before it exits (Linux)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except OSError:
+        return None, None
+    return commit or None, dirty
+
+
+async def drive(port, requests, concurrency):
+    """Sends `requests` (scenarios) with at most `concurrency` in flight; returns per-request samples."""
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300, limits=limits) as client:
+        async def one(scenario):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.get("/get_information", params={"message": scenario["prompt"], "new": "true"})
+                    status, text = response.status_code, response.text
+                    api_calls = int(response.headers.get("X-OpenAI-API-Calls", 0))
+                except httpx.HTTPError as e:
+                    status, text, api_calls = None, str(e), 0
+                elapsed = time.perf_counter() - started
+                ok = status == 200 and scenario["answer"] in text
+                samples.append((scenario["name"], elapsed, status, ok, api_calls))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(scenario) for scenario in requests))
+        wall = time.perf_counter() - started
+    return samples, wall
+
+
+def summarize(samples, wall, calls, requests):
+    latencies = sorted(elapsed for _, elapsed, _, _, _ in samples)
+    by_scenario = defaultdict(list)
+    for name, elapsed, _, _, _ in samples:
+        by_scenario[name].append(elapsed)
+
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    groups = Counter()
+    for key, count in calls.items():
+        groups[key.split(" ", 1)[0]] += count
+    return {
+        "requests": requests,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 2),
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "mean": ms(sum(latencies) / len(latencies)),
+            "max": ms(latencies[-1]),
+        },
+        "errors": sum(not ok for _, _, _, ok, _ in samples),
+        "rejected": sum(status == 429 for _, _, status, _, _ in samples),
+        "openai_calls_per_request_reported": round(sum(s[4] for s in samples) / requests, 2),
+        "upstream_calls": dict(sorted(calls.items())),
+        "upstream_calls_per_request": {group: round(count / requests, 2) for group, count in sorted(groups.items())},
+        "scenarios": {
+            name: {"requests": len(values), "p50_ms": ms(percentile(sorted(values), 50)),
+                   "p95_ms": ms(percentile(sorted(values), 95))}
+            for name, values in sorted(by_scenario.items())
+        },
+    }
+
+
+def run_level(args, scenarios, search_results, concurrency):
+    state = StubState(args.api_latency, args.run_latency, args.upstream_latency,
+                      scenarios=scenarios, search_results=search_results, recorded_dir=args.recorded)
+    with StubServer(state, free_port()) as stub:
+        port = free_port()
+        directory = tempfile.mkdtemp()
+        env = {**stub.env, "PREFETCH_ENABLED": "0",
+               # The stub forgets its assistants, so never reuse a registration from another run
+               "ASSISTANT_REGISTRY_PATH": os.path.join(directory, "assistant_registry.json"),
+               # Every level downloads the price history once, as a fresh deployment would
+               "PRICE_HISTORY_PATH": os.path.join(directory, "price_history.sqlite3"),
+               **dict(item.split("=", 1) for item in args.env)}
+        process = start_app(env, port, target="benchmarks.replay_app:app")
+        try:
+            if args.warmup:
+                asyncio.run(drive(port, schedule(scenarios, args.warmup), 1))
+            state.calls.clear()
+            samples, wall = asyncio.run(drive(port, schedule(scenarios, args.requests), concurrency))
+            rss = peak_rss_mb(process.pid)
+        finally:
+            process.terminate()
+            process.wait()
+    if rss is None:
+        # Not Linux: the children's high-water mark, in KiB (bytes on macOS)
+        maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        rss = round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return {"concurrency": concurrency, **summarize(samples, wall, state.calls, args.requests), "peak_rss_mb": rss}
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {level["concurrency"]: level for level in json.load(f)["results"]}
+    print(f"\nchange against {baseline_path}:")
+    for level in results:
+        old = baseline.get(level["concurrency"])
+        if old is None:
+            continue
+        changes = []
+        for label, new_value, old_value in [
+            ("p50", level["latency_ms"]["p50"], old["latency_ms"]["p50"]),
+            ("p95", level["latency_ms"]["p95"], old["latency_ms"]["p95"]),
+            ("p99", level["latency_ms"]["p99"], old["latency_ms"]["p99"]),
+            ("req/s", level["throughput_rps"], old["throughput_rps"]),
+            ("rss", level["peak_rss_mb"], old["peak_rss_mb"]),
+        ]:
+            if new_value is not None and old_value:
+                changes.append(f"{label} {new_value / old_value - 1:+.1%}")
+        print(f"  c={level['concurrency']:<4} " + "  ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", default="1,10,50")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--scenarios", default=os.path.join(HERE, "replay_scenarios.json"))
+    parser.add_argument("--search", default=os.path.join(HERE, "search_results.json"))
+    parser.add_argument("--recorded", default=None, help="directory with recorded DefiLlama bodies")
+    parser.add_argument("--api-latency", type=float, default=0.03)
+    parser.add_argument("--run-latency", type=float, default=0.5)
+    parser.add_argument("--upstream-latency", type=float, default=0.15)
+    parser.add_argument("--env", action="append", default=[], help="extra app environment, KEY=VALUE")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None)
+    args = parser.parse_args()
+
+    with open(args.scenarios, encoding="utf-8") as f:
+        scenarios = json.load(f)
+    with open(args.search, encoding="utf-8") as f:
+        search_results = json.load(f)
+
+    results = []
+    for concurrency in (int(value) for value in args.concurrency.split(",")):
+        level = run_level(args, scenarios, search_results, concurrency)
+        results.append(level)
+        latency = level["latency_ms"]
+        print(f"c={concurrency:<4} {level['throughput_rps']:7.2f} req/s  p50 {latency['p50']:7.0f} ms  "
+              f"p95 {latency['p95']:7.0f} ms  p99 {latency['p99']:7.0f} ms  errors {level['errors']}  "
+              f"rss {level['peak_rss_mb']} MB  calls/request {level['upstream_calls_per_request']}")
+
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "measured_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "requests": args.requests, "warmup": args.warmup, "scenarios": os.path.basename(args.scenarios),
+            "recorded": args.recorded, "api_latency": args.api_latency, "run_latency": args.run_latency,
+            "upstream_latency": args.upstream_latency, "env": args.env,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Serialize path of the tool outputs: the previous dict -> Pydantic model ->
+model_dump() -> json.dumps chain versus records encoded directly, with orjson
+and with the json fallback, plus the payload size of the compact format.
+
+Usage:
+    python benchmarks/bench_serialize.py [--pools 20] [--coins 20] [--prices 150] [--repeat 2000]
+"""
+import argparse
+import json
+import timeit
+
+import fixtures  # noqa: F401  (puts the repo root on sys.path)
+import serialization
+from models import GetPoolsOutput
+from records import PoolRecord, PriceSnapshot, RecordTable, StablecoinRecord
+from stub_servers import synthetic_prices, synthetic_stablecoins
+from tools import POOL_LABELS
+
+
+def legacy_pools(records):
+    top_pools = [
+        {"Project": p.project, "Symbol": p.symbol, "TVL (USD)": p.tvl_usd, "APY": p.apy, "Chain": p.chain}
+        for p in records
+    ]
+    return json.dumps(GetPoolsOutput(pools=top_pools).model_dump())
+
+
+def legacy_stablecoins(coins):
+    return json.dumps([
+        {"Name": c.get("name", "Unknown"), "Symbol": c.get("symbol", "Unknown"),
+         "Price": c.get("price", 0.0), "GeckoId": c.get("gecko_id", "Unknown")}
+        for c in coins
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pools", type=int, default=20)
+    parser.add_argument("--coins", type=int, default=20)
+    parser.add_argument("--prices", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    pool_records = [
+        PoolRecord(f"project-{i}", f"USDC-WETH-{i}", 1.2345678e9 / (i + 1), 3.14159265 + i / 7, "Ethereum")
+        for i in range(args.pools)
+    ]
+    raw_coins = synthetic_stablecoins(args.coins)["peggedAssets"]
+    coin_records = [StablecoinRecord.from_api(coin) for coin in raw_coins]
+    raw_prices = synthetic_prices(days=1, coins=args.prices)[0]
+    snapshot = PriceSnapshot.from_api(raw_prices)
+
+    cases = {
+        "pools": (lambda: legacy_pools(pool_records), RecordTable(pool_records, POOL_LABELS, key="pools")),
+        "stablecoins": (lambda: legacy_stablecoins(raw_coins),
+                        RecordTable(coin_records, ("Name", "Symbol", "Price", "GeckoId"))),
+        "prices": (lambda: json.dumps(raw_prices), snapshot),
+    }
+    orjson = serialization.orjson
+    print(f"{'tool':<12} {'legacy':>9} {'orjson':>9} {'json':>9} {'compact':>9}   {'legacy B':>9} {'compact B':>9} {'saved':>6}")
+    for name, (legacy, result) in cases.items():
+        timings = {"legacy": timeit.timeit(legacy, number=args.repeat)}
+        if orjson is not None:
+            timings["orjson"] = timeit.timeit(lambda: serialization.encode_tool_output(result, "verbose"), number=args.repeat)
+        serialization.orjson = None
+        timings["json"] = timeit.timeit(lambda: serialization.encode_tool_output(result, "verbose"), number=args.repeat)
+        serialization.orjson = orjson
+        timings["compact"] = timeit.timeit(lambda: serialization.encode_tool_output(result, "compact"), number=args.repeat)
+
+        legacy_size = len(legacy().encode("utf-8"))
+        compact_size = len(serialization.encode_tool_output(result, "compact").encode("utf-8"))
+        us = {key: value / args.repeat * 1e6 for key, value in timings.items()}
+        print(f"{name:<12} {us['legacy']:7.1f}us {us.get('orjson', float('nan')):7.1f}us {us['json']:7.1f}us "
+              f"{us['compact']:7.1f}us   {legacy_size:9d} {compact_size:9d} {1 - compact_size / legacy_size:6.0%}")
+    print(f"(verbose output is identical to legacy apart from whitespace; orjson {'available' if orjson else 'not installed'})")
+
+
+if __name__ == "__main__":
+    main()
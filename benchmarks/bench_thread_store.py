@@ -0,0 +1,66 @@
+"""
+Follow-up requests on an existing thread with and without the local thread
+store (THREAD_STORE_SIZE=0 forgets every thread immediately).
+
+Usage:
+    python benchmarks/bench_thread_store.py [--requests 20] [--api-latency 0.1]
+
+Each mode creates one thread and then sends `--requests` follow-ups with
+new=false. Reports OpenAI calls per request, threads.retrieve calls and
+latency, plus the per-request saving of the store.
+"""
+import argparse
+import statistics
+import time
+
+import httpx
+
+from load_test import free_port, start_app
+from stub_servers import StubServer, StubState
+
+
+def run_mode(store_size: str, args):
+    state = StubState(api_latency=args.api_latency, run_latency=args.run_latency, upstream_latency=0.01)
+    with StubServer(state, free_port()) as stub:
+        port = free_port()
+        process = start_app({**stub.env, "THREAD_STORE_SIZE": store_size}, port)
+        try:
+            url = f"http://127.0.0.1:{port}/get_information"
+            thread_id = httpx.get(url, params={"message": "warm up", "new": "true"}, timeout=60).json()["id"]
+            state.calls.clear()
+
+            latencies = []
+            reported = []
+            for i in range(args.requests):
+                started = time.perf_counter()
+                response = httpx.get(url, params={"message": f"follow up {i}", "new": "false", "id_thread": thread_id}, timeout=60)
+                latencies.append(time.perf_counter() - started)
+                reported.append(int(response.headers["X-OpenAI-API-Calls"]))
+        finally:
+            process.terminate()
+            process.wait()
+
+    retrieves = sum(v for k, v in state.calls.items() if k.endswith("GET /v1/threads/{id}"))
+    return latencies, reported, retrieves
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--api-latency", type=float, default=0.1)
+    parser.add_argument("--run-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    means = {}
+    for mode, store_size in [("no store", "0"), ("store", "10000")]:
+        latencies, reported, retrieves = run_mode(store_size, args)
+        means[mode] = statistics.mean(latencies)
+        n = args.requests
+        print(f"{mode:>8}: {statistics.mean(reported):5.1f} API calls/request, "
+              f"threads.retrieve {retrieves / n:.1f}/request, "
+              f"mean {means[mode] * 1000:6.0f} ms  p50 {statistics.median(latencies) * 1000:6.0f} ms")
+    print(f"  saving: {(means['no store'] - means['store']) * 1000:.0f} ms/request")
+
+
+if __name__ == "__main__":
+    main()
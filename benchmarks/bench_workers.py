@@ -0,0 +1,123 @@
+"""
+Throughput of /get_information by number of worker processes.
+
+Usage:
+    python benchmarks/bench_workers.py [--workers 1,2,4] [--requests 200] [--concurrency 64]
+        [--modes shared,isolated] [--env KEY=VALUE ...] [--output results.json]
+
+Each worker count runs the replay app (benchmarks/replay_app.py) under
+`uvicorn --workers N` against the stub servers, with the background
+prefetcher enabled as in production. "shared" workers share SHARED_STATE_DIR
+(one refresher, one snapshot store, one search cache and one assistant);
+"isolated" workers each keep their own, as separate processes did before.
+
+For each run the script reports throughput and its scaling against one
+worker, p50/p95 latency, DefiLlama fetches, assistants created and the total
+peak RSS of the workers. The stub runs in this process, so give it a spare
+core: with fewer cores than workers + 1 the numbers measure contention.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+from bench_replay import HERE, drive, git_commit, peak_rss_mb, schedule, summarize
+from load_test import free_port, start_app
+from stub_servers import StubServer, StubState
+
+
+def workers_of(pid):
+    """The worker processes uvicorn started (Linux); the app process itself with a single worker."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        children = []
+    return children or [pid]
+
+
+def run(args, scenarios, search_results, workers, mode):
+    state = StubState(args.api_latency, args.run_latency, args.upstream_latency,
+                      scenarios=scenarios, search_results=search_results)
+    directory = tempfile.mkdtemp()
+    with StubServer(state, free_port()) as stub:
+        port = free_port()
+        env = {**stub.env,
+               # The stub forgets its assistants, so never reuse a registration from another run
+               "ASSISTANT_REGISTRY_PATH": os.path.join(directory, "assistant_registry.json"),
+               "PRICE_HISTORY_PATH": os.path.join(directory, "price_history.sqlite3"),
+               "LOG_LEVEL": "WARNING",
+               **dict(item.split("=", 1) for item in args.env)}
+        if mode == "shared":
+            env["SHARED_STATE_DIR"] = directory
+        else:
+            env.pop("SHARED_STATE_DIR", None)
+            os.environ.pop("SHARED_STATE_DIR", None)
+        process = start_app(env, port, target="benchmarks.replay_app:app", workers=workers)
+        try:
+            if args.warmup:
+                asyncio.run(drive(port, schedule(scenarios, args.warmup), args.warmup))
+            samples, wall = asyncio.run(drive(port, schedule(scenarios, args.requests), args.concurrency))
+            rss = [peak_rss_mb(pid) for pid in workers_of(process.pid)]
+        finally:
+            process.terminate()
+            process.wait()
+    level = summarize(samples, wall, state.calls, args.requests)
+    calls = level.pop("upstream_calls")
+    return {
+        "workers": workers,
+        "mode": mode,
+        **{key: level[key] for key in ("requests", "wall_s", "throughput_rps", "latency_ms", "errors", "rejected")},
+        # Counted from app start, so they include the prefetcher and warm-up
+        "defillama_fetches": sum(count for key, count in calls.items() if key.startswith("defillama")),
+        "assistants_created": calls.get("openai POST /v1/assistants", 0),
+        "peak_rss_mb": round(sum(value for value in rss if value is not None), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--modes", default="shared,isolated")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--warmup", type=int, default=8)
+    parser.add_argument("--scenarios", default=os.path.join(HERE, "replay_scenarios.json"))
+    parser.add_argument("--search", default=os.path.join(HERE, "search_results.json"))
+    parser.add_argument("--api-latency", type=float, default=0.01)
+    parser.add_argument("--run-latency", type=float, default=0.1)
+    parser.add_argument("--upstream-latency", type=float, default=0.15)
+    parser.add_argument("--env", action="append", default=[], help="extra app environment, KEY=VALUE")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    with open(args.scenarios, encoding="utf-8") as f:
+        scenarios = json.load(f)
+    with open(args.search, encoding="utf-8") as f:
+        search_results = json.load(f)
+
+    results = []
+    for mode in args.modes.split(","):
+        baseline = None
+        for workers in (int(value) for value in args.workers.split(",")):
+            result = run(args, scenarios, search_results, workers, mode)
+            baseline = baseline or result["throughput_rps"]
+            result["scaling"] = round(result["throughput_rps"] / baseline, 2)
+            results.append(result)
+            latency = result["latency_ms"]
+            print(f"{mode:<9} workers={workers:<3} {result['throughput_rps']:7.2f} req/s (x{result['scaling']:.2f})  "
+                  f"p50 {latency['p50']:6.0f} ms  p95 {latency['p95']:6.0f} ms  errors {result['errors']}  "
+                  f"defillama fetches {result['defillama_fetches']}  assistants {result['assistants_created']}  "
+                  f"rss {result['peak_rss_mb']} MB")
+
+    if args.output:
+        commit, dirty = git_commit()
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"commit": commit, "dirty": dirty, "cpus": os.cpu_count(), "config": vars(args),
+                       "results": results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Recorded and synthetic upstream payloads shared by the benchmark scripts."""
+import json
+import os
+import random
+import sys
+from typing import Dict, Optional
+
+# Make the application modules importable when running `python benchmarks/<script>.py`
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CHAINS = ["Ethereum", "Arbitrum", "Optimism", "Polygon", "BSC", "Solana", "Base", "Avalanche", "Tron", "Fantom"]
+PROJECTS = ["lido", "aave-v3", "uniswap-v3", "curve-dex", "makerdao", "compound-v3", "pendle", "morpho", "convex-finance", "balancer-v2"]
+
+
+def synthetic_pools(count: int, seed: int = 7) -> Dict:
+    """
+    Builds a yields.llama.fi/pools shaped document with `count` pools.
+
+    Every pool carries the same fields as the real API so payload size and
+    parse cost are comparable to a recorded response.
+    """
+    rng = random.Random(seed)
+    data = []
+    for i in range(count):
+        tvl = rng.lognormvariate(12, 3)
+        data.append({
+            "chain": rng.choice(CHAINS),
+            "project": rng.choice(PROJECTS),
+            "symbol": f"TKN{i % 997}-USDC",
+            "tvlUsd": round(tvl, 2),
+            "apyBase": round(rng.uniform(0, 20), 4),
+            "apyReward": None if rng.random() < 0.6 else round(rng.uniform(0, 10), 4),
+            "apy": round(rng.uniform(0, 30), 4),
+            "rewardTokens": None,
+            "pool": f"{rng.getrandbits(128):032x}-{i}",
+            "apyPct1D": round(rng.uniform(-1, 1), 4),
+            "apyPct7D": round(rng.uniform(-2, 2), 4),
+            "apyPct30D": round(rng.uniform(-5, 5), 4),
+            "stablecoin": rng.random() < 0.3,
+            "ilRisk": rng.choice(["no", "yes"]),
+            "exposure": rng.choice(["single", "multi"]),
+            "predictions": {"predictedClass": "Stable/Up", "predictedProbability": 75, "binnedConfidence": 2},
+            "poolMeta": None,
+            "mu": round(rng.uniform(0, 20), 5),
+            "sigma": round(rng.uniform(0, 1), 5),
+            "count": rng.randint(1, 1000),
+            "outlier": False,
+            "underlyingTokens": [f"0x{rng.getrandbits(160):040x}"],
+            "il7d": None,
+            "apyBase7d": None,
+            "apyMean30d": round(rng.uniform(0, 30), 5),
+            "volumeUsd1d": None,
+            "volumeUsd7d": None,
+            "apyBaseInception": None,
+        })
+    return {"status": "success", "data": data}
+
+
+def load_pools(path: Optional[str], count: int) -> Dict:
+    """Loads a recorded pools document from `path`, or builds a synthetic one."""
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return synthetic_pools(count)
+
+
+def record(url: str, path: str) -> None:
+    """Downloads `url` once and stores the raw response body at `path`."""
+    import requests
+
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    with open(path, "wb") as f:
+        f.write(response.content)
@@ -0,0 +1,105 @@
+"""
+Concurrent throughput of /get_information against local stub servers,
+comparing the original blocking pipeline (ASYNC_PIPELINE=0) with the async one.
+
+Usage:
+    python benchmarks/load_test.py [--requests 40] [--concurrency 10] [--modes sync,async]
+
+The app runs under uvicorn in a subprocess pointed at the stubs from
+`stub_servers.py`. The snapshot cache TTL is set to zero so every request
+exercises the DefiLlama fetch as well as the OpenAI round-trips.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from fixtures import ROOT
+from stub_servers import StubServer, StubState
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(env, port, target="app:app", workers=1):
+    command = [sys.executable, "-m", "uvicorn", target, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    if workers > 1:
+        command += ["--workers", str(workers)]
+    process = subprocess.Popen(
+        command,
+        cwd=ROOT, env={**os.environ, **env}, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("The app did not start in time.")
+
+
+async def drive(port, total, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get("/get_information", params={"message": f"top pools {i}", "new": "true"})
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200 or "Error" in response.text:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--api-latency", type=float, default=0.02)
+    parser.add_argument("--run-latency", type=float, default=0.2)
+    parser.add_argument("--upstream-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        state = StubState(args.api_latency, args.run_latency, args.upstream_latency)
+        with StubServer(state, free_port()) as stub:
+            port = free_port()
+            env = {**stub.env, "ASYNC_PIPELINE": "1" if mode == "async" else "0",
+                   "SNAPSHOT_CACHE_TTL": "0", "SNAPSHOT_CACHE_STALE_TTL": "0",
+                   "PREFETCH_ENABLED": "0"}
+            process = start_app(env, port)
+            try:
+                latencies, errors, elapsed = asyncio.run(drive(port, args.requests, args.concurrency))
+            finally:
+                process.terminate()
+                process.wait()
+
+        latencies.sort()
+        print(f"{mode:>5}: {args.requests / elapsed:6.2f} req/s  "
+              f"p50 {statistics.median(latencies) * 1000:7.0f} ms  "
+              f"max {latencies[-1] * 1000:7.0f} ms  errors {errors}  "
+              f"(concurrency {args.concurrency}, {sum(state.calls.values())} stub calls)")
+
+
+if __name__ == "__main__":
+    main()
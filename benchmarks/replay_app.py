@@ -0,0 +1,36 @@
+"""
+The FastAPI app with DuckDuckGo search answered by the stub server.
+
+DDGS talks to duckduckgo.com directly and has no base URL setting, so for
+replay runs `tools.DDGS` is replaced with a client for the stub's /ddg/search
+endpoint (REPLAY_SEARCH_URL). Everything else is the unmodified app:
+
+    uvicorn benchmarks.replay_app:app
+"""
+import os
+
+import httpx
+
+import tools
+from app import app  # noqa: F401  (served by uvicorn)
+
+
+class ReplayDDGS:
+    """Stand-in for `duckduckgo_search.DDGS` backed by the stub's recorded results."""
+
+    def __init__(self):
+        self._client = httpx.Client(base_url=os.environ["REPLAY_SEARCH_URL"], timeout=10)
+
+    def __enter__(self) -> "ReplayDDGS":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._client.close()
+
+    def text(self, keywords: str, region: str = "wt-wt", max_results: int = 5, **kwargs):
+        response = self._client.get("/search", params={"q": keywords, "region": region, "max_results": max_results})
+        response.raise_for_status()
+        return response.json()
+
+
+tools.DDGS = ReplayDDGS
@@ -0,0 +1,173 @@
+"""
+Import time and time to first response of the app.
+
+Usage:
+    python benchmarks/startup_report.py [--runs 5] [--ref HEAD~1] [--output benchmarks/startup_report.md]
+
+Import time is read from `python -X importtime -c "import app"`: the total and
+the cumulative time of the heaviest packages (a package's figure includes
+whatever it imports itself). Time to first response runs from spawning
+uvicorn to the first 200 from / ; time to ready runs to the first 200 from
+/health/ready (OpenAI clients built, assistant resolved, datasets loaded),
+with the app pointed at the stub servers. Every figure is the median of
+--runs runs.
+
+--ref measures a worktree of another git ref the same way, for a before/after
+table. --output writes the report as Markdown.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from fixtures import ROOT
+from load_test import free_port
+from stub_servers import StubServer, StubState
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+# Packages whose presence at import is worth reporting even when they are cheap
+WATCHED = ("openai", "duckduckgo_search", "requests", "httpx", "fastapi", "pydantic")
+
+
+def import_profile(cwd, env):
+    """Runs `-X importtime` once; returns the total ms and the cumulative ms of each top-level package."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=cwd,
+                            env={**os.environ, **env}, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"import app failed:\n{result.stderr[-2000:]}")
+    packages = {}
+    total = None
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative, name = int(match.group(2)) / 1000, match.group(4)
+        if name == "app":
+            total = cumulative
+        elif "." not in name:
+            packages[name] = cumulative
+    return total, packages
+
+
+def first_ok(client, path, deadline):
+    """Polls `path` until it answers 200; returns the time of that answer, or None on 404 or timeout."""
+    while time.monotonic() < deadline:
+        try:
+            response = client.get(path)
+            if response.status_code == 200:
+                return time.perf_counter()
+            if response.status_code == 404:
+                return None
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    return None
+
+
+def startup_times(cwd, env):
+    """Spawns uvicorn once; returns seconds to the first response and to readiness (None if there is no /health/ready)."""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1) as client:
+            deadline = time.monotonic() + 60
+            first = first_ok(client, "/", deadline)
+            ready = first_ok(client, "/health/ready", deadline)
+    finally:
+        process.terminate()
+        process.wait()
+    if first is None:
+        raise RuntimeError("The app did not answer in time.")
+    return first - started, None if ready is None else ready - started
+
+
+def measure(cwd, runs):
+    state = StubState(0.01, 0.1, 0.05)
+    with StubServer(state, free_port()) as stub:
+        imports, first, ready = [], [], []
+        packages = {}
+        for _ in range(runs):
+            # The stub forgets its assistants, so never reuse a registration from another run
+            env = {**stub.env, "LOG_LEVEL": "WARNING",
+                   "ASSISTANT_REGISTRY_PATH": os.path.join(tempfile.mkdtemp(), "assistant_registry.json")}
+            total, loaded = import_profile(cwd, env)
+            imports.append(total)
+            for name, ms in loaded.items():
+                packages.setdefault(name, []).append(ms)
+            to_first, to_ready = startup_times(cwd, env)
+            first.append(to_first)
+            if to_ready is not None:
+                ready.append(to_ready)
+    return {
+        "import_ms": statistics.median(imports),
+        "first_response_ms": statistics.median(first) * 1000,
+        "ready_ms": statistics.median(ready) * 1000 if ready else None,
+        "packages": {name: statistics.median(values) for name, values in packages.items()},
+    }
+
+
+def report(current, baseline, ref, top):
+    def ms(value):
+        return "n/a" if value is None else f"{value:.0f} ms"
+
+    def loaded(result, name):
+        return ms(result["packages"][name]) if name in result["packages"] else "not imported"
+
+    columns = ["current"] + ([ref] if baseline else [])
+    results = [current] + ([baseline] if baseline else [])
+    lines = [
+        "| | " + " | ".join(columns) + " |",
+        "|---|" + "---|" * len(columns),
+        "| `import app` | " + " | ".join(ms(r["import_ms"]) for r in results) + " |",
+        "| spawn to first response (/) | " + " | ".join(ms(r["first_response_ms"]) for r in results) + " |",
+        "| spawn to ready (/health/ready) | " + " | ".join(ms(r["ready_ms"]) for r in results) + " |",
+    ]
+    for name in WATCHED:
+        lines.append(f"| `{name}` at import | " + " | ".join(loaded(r, name) for r in results) + " |")
+
+    heaviest = sorted(current["packages"].items(), key=lambda item: item[1], reverse=True)[:top]
+    lines += ["", "Heaviest packages imported by `import app` (current, cumulative):", ""]
+    lines += [f"- `{name}`: {value:.0f} ms" for name, value in heaviest]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ref", default=None, help="git ref to compare against")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    current = measure(ROOT, args.runs)
+    baseline = None
+    if args.ref:
+        worktree = tempfile.mkdtemp()
+        subprocess.run(["git", "worktree", "add", "--detach", worktree, args.ref], cwd=ROOT, check=True,
+                       capture_output=True)
+        try:
+            baseline = measure(worktree, args.runs)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=ROOT, capture_output=True)
+
+    text = report(current, baseline, args.ref, args.top)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(f"# Startup report\n\nMedian of {args.runs} runs on {os.cpu_count()} CPU(s), "
+                    f"Python {sys.version.split()[0]}; produced by `benchmarks/startup_report.py`.\n\n{text}")
+        print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Local stand-ins for the OpenAI Assistants API, the DefiLlama endpoints and
+DuckDuckGo search.
+
+The OpenAI stub implements just enough of the threads/messages/runs surface for
+`assistant.py`: a run on a user question asks for the pools and stablecoins
+tools, the submitted tool outputs complete it with an assistant message, and a
+run on the summarize prompt completes straight away. Questions that match a
+replay scenario instead go through that scenario's recorded tool-call rounds
+and end with its recorded answer. Every run stays `in_progress` for
+`run_latency` seconds to model model time, and every endpoint waits
+`api_latency` seconds to model network round-trips.
+
+Run standalone with:
+    python benchmarks/stub_servers.py --port 9100
+then point the app at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1,
+STABLECOINS_API_URL=http://127.0.0.1:9100/llama and
+YIELDS_API_URL=http://127.0.0.1:9100/llama.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from fixtures import synthetic_pools
+
+SUMMARIZE_MARKER = "Use the tool output"
+ID_PREFIXES = ("thread_", "run_", "msg_", "asst_", "call_")
+DEFAULT_ANSWER = "Stub answer built from the tool output."
+
+DEFAULT_TOOL_CALLS = [
+    ("Get_Top_Pools_by_TVL", {"top_n": 5}),
+    ("Get_Stable_Coins", {"top_m": 5}),
+]
+
+
+def synthetic_stablecoins(count: int = 200) -> Dict:
+    return {
+        "peggedAssets": [
+            {
+                "id": str(i),
+                "name": f"Stablecoin {i}",
+                "symbol": f"USD{i}",
+                "gecko_id": f"usd-{i}",
+                "pegType": "peggedUSD",
+                "price": 1.0 + (i % 7 - 3) / 1000,
+                "circulating": {"peggedUSD": 1e9 / (i + 1)},
+                "chains": ["Ethereum", "Tron", "BSC"],
+            }
+            for i in range(count)
+        ]
+    }
+
+
+def synthetic_prices(days: int = 365, coins: int = 50) -> List[Dict]:
+    now = int(time.time()) // 86400 * 86400
+    return [
+        {"date": now - day * 86400, "prices": {f"usd-{c}": 1.0 + ((day + c) % 11 - 5) / 1000 for c in range(coins)}}
+        for day in range(days)
+    ]
+
+
+def _recorded_body(recorded_dir: Optional[str], name: str) -> Optional[bytes]:
+    """Returns the recorded response body `<recorded_dir>/<name>.json` if it exists."""
+    path = os.path.join(recorded_dir, f"{name}.json") if recorded_dir else None
+    if path and os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    return None
+
+
+class StubState:
+    """
+    Recorded threads, runs and call counters shared by the stub endpoints.
+
+    Args:
+        api_latency (float): Seconds every OpenAI endpoint waits.
+        run_latency (float): Seconds a run stays in progress before each step.
+        upstream_latency (float): Seconds every DefiLlama and search endpoint waits.
+        tool_calls: The (name, arguments) calls of the single round used for unscripted questions.
+        pools (int): Number of synthetic pools when no recorded pools body is given.
+        scenarios (Optional[List[Dict]]): Replay scenarios, each with a "prompt", its
+            tool-call "rounds" (lists of [name, arguments]) and the final "answer".
+        search_results (Optional[Dict[str, List[Dict]]]): DuckDuckGo results by query,
+            with "*" as the fallback for unknown queries.
+        recorded_dir (Optional[str]): Directory with recorded stablecoins.json,
+            pools.json and stablecoinprices.json bodies, used instead of synthetic data.
+    """
+
+    def __init__(self, api_latency: float, run_latency: float, upstream_latency: float,
+                 tool_calls=None, pools: int = 2000, scenarios: Optional[List[Dict]] = None,
+                 search_results: Optional[Dict[str, List[Dict]]] = None, recorded_dir: Optional[str] = None):
+        self.api_latency = api_latency
+        self.run_latency = run_latency
+        self.upstream_latency = upstream_latency
+        self.tool_calls = tool_calls or DEFAULT_TOOL_CALLS
+        self.scenarios = {scenario["prompt"]: scenario for scenario in scenarios or ()}
+        self.search_results = search_results or {}
+        self.calls: Counter = Counter()
+        self.threads: Dict[str, List[Dict]] = {}
+        self.runs: Dict[str, Dict] = {}
+        self.assistants: Dict[str, Dict] = {}
+        self.ids = itertools.count(1)
+        self.pools_body = _recorded_body(recorded_dir, "pools") or json.dumps(synthetic_pools(pools)).encode("utf-8")
+        self.stablecoins_body = (_recorded_body(recorded_dir, "stablecoins")
+                                 or json.dumps(synthetic_stablecoins()).encode("utf-8"))
+        self.prices_body = _recorded_body(recorded_dir, "stablecoinprices") or json.dumps(synthetic_prices()).encode("utf-8")
+
+    def script(self, question: str):
+        """Returns the tool-call rounds and the final answer of a run on `question`."""
+        if question.startswith(SUMMARIZE_MARKER):
+            return [], DEFAULT_ANSWER
+        scenario = self.scenarios.get(question)
+        if scenario is None:
+            return [list(self.tool_calls)], DEFAULT_ANSWER
+        return [[tuple(call) for call in calls] for calls in scenario.get("rounds", [])], scenario["answer"]
+
+    def new_id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self.ids)}"
+
+
+def _message(state: StubState, thread_id: str, role: str, text: str, run_id: Optional[str] = None) -> Dict:
+    return {
+        "id": state.new_id("msg"),
+        "object": "thread.message",
+        "created_at": int(time.time()),
+        "thread_id": thread_id,
+        "role": role,
+        "run_id": run_id,
+        "assistant_id": "asst_stub" if role == "assistant" else None,
+        "status": "completed",
+        "attachments": [],
+        "metadata": {},
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+    }
+
+
+def _run_view(run: Dict, state: StubState) -> Dict:
+    """Advances a run past its simulated model time and returns its public shape."""
+    if run["status"] in ("queued", "in_progress") and time.monotonic() >= run["ready_at"]:
+        if run["pending_rounds"]:
+            run["status"] = "requires_action"
+            run["required_action"] = {
+                "type": "submit_tool_outputs",
+                "submit_tool_outputs": {
+                    "tool_calls": [
+                        {"id": state.new_id("call"), "type": "function",
+                         "function": {"name": name, "arguments": json.dumps(args)}}
+                        for name, args in run["pending_rounds"].pop(0)
+                    ]
+                },
+            }
+        else:
+            run["status"] = "completed"
+            run["required_action"] = None
+            run["completed_at"] = int(time.time())
+            state.threads[run["thread_id"]].insert(
+                0, _message(state, run["thread_id"], "assistant", run["answer"], run["id"])
+            )
+    return {k: v for k, v in run.items() if k not in ("ready_at", "pending_rounds", "answer", "tool_outputs")}
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_run(run: Dict, state: StubState):
+    """Emits the run streaming events up to requires_action or completion."""
+    yield _sse(f"thread.run.{run['status']}", _run_view(run, state))
+    await asyncio.sleep(max(0.0, run["ready_at"] - time.monotonic()))
+    view = _run_view(run, state)
+    if view["status"] == "completed":
+        message = state.threads[run["thread_id"]][0]
+        text = message["content"][0]["text"]["value"]
+        yield _sse("thread.message.created", {**message, "status": "in_progress", "content": []})
+        for index, word in enumerate(text.split(" ")):
+            chunk = word if index == 0 else " " + word
+            yield _sse("thread.message.delta", {
+                "id": message["id"], "object": "thread.message.delta",
+                "delta": {"content": [{"index": 0, "type": "text", "text": {"value": chunk, "annotations": []}}]},
+            })
+            await asyncio.sleep(state.api_latency / 4)
+        yield _sse("thread.message.completed", message)
+    yield _sse(f"thread.run.{view['status']}", view)
+    yield "event: done\ndata: [DONE]\n\n"
+
+
+def create_stub_app(state: StubState) -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def latency(request: Request, call_next):
+        path = request.url.path
+        if path.startswith("/v1/"):
+            state.calls[f"openai {request.method} {_route(path)}"] += 1
+            await asyncio.sleep(state.api_latency)
+        elif path.startswith("/llama/"):
+            state.calls[f"defillama {path[len('/llama'):]}"] += 1
+            await asyncio.sleep(state.upstream_latency)
+        elif path.startswith("/ddg/"):
+            state.calls[f"ddgs {path[len('/ddg'):]}"] += 1
+            await asyncio.sleep(state.upstream_latency)
+        response = await call_next(request)
+        response.headers["openai-poll-after-ms"] = "50"
+        return response
+
+    @app.get("/stats")
+    async def stats():
+        return dict(state.calls)
+
+    @app.post("/v1/assistants")
+    async def create_assistant(request: Request):
+        body = await request.json()
+        assistant_id = state.new_id("asst")
+        state.assistants[assistant_id] = {
+            "id": assistant_id, "object": "assistant", "created_at": int(time.time()),
+            "name": body.get("name"), "model": body.get("model"), "instructions": body.get("instructions"),
+            "tools": body.get("tools", []), "metadata": body.get("metadata") or {},
+        }
+        return state.assistants[assistant_id]
+
+    @app.get("/v1/assistants")
+    async def list_assistants(limit: int = 20, after: Optional[str] = None):
+        ids = list(state.assistants)
+        start = ids.index(after) + 1 if after in state.assistants else 0
+        data = [state.assistants[assistant_id] for assistant_id in ids[start:start + limit]]
+        return {"object": "list", "data": data, "first_id": data[0]["id"] if data else None,
+                "last_id": data[-1]["id"] if data else None, "has_more": start + limit < len(ids)}
+
+    @app.get("/v1/assistants/{assistant_id}")
+    async def retrieve_assistant(assistant_id: str):
+        if assistant_id not in state.assistants:
+            return JSONResponse({"error": {"message": f"No assistant found with id '{assistant_id}'.",
+                                           "type": "invalid_request_error"}}, status_code=404)
+        return state.assistants[assistant_id]
+
+    @app.delete("/v1/assistants/{assistant_id}")
+    async def delete_assistant(assistant_id: str):
+        state.assistants.pop(assistant_id, None)
+        return {"id": assistant_id, "object": "assistant.deleted", "deleted": True}
+
+    @app.post("/v1/assistants/{assistant_id}")
+    async def update_assistant(assistant_id: str, request: Request):
+        state.assistants[assistant_id].update(await request.json())
+        return state.assistants[assistant_id]
+
+    @app.post("/v1/threads")
+    async def create_thread(request: Request):
+        body = await request.json() if await request.body() else {}
+        thread_id = state.new_id("thread")
+        # Initial messages are listed newest first, like the ones posted later
+        state.threads[thread_id] = [
+            _message(state, thread_id, message["role"], message["content"]) for message in reversed(body.get("messages", []))
+        ]
+        return {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}}
+
+    @app.get("/v1/threads/{thread_id}")
+    async def retrieve_thread(thread_id: str):
+        state.threads.setdefault(thread_id, [])
+        return {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}}
+
+    @app.post("/v1/threads/{thread_id}/messages")
+    async def create_message(thread_id: str, request: Request):
+        body = await request.json()
+        message = _message(state, thread_id, "user", body.get("content", ""))
+        state.threads.setdefault(thread_id, []).insert(0, message)
+        return message
+
+    @app.get("/v1/threads/{thread_id}/messages")
+    async def list_messages(thread_id: str, limit: int = 20, order: str = "desc",
+                            after: Optional[str] = None, run_id: Optional[str] = None):
+        messages = list(state.threads.get(thread_id, []))
+        if run_id:
+            messages = [m for m in messages if m["run_id"] == run_id]
+        if order == "asc":
+            messages.reverse()
+        if after:
+            ids = [m["id"] for m in messages]
+            messages = messages[ids.index(after) + 1:] if after in ids else messages
+        page = messages[:limit]
+        return {"object": "list", "data": page, "first_id": page[0]["id"] if page else None,
+                "last_id": page[-1]["id"] if page else None, "has_more": len(messages) > limit}
+
+    @app.post("/v1/threads/{thread_id}/runs")
+    async def create_run(thread_id: str, request: Request):
+        body = await request.json()
+        messages = state.threads.setdefault(thread_id, [])
+        last_user = next((m for m in messages if m["role"] == "user"), None)
+        question = last_user["content"][0]["text"]["value"] if last_user else ""
+        rounds, answer = state.script(question)
+        run = {
+            "id": state.new_id("run"), "object": "thread.run", "created_at": int(time.time()),
+            "thread_id": thread_id, "assistant_id": body.get("assistant_id"), "status": "queued",
+            "required_action": None, "completed_at": None, "model": "stub", "instructions": "",
+            "tools": [], "metadata": {}, "ready_at": time.monotonic() + state.run_latency,
+            "pending_rounds": rounds, "answer": answer,
+        }
+        state.runs[run["id"]] = run
+        if body.get("stream"):
+            return StreamingResponse(_stream_run(run, state), media_type="text/event-stream")
+        return _run_view(run, state)
+
+    @app.get("/v1/threads/{thread_id}/runs/{run_id}")
+    async def retrieve_run(thread_id: str, run_id: str):
+        return _run_view(state.runs[run_id], state)
+
+    @app.post("/v1/threads/{thread_id}/runs/{run_id}/submit_tool_outputs")
+    async def submit_tool_outputs(thread_id: str, run_id: str, request: Request):
+        body = await request.json()
+        run = state.runs[run_id]
+        run.update(status="in_progress", required_action=None, ready_at=time.monotonic() + state.run_latency)
+        # Kept so benchmarks can measure what the app sends back to the model
+        run.setdefault("tool_outputs", []).extend(body.get("tool_outputs", []))
+        if body.get("stream"):
+            return StreamingResponse(_stream_run(run, state), media_type="text/event-stream")
+        return _run_view(run, state)
+
+    @app.post("/v1/threads/{thread_id}/runs/{run_id}/cancel")
+    async def cancel_run(thread_id: str, run_id: str):
+        run = state.runs[run_id]
+        run.update(status="cancelled", required_action=None)
+        return _run_view(run, state)
+
+    @app.get("/llama/stablecoins")
+    async def stablecoins():
+        return Response(state.stablecoins_body, media_type="application/json")
+
+    @app.get("/llama/pools")
+    async def pools():
+        return Response(state.pools_body, media_type="application/json")
+
+    @app.get("/llama/stablecoinprices")
+    async def stablecoin_prices():
+        return Response(state.prices_body, media_type="application/json")
+
+    @app.get("/ddg/search")
+    async def search(q: str, max_results: int = 5):
+        results = state.search_results.get(q, state.search_results.get("*", []))
+        return results[:max_results]
+
+    return app
+
+
+def _route(path: str) -> str:
+    """Collapses ids out of a path so calls are counted per endpoint."""
+    parts = path.split("/")
+    return "/".join("{id}" if part.startswith(ID_PREFIXES) else part for part in parts)
+
+
+class StubServer:
+    """Runs the stub app with uvicorn in a background thread."""
+
+    def __init__(self, state: StubState, port: int):
+        self.state = state
+        self.port = port
+        config = uvicorn.Config(create_stub_app(state), host="127.0.0.1", port=port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def env(self) -> Dict[str, str]:
+        """Environment that points the app at this stub."""
+        base = f"http://127.0.0.1:{self.port}"
+        return {
+            "OPENAI_API_KEY": "stub",
+            "OPENAI_BASE_URL": f"{base}/v1",
+            "STABLECOINS_API_URL": f"{base}/llama",
+            "YIELDS_API_URL": f"{base}/llama",
+            # Read by replay_app.py, which swaps DDGS for this stub
+            "REPLAY_SEARCH_URL": f"{base}/ddg",
+        }
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--api-latency", type=float, default=0.02)
+    parser.add_argument("--run-latency", type=float, default=0.3)
+    parser.add_argument("--upstream-latency", type=float, default=0.1)
+    args = parser.parse_args()
+    state = StubState(args.api_latency, args.run_latency, args.upstream_latency)
+    uvicorn.run(create_stub_app(state), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
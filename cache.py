@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from shared_state import SHARED_STATE_DIR, SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value: Any, fetched_at: float):
+        self.value = value
+        self.fetched_at = fetched_at
+
+
+class SnapshotCache:
+    """
+    In-process snapshot cache for upstream payloads, keyed by endpoint.
+
+    A fresh entry (younger than `ttl`) is served directly. A stale entry (older
+    than `ttl` but younger than `ttl + stale_ttl`) is still served while a single
+    background thread refreshes it. Anything older is loaded synchronously,
+    falling back to the last good value if the load fails. Concurrent callers
+    for the same key share one in-flight load.
+
+    With a `shared` store, every value this process loads is published to it,
+    and an entry that is no longer fresh is first replaced by a newer snapshot
+    published by another worker, keeping that snapshot's original age.
+
+    Args:
+        ttl (float): Seconds an entry is considered fresh.
+        stale_ttl (float): Extra seconds a stale entry may be served while it is refreshed.
+        shared (Optional[SnapshotStore]): Store shared with the other worker processes.
+        load_timeout (float): Seconds a sync caller waits on a load another caller started.
+    """
+
+    def __init__(self, ttl: float = 300.0, stale_ttl: float = 600.0, shared: Optional[SnapshotStore] = None,
+                 load_timeout: float = 120.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self.load_timeout = load_timeout
+        # Version of the shared snapshot each entry holds, so it is only decoded once
+        self._shared_versions: Dict[str, int] = {}
+        self._entries: Dict[str, _Entry] = {}
+        self._versions: Dict[str, int] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._tasks: Set[asyncio.Future] = set()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0, "fallbacks": 0,
+                          "prefetches": 0, "shared_reads": 0, "shared_writes": 0}
+
+    def _needs_sync(self, key: str) -> bool:
+        """Whether the shared store should be checked before serving `key`."""
+        if self.shared is None:
+            return False
+        entry = self._entries.get(key)
+        return entry is None or time.monotonic() - entry.fetched_at >= self.ttl
+
+    def _sync(self, key: str) -> None:
+        """Swaps in the shared snapshot for `key` if another process published a newer one."""
+        try:
+            published = self.shared.read(key, self._shared_versions.get(key, 0))
+        except Exception as e:
+            logger.warning("could not read shared snapshot %s: %s", key, e)
+            return
+        if published is None:
+            return
+        version, age, value = published
+        with self._lock:
+            self._entries[key] = _Entry(value, time.monotonic() - age)
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._shared_versions[key] = version
+            self._counters["shared_reads"] += 1
+
+    def _publish(self, key: str, value: Any) -> None:
+        """Shares a value this process loaded with the other workers."""
+        try:
+            version = self.shared.publish(key, value)
+        except Exception as e:
+            logger.warning("could not publish shared snapshot %s: %s", key, e)
+            return
+        with self._lock:
+            self._shared_versions[key] = version
+            self._counters["shared_writes"] += 1
+
+    def _lookup(self, key: str) -> Tuple[str, Any, bool]:
+        """
+        Classifies `key` as "fresh", "stale" or "miss" and claims its in-flight slot when needed.
+
+        Returns:
+            Tuple[str, Any, bool]: The state, the cached value (fresh/stale) or the
+            in-flight future (miss), and whether the caller owns the load.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.fetched_at
+                if age < self.ttl:
+                    self._counters["hits"] += 1
+                    return "fresh", entry.value, False
+                if age < self.ttl + self.stale_ttl:
+                    # Serve the stale value; the first caller refreshes it in the background
+                    self._counters["stale_hits"] += 1
+                    owner = key not in self._inflight
+                    if owner:
+                        self._inflight[key] = Future()
+                    return "stale", entry.value, owner
+
+            self._counters["misses"] += 1
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            return "miss", future, owner
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value for `key`, calling `loader` when it is missing or expired.
+
+        Args:
+            key (str): Cache key, usually the upstream URL.
+            loader (Callable[[], Any]): Function that fetches and parses the payload.
+
+        Returns:
+            Any: The cached (or freshly loaded) value.
+
+        Raises:
+            Exception: Whatever `loader` raises when there is no usable cached value.
+            concurrent.futures.TimeoutError: When a load started by another caller
+                takes longer than `load_timeout`.
+        """
+        if self._needs_sync(key):
+            self._sync(key)
+        state, value, owner = self._lookup(key)
+        if state == "fresh":
+            return value
+        if state == "stale":
+            if owner:
+                threading.Thread(target=self._load, args=(key, loader), daemon=True).start()
+            return value
+
+        if owner:
+            self._load(key, loader)
+        return value.result(timeout=self.load_timeout)
+
+    async def get_async(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async counterpart of `get` for coroutine loaders.
+
+        Sync and async callers share the same entries and in-flight loads, so a
+        fetch started by either one is reused by the other.
+
+        Args:
+            key (str): Cache key, usually the upstream URL.
+            loader (Callable[[], Awaitable[Any]]): Coroutine function that fetches and parses the payload.
+
+        Returns:
+            Any: The cached (or freshly loaded) value.
+        """
+        if self._needs_sync(key):
+            # Decoding a published snapshot takes a while for the pools; keep it off the event loop
+            await asyncio.to_thread(self._sync, key)
+        state, value, owner = self._lookup(key)
+        if state == "fresh":
+            return value
+        if state == "stale":
+            if owner:
+                self._spawn(self._load_async(key, loader))
+            return value
+
+        if owner:
+            # The load runs in a task of its own: if this caller is cancelled (e.g. by a tool
+            # timeout), it still completes and resolves the other callers waiting on it
+            self._spawn(self._load_async(key, loader))
+        # Shielded, as cancelling the wrapper would cancel the future every other caller shares
+        return await asyncio.shield(asyncio.wrap_future(value))
+
+    def _spawn(self, coroutine: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coroutine)
+        # Keep a reference so the load task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _load(self, key: str, loader: Callable[[], Any]) -> None:
+        """Runs `loader` once for `key` and resolves every caller waiting on it."""
+        try:
+            value = loader()
+        except BaseException as e:
+            # Interrupts too, or the in-flight entry would be left unresolved for every later caller
+            self._fail(key, e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        self._store(key, value)
+        if self.shared is not None:
+            self._publish(key, value)
+
+    async def _load_async(self, key: str, loader: Callable[[], Awaitable[Any]]) -> None:
+        """Awaits `loader` once for `key` and resolves every caller waiting on it."""
+        try:
+            value = await loader()
+        except BaseException as e:
+            # Cancellation too (e.g. at shutdown), or every later caller would wait on the entry forever
+            self._fail(key, e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        self._store(key, value)
+        if self.shared is not None:
+            await asyncio.to_thread(self._publish, key, value)
+
+    def _store(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = _Entry(value, time.monotonic())
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._counters["refreshes"] += 1
+            future = self._inflight.pop(key)
+        future.set_result(value)
+
+    def _fail(self, key: str, error: BaseException) -> None:
+        with self._lock:
+            self._counters["errors"] += 1
+            future = self._inflight.pop(key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Upstream is failing: keep serving the last good payload, however old
+                self._counters["fallbacks"] += 1
+        if entry is not None:
+            future.set_result(entry.value)
+            return
+        future.set_exception(error)
+        # Stale refreshes have no waiter; mark the exception as retrieved
+        future.exception()
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Swaps in a value loaded outside the cache (e.g. by the prefetcher) as a fresh entry.
+
+        With a shared store the value is published as well, which blocks while
+        it is encoded; call it from a worker thread.
+        """
+        with self._lock:
+            self._entries[key] = _Entry(value, time.monotonic())
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._counters["prefetches"] += 1
+        if self.shared is not None:
+            self._publish(key, value)
+
+    def version(self, key: str) -> int:
+        """Returns how many times the entry for `key` has been replaced; 0 if it was never loaded."""
+        return self._versions.get(key, 0)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drops one entry, or every entry when `key` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the hit/miss/refresh counters and the age of every cached entry."""
+        now = time.monotonic()
+        with self._lock:
+            stats = {
+                **self._counters,
+                "entries": {
+                    key: round(now - entry.fetched_at, 3) for key, entry in self._entries.items()
+                },
+            }
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+
+# Shared cache for the DefiLlama payloads used by the tools; with SHARED_STATE_DIR set, the
+# snapshots are also shared with the other worker processes
+snapshot_cache = SnapshotCache(
+    ttl=float(os.getenv("SNAPSHOT_CACHE_TTL", "300")),
+    stale_ttl=float(os.getenv("SNAPSHOT_CACHE_STALE_TTL", "600")),
+    load_timeout=float(os.getenv("SNAPSHOT_CACHE_LOAD_TIMEOUT", "120")),
+    shared=SnapshotStore(os.path.join(SHARED_STATE_DIR, "snapshots.sqlite3")) if SHARED_STATE_DIR else None,
+)
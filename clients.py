@@ -0,0 +1,53 @@
+import threading
+from typing import Any, Callable
+
+from api_metrics import count_api_call, count_api_call_async
+
+
+class LazyClient:
+    """
+    Stands in for an SDK client that is only built, imports included, on first use.
+
+    Attribute access is forwarded to the real client, so `client.beta.threads`
+    works as before; the `openai` package (about half a second to import) is
+    then loaded after the server is listening rather than before.
+
+    Args:
+        factory (Callable[[], Any]): Builds the client; called at most once.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        """Returns the client, building it on the first call."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    @property
+    def built(self) -> bool:
+        return self._client is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+
+def _build_client():
+    from openai import DefaultHttpxClient, OpenAI
+    # Every HTTP request the clients make is tallied per request context (see api_metrics)
+    return OpenAI(http_client=DefaultHttpxClient(event_hooks={"request": [count_api_call]}))
+
+
+def _build_async_client():
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    return AsyncOpenAI(http_client=DefaultAsyncHttpxClient(event_hooks={"request": [count_api_call_async]}))
+
+
+# The one sync and one async OpenAI client of this process
+client = LazyClient(_build_client)
+async_client = LazyClient(_build_async_client)
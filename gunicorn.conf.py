@@ -0,0 +1,51 @@
+"""
+Multi-worker deployment: gunicorn -c gunicorn.conf.py app:app
+
+Each worker is a uvicorn event loop with its own OpenAI clients. The workers
+share the DefiLlama snapshots, search cache, thread store and assistant id
+through SHARED_STATE_DIR; one of them refreshes the snapshots for all.
+
+WEB_CONCURRENCY sets the number of workers. By default it is the number of
+CPUs the container may use (its CPU set and cgroup quota, not the host's
+CPU count), capped at MAX_WORKERS (4): every worker keeps its own decoded
+copy of the pools index, so memory grows with each one.
+"""
+import math
+import os
+import tempfile
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, bounded by the cgroup CPU quota when one is set."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f, open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as g:
+                quota, period = f.read().strip(), g.read().strip()
+        except OSError:
+            return cpus
+    if quota in ("max", "-1"):
+        return cpus
+    return max(1, min(cpus, math.ceil(int(quota) / int(period))))
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", min(available_cpus(), int(os.getenv("MAX_WORKERS", "4")))))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Workers import the app after the fork: HTTP clients and event loops must not be shared with the master
+preload_app = False
+# Streaming answers and long runs keep a request open well past gunicorn's 30 s default
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("WORKER_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Read by the workers' shared_state module; set it to a volume to keep the state across restarts.
+# Checked here as well, so an unsafe directory stops the master instead of every worker boot
+os.environ.setdefault("SHARED_STATE_DIR", os.path.join(tempfile.gettempdir(), f"stablecoin-app-{os.getuid()}"))
+
+from shared_state import private_directory  # noqa: E402
+
+private_directory(os.environ["SHARED_STATE_DIR"])
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+try:
+    import brotli  # noqa: F401  (urllib3 and httpx decode "br" when it is installed)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without contacting upstream while an endpoint's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and lets a single
+    trial request through once `reset_timeout` seconds have passed.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                # Let one trial request through and keep the circuit open for everyone else
+                self.opened_at = time.monotonic()
+                return True
+            return state == "closed"
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class Endpoint:
+    """Per-endpoint settings, circuit breaker and counters."""
+
+    def __init__(self, name: str, timeout: float, max_retries: int, breaker: CircuitBreaker):
+        self.name = name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.breaker = breaker
+        self.counters = {"requests": 0, "retries": 0, "failures": 0, "short_circuited": 0}
+
+
+class UpstreamClient:
+    """
+    Shared HTTP layer for the DefiLlama calls.
+
+    Sync requests go through one `requests.Session` with a keep-alive
+    connection pool per host; async requests through one `httpx.AsyncClient`
+    with the same limits. Both retry 429/5xx responses and connection errors
+    with jittered exponential backoff, apply per-endpoint timeouts, and fail
+    fast while an endpoint's circuit breaker is open.
+
+    Timeouts and retries come from HTTP_TIMEOUT_<ENDPOINT> / HTTP_MAX_RETRIES,
+    pool sizes from HTTP_POOL_MAXSIZE.
+    """
+
+    def __init__(self, pool_maxsize: int = 10, backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.pool_maxsize = pool_maxsize
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.endpoints: Dict[str, Endpoint] = {}
+        self.pool = {"in_flight": 0, "max_in_flight": 0, "saturated": 0}
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    def endpoint(self, name: str, timeout: float = 10.0, max_retries: Optional[int] = None) -> Endpoint:
+        """Returns the settings for `name`, registering it with env overrides on first use."""
+        with self._lock:
+            if name not in self.endpoints:
+                self.endpoints[name] = Endpoint(
+                    name,
+                    timeout=float(os.getenv(f"HTTP_TIMEOUT_{name.upper()}", timeout)),
+                    max_retries=int(os.getenv("HTTP_MAX_RETRIES", 2 if max_retries is None else max_retries)),
+                    breaker=CircuitBreaker(
+                        failure_threshold=int(os.getenv("HTTP_BREAKER_THRESHOLD", "5")),
+                        reset_timeout=float(os.getenv("HTTP_BREAKER_RESET", "30")),
+                    ),
+                )
+            return self.endpoints[name]
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept-Encoding": ACCEPT_ENCODING, "Connection": "keep-alive"})
+            self._session = session
+        return self._session
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.pool_maxsize * 4, max_keepalive_connections=self.pool_maxsize),
+                headers={"Accept-Encoding": ACCEPT_ENCODING},
+            )
+        return self._async_client
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        # Full jitter: spreads retries from concurrent callers across the window
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _acquire(self, endpoint: Endpoint) -> None:
+        if not endpoint.breaker.allow():
+            endpoint.counters["short_circuited"] += 1
+            raise CircuitOpenError(f"Upstream '{endpoint.name}' is failing; circuit breaker is open.")
+        with self._lock:
+            endpoint.counters["requests"] += 1
+            self.pool["in_flight"] += 1
+            self.pool["max_in_flight"] = max(self.pool["max_in_flight"], self.pool["in_flight"])
+            if self.pool["in_flight"] > self.pool_maxsize:
+                self.pool["saturated"] += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self.pool["in_flight"] -= 1
+
+    def _release_on_close(self, response: requests.Response) -> None:
+        """Keeps a streamed response in flight until it is closed, i.e. until its body has been read."""
+        close = response.close
+
+        def close_and_release() -> None:
+            # Only the first close releases the slot
+            response.close = close
+            close()
+            self._release()
+
+        response.close = close_and_release
+
+    def _give_up(self, endpoint: Endpoint) -> None:
+        endpoint.counters["failures"] += 1
+        endpoint.breaker.record_failure()
+
+    def get(self, name: str, url: str, timeout: float = 10.0, **kwargs: Any) -> requests.Response:
+        """
+        Performs a GET through the shared session.
+
+        Args:
+            name (str): Endpoint name used for timeouts, retries, breaker and metrics.
+            url (str): The URL to fetch.
+            timeout (float): Default timeout when HTTP_TIMEOUT_<NAME> is not set.
+            **kwargs: Passed to `requests.Session.get` (e.g. headers, stream).
+
+        Returns:
+            requests.Response: The successful response. With `stream=True` it counts
+            as in flight until it is closed, so use it as a context manager.
+
+        Raises:
+            CircuitOpenError: If the endpoint's circuit breaker is open.
+            requests.exceptions.RequestException: If every attempt failed.
+        """
+        endpoint = self.endpoint(name, timeout)
+        self._acquire(endpoint)
+        streamed = False
+        # Covers retries and backoff; a streamed body is timed by the caller while it is read
+        with span("upstream.fetch", name):
+            try:
+                for attempt in range(endpoint.max_retries + 1):
+                    try:
+                        response = self.session.get(url, timeout=endpoint.timeout, **kwargs)
+                        if response.status_code in RETRY_STATUSES and attempt < endpoint.max_retries:
+                            response.close()
+                            endpoint.counters["retries"] += 1
+                            time.sleep(self._backoff(attempt, response.headers.get("Retry-After")))
+                            continue
+                        response.raise_for_status()
+                    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                        if attempt < endpoint.max_retries:
+                            endpoint.counters["retries"] += 1
+                            time.sleep(self._backoff(attempt, None))
+                            continue
+                        self._give_up(endpoint)
+                        raise
+                    except requests.exceptions.RequestException:
+                        self._give_up(endpoint)
+                        raise
+                    endpoint.breaker.record_success()
+                    if kwargs.get("stream"):
+                        self._release_on_close(response)
+                        streamed = True
+                    return response
+            finally:
+                if not streamed:
+                    self._release()
+
+    async def aget(self, name: str, url: str, timeout: float = 10.0, **kwargs: Any) -> httpx.Response:
+        """Async counterpart of `get` on the shared `httpx.AsyncClient`."""
+        endpoint = self.endpoint(name, timeout)
+        self._acquire(endpoint)
+        # Covers retries and backoff; a streamed body is timed by the caller while it is read
+        with span("upstream.fetch", name):
+            try:
+                for attempt in range(endpoint.max_retries + 1):
+                    try:
+                        response = await self.async_client.get(url, timeout=endpoint.timeout, **kwargs)
+                        if response.status_code in RETRY_STATUSES and attempt < endpoint.max_retries:
+                            endpoint.counters["retries"] += 1
+                            await asyncio.sleep(self._backoff(attempt, response.headers.get("Retry-After")))
+                            continue
+                        response.raise_for_status()
+                    except httpx.TransportError:
+                        if attempt < endpoint.max_retries:
+                            endpoint.counters["retries"] += 1
+                            await asyncio.sleep(self._backoff(attempt, None))
+                            continue
+                        self._give_up(endpoint)
+                        raise
+                    except httpx.HTTPError:
+                        self._give_up(endpoint)
+                        raise
+                    endpoint.breaker.record_success()
+                    return response
+            finally:
+                self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns pool usage and per-endpoint retry/failure/breaker counters."""
+        return {
+            "pool": {**self.pool, "pool_maxsize": self.pool_maxsize},
+            "endpoints": {
+                name: {**endpoint.counters, "breaker": endpoint.breaker.state, "timeout": endpoint.timeout}
+                for name, endpoint in self.endpoints.items()
+            },
+        }
+
+
+upstream = UpstreamClient(pool_maxsize=int(os.getenv("HTTP_POOL_MAXSIZE", "10")))
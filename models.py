@@ -1,5 +1,5 @@
 
-from typing import List, Dict, Union , Optional
+from typing import List, Dict, Literal, Union , Optional
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 
@@ -20,6 +20,8 @@ class InternetSearchOutput(BaseModel):
 
 class GetPoolsInput(BaseModel):
     top_n: Optional[int] = 5
+    chain: Optional[str] = None
+    project: Optional[str] = None
 
 class GetPoolsOutput(BaseModel):
     pools: List[Dict[str, Union[str, int, float]]]
@@ -29,4 +31,14 @@ class GetStableCoinsInput(BaseModel):
 
 
 class GetStableCoinsPriceInput(BaseModel):
-    dummy : bool = True
\ No newline at end of file
+    dummy : bool = True
+    coins: Optional[List[str]] = Field(None, description="Coins to price, by CoinGecko id, symbol or name. Omit for the largest stablecoins.")
+    top_k: Optional[int] = Field(None, description="How many of the largest stablecoins to price when no coins are given.")
+    start: Optional[str] = Field(None, description="First day of a historical query, YYYY-MM-DD (UTC). Omit for the latest prices.")
+    end: Optional[str] = Field(None, description="Last day of a historical query, YYYY-MM-DD (UTC), inclusive. Defaults to the latest day.")
+    aggregation: Optional[Literal["series", "min", "max", "mean", "change", "depeg"]] = Field(
+        None,
+        description="Historical query over the range: every daily price (series), the lowest/highest/average price, "
+                    "the change from first to last day, or the periods a coin was off its $1 peg (depeg).",
+    )
+    depeg_threshold: Optional[float] = Field(None, description="Relative distance from $1 that counts as a depeg, e.g. 0.01 for 1%. Defaults to 0.005.")
@@ -0,0 +1,130 @@
+import heapq
+import threading
+from typing import Dict, List, Optional
+
+from records import PoolRecord
+
+# `GetPoolsInput.top_n` when the model passes null
+DEFAULT_TOP_N = 5
+
+
+def _tvl(pool: PoolRecord) -> float:
+    return pool.tvl_usd
+
+
+def select_top_pools(pools: List[PoolRecord], top_n: int) -> List[PoolRecord]:
+    """
+    Partial selection of the `top_n` pools by TVL without sorting the whole list.
+
+    Args:
+        pools (List[PoolRecord]): Pools from the yields API.
+        top_n (int): The number of pools to keep.
+
+    Returns:
+        List[PoolRecord]: The `top_n` pools ordered by `tvlUsd`, highest first.
+    """
+    return heapq.nlargest(top_n, pools, key=_tvl)
+
+
+class PoolIndex:
+    """
+    Pools kept ordered by `tvlUsd`, with secondary indexes by chain and project.
+
+    The index is built once per data refresh. The very first query after a
+    refresh is answered with a heap-based partial selection so a cold start does
+    not pay for the full sort; the sorted order is built on the next query and
+    reused until the snapshot is replaced.
+
+    Args:
+        pools (List[PoolRecord]): Pools from the yields API.
+    """
+
+    def __init__(self, pools: List[PoolRecord]):
+        self.pools = pools
+        self._ordered: Optional[List[PoolRecord]] = None
+        self._by_chain: Dict[str, List[PoolRecord]] = {}
+        self._by_project: Dict[str, List[PoolRecord]] = {}
+        self._queried = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.pools)
+
+    def __getstate__(self) -> dict:
+        # Pickled for the shared snapshot store; the lock stays behind
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def build(self) -> "PoolIndex":
+        """Sorts the pools by TVL and builds the chain/project indexes."""
+        with self._lock:
+            if self._ordered is not None:
+                return self
+            ordered = sorted(self.pools, key=_tvl, reverse=True)
+            by_chain: Dict[str, List[PoolRecord]] = {}
+            by_project: Dict[str, List[PoolRecord]] = {}
+            # Appending in TVL order keeps every secondary list sorted as well
+            for pool in ordered:
+                by_chain.setdefault(str(pool.chain).lower(), []).append(pool)
+                by_project.setdefault(str(pool.project).lower(), []).append(pool)
+            self._by_chain = by_chain
+            self._by_project = by_project
+            self._ordered = ordered
+        return self
+
+    def top(self, top_n: Optional[int], chain: Optional[str] = None, project: Optional[str] = None) -> List[PoolRecord]:
+        """
+        Returns the `top_n` pools by TVL, optionally restricted to one chain and/or project.
+
+        Args:
+            top_n (Optional[int]): The number of pools to retrieve; DEFAULT_TOP_N if None.
+            chain (Optional[str]): Only return pools on this chain (case-insensitive).
+            project (Optional[str]): Only return pools of this project (case-insensitive).
+
+        Returns:
+            List[PoolRecord]: The matching pools ordered by `tvlUsd`, highest first.
+        """
+        if top_n is None:
+            top_n = DEFAULT_TOP_N
+        if top_n <= 0:
+            return []
+
+        if self._ordered is None and not self._queried:
+            self._queried = True
+            candidates = self.pools
+            if chain or project:
+                candidates = [pool for pool in candidates if self.matches(pool, chain, project)]
+            return select_top_pools(candidates, top_n)
+
+        self.build()
+        if chain and project:
+            # Walk the smaller secondary list, it is already in TVL order
+            chain_pools = self._by_chain.get(chain.lower(), [])
+            project_pools = self._by_project.get(project.lower(), [])
+            source = chain_pools if len(chain_pools) <= len(project_pools) else project_pools
+            result = []
+            for pool in source:
+                if self.matches(pool, chain, project):
+                    result.append(pool)
+                    if len(result) == top_n:
+                        break
+            return result
+        if chain:
+            return self._by_chain.get(chain.lower(), [])[:top_n]
+        if project:
+            return self._by_project.get(project.lower(), [])[:top_n]
+        return self._ordered[:top_n]
+
+    @staticmethod
+    def matches(pool: PoolRecord, chain: Optional[str], project: Optional[str]) -> bool:
+        """Returns True if `pool` is on `chain` and belongs to `project` (when given)."""
+        if chain and str(pool.chain).lower() != chain.lower():
+            return False
+        if project and str(pool.project).lower() != project.lower():
+            return False
+        return True
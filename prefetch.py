@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Dataset:
+    """
+    An upstream dataset kept warm in the snapshot cache.
+
+    Args:
+        name (str): Name used in health reporting.
+        key (str): Snapshot cache key the tools read from.
+        loader (Callable[[], Any]): Blocking function that downloads and parses the dataset.
+        interval (float): Seconds between refreshes.
+        prepare (Optional[Callable[[Any], Any]]): Precomputes derived views on the loaded
+            value before it is swapped in (e.g. building the TVL index).
+    """
+
+    def __init__(self, name: str, key: str, loader: Callable[[], Any], interval: float,
+                 prepare: Optional[Callable[[Any], Any]] = None):
+        self.name = name
+        self.key = key
+        self.loader = loader
+        self.interval = interval
+        self.prepare = prepare
+        self.last_success: Optional[float] = None
+        self.last_attempt: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+
+    def load(self) -> Any:
+        value = self.loader()
+        if self.prepare is not None:
+            value = self.prepare(value) or value
+        return value
+
+    def health(self) -> Dict[str, Any]:
+        now = time.time()
+        age = None if self.last_success is None else now - self.last_success
+        if self.last_success is None:
+            status = "failing" if self.consecutive_failures else "pending"
+        elif self.consecutive_failures:
+            status = "failing"
+        elif age > 2 * self.interval:
+            status = "stale"
+        else:
+            status = "fresh"
+        return {
+            "status": status,
+            "age_seconds": None if age is None else round(age, 1),
+            "interval_seconds": self.interval,
+            "last_duration_ms": None if self.last_duration is None else round(self.last_duration * 1000, 1),
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
+
+
+class Prefetcher:
+    """
+    Refreshes every dataset on its own interval, independent of user requests.
+
+    Each refresh loads and prepares the dataset in a worker thread and then
+    swaps it into the snapshot cache in one assignment, so tool calls only
+    ever read a complete snapshot from memory.
+
+    Args:
+        cache: The `SnapshotCache` the tools read from.
+        datasets (List[Dataset]): The datasets to keep warm.
+    """
+
+    def __init__(self, cache, datasets: List[Dataset]):
+        self.cache = cache
+        self.datasets = datasets
+        self._tasks: List[asyncio.Task] = []
+
+    async def refresh(self, dataset: Dataset) -> None:
+        """Loads one dataset and swaps it into the cache, recording the outcome."""
+        dataset.last_attempt = time.time()
+        started = time.perf_counter()
+        try:
+            value = await asyncio.to_thread(dataset.load)
+        except Exception as e:
+            dataset.consecutive_failures += 1
+            dataset.last_error = str(e)
+            logger.warning("prefetch of %s failed (%d in a row): %s", dataset.name, dataset.consecutive_failures, e)
+            return
+        # put() also publishes to the shared snapshot store, if any, which encodes the value
+        await asyncio.to_thread(self.cache.put, dataset.key, value)
+        dataset.last_duration = time.perf_counter() - started
+        dataset.last_success = time.time()
+        dataset.consecutive_failures = 0
+        dataset.last_error = None
+
+    async def _run(self, dataset: Dataset) -> None:
+        while True:
+            await self.refresh(dataset)
+            # Back off while upstream is failing; jitter keeps datasets from refreshing in lockstep
+            delay = dataset.interval if not dataset.consecutive_failures else min(
+                dataset.interval, 5 * 2 ** min(dataset.consecutive_failures, 6)
+            )
+            await asyncio.sleep(delay * random.uniform(0.9, 1.1))
+
+    def start(self) -> None:
+        """Starts one refresh loop per dataset on the running event loop."""
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._run(dataset)) for dataset in self.datasets]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def health(self) -> Dict[str, Any]:
+        """Returns the freshness of every dataset and whether all of them are loaded."""
+        datasets = {dataset.name: dataset.health() for dataset in self.datasets}
+        return {
+            "running": bool(self._tasks),
+            "ready": all(dataset.last_success is not None for dataset in self.datasets),
+            "datasets": datasets,
+        }
@@ -0,0 +1,329 @@
+import bisect
+import datetime
+import math
+import os
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from records import PriceSnapshot, RecordTable, TableRow
+from shared_state import shared_path, sqlite_connector
+
+DAY = 86400
+
+# Aggregations understood by `PriceHistory.query`
+AGGREGATIONS = ("series", "min", "max", "mean", "change", "depeg")
+
+
+def parse_day(value: str) -> int:
+    """Converts a "YYYY-MM-DD" date or a unix timestamp to the UTC midnight it falls on."""
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value) // DAY * DAY
+    try:
+        day = datetime.date.fromisoformat(value[:10])
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+    return int(datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc).timestamp())
+
+
+def format_day(timestamp: int) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+class PriceHistory:
+    """
+    The daily stablecoinprices history held by column.
+
+    Dates live in one sorted integer array and each coin's prices in a float
+    array of the same length (NaN where the coin has no price that day). A
+    time range is located with two binary searches on the dates and every
+    column is sliced at those positions, so a query only touches the days in its range.
+
+    Instances are never modified: `merge` returns a new history, which lets
+    the snapshot cache hand the same object to concurrent readers.
+
+    Args:
+        dates (array): Day timestamps, ascending.
+        columns (Dict[str, array]): Prices per CoinGecko id, aligned with `dates`.
+    """
+
+    __slots__ = ("dates", "columns")
+
+    def __init__(self, dates: Optional[array] = None, columns: Optional[Dict[str, array]] = None):
+        self.dates = dates if dates is not None else array("q")
+        self.columns = columns if columns is not None else {}
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @property
+    def coins(self) -> Tuple[str, ...]:
+        return tuple(self.columns)
+
+    @property
+    def last_date(self) -> Optional[int]:
+        return self.dates[-1] if self.dates else None
+
+    def merge(self, entries: Iterable[Dict[str, Any]]) -> "PriceHistory":
+        """
+        Returns a history with the days of `entries` that are not stored yet appended.
+
+        The last stored day is replaced too, since upstream may still revise it.
+        Older entries are ignored, so merging the full download only costs the new days.
+        Dates are snapped to UTC midnight, so ranges ending on a given day include it.
+
+        Args:
+            entries (Iterable[Dict[str, Any]]): Raw `{"date": ..., "prices": {...}}` entries, in any order.
+        """
+        last = self.last_date
+        latest: Dict[int, Dict[str, Any]] = {}
+        for entry in entries:
+            date = entry.get("date")
+            if date is None:
+                continue
+            # Upstream may send strings or timestamps that are not exactly midnight
+            date = int(date) // DAY * DAY
+            if last is None or date >= last:
+                latest[date] = entry.get("prices") or {}
+        if not latest:
+            return self
+        keep = len(self.dates) - 1 if last in latest else len(self.dates)
+
+        new_dates = sorted(latest)
+        dates = self.dates[:keep]
+        dates.extend(new_dates)
+        coins = dict.fromkeys(self.columns)
+        for date in new_dates:
+            coins.update(dict.fromkeys(latest[date]))
+
+        columns: Dict[str, array] = {}
+        for coin in coins:
+            old = self.columns.get(coin)
+            column = old[:keep] if old is not None else array("d", [math.nan]) * keep
+            for date in new_dates:
+                price = latest[date].get(coin)
+                column.append(math.nan if price is None else float(price))
+            columns[coin] = column
+        return PriceHistory(dates, columns)
+
+    def is_due(self, now: float) -> bool:
+        """Whether upstream may have a day this history lacks, i.e. the last stored day is before today (UTC)."""
+        return self.last_date is None or self.last_date < int(now) // DAY * DAY
+
+    def latest(self, coins: Optional[Sequence[str]] = None) -> PriceSnapshot:
+        """Returns the prices of the last stored day, leaving out coins without a price that day."""
+        if not self.dates:
+            return PriceSnapshot(None, (), ())
+        picked = [coin for coin in (coins if coins is not None else self.columns)
+                  if coin in self.columns and self.columns[coin][-1] == self.columns[coin][-1]]
+        return PriceSnapshot(self.dates[-1], picked, [self.columns[coin][-1] for coin in picked])
+
+    def window(self, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+        """Positions [lo, hi) of the days from `start` to `end`, both inclusive and optional."""
+        lo = 0 if start is None else bisect.bisect_left(self.dates, start)
+        hi = len(self.dates) if end is None else bisect.bisect_right(self.dates, end)
+        return lo, max(lo, hi)
+
+    def query(self, coins: Sequence[str], start: Optional[int], end: Optional[int], aggregation: str = "series",
+              peg: float = 1.0, threshold: float = 0.005) -> Dict[str, Any]:
+        """
+        Answers a range query over the given coins.
+
+        Args:
+            coins (Sequence[str]): CoinGecko ids; unknown ids are skipped.
+            start (Optional[int]): First day (timestamp) of the range; the first stored day if None.
+            end (Optional[int]): Last day (timestamp) of the range; the last stored day if None.
+            aggregation (str): "series" (every daily price, one row per day with a column per coin),
+                "min", "max", "mean", "change"
+                (first to last price) or "depeg" (periods more than `threshold` away from `peg`).
+            peg (float): Target price for "depeg".
+            threshold (float): Relative deviation from `peg` that counts as depegged.
+
+        Returns:
+            Dict[str, Any]: The resolved range and a `RecordTable` under "prices" or "depegs".
+        """
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{aggregation}', expected one of {', '.join(AGGREGATIONS)}.")
+        lo, hi = self.window(start, end)
+        dates = self.dates[lo:hi]
+        coins = [coin for coin in dict.fromkeys(coins) if coin in self.columns]
+        result: Dict[str, Any] = {
+            "from": format_day(dates[0]) if dates else None,
+            "to": format_day(dates[-1]) if dates else None,
+            "aggregation": aggregation,
+        }
+        slices = [(coin, self.columns[coin][lo:hi]) for coin in coins]
+
+        if aggregation == "depeg":
+            bound = peg * threshold
+            rows = [row for coin, prices in slices for row in _depegs(coin, dates, prices, peg, bound)]
+            result.update(peg=peg, threshold=threshold, coins_checked=len(slices))
+            result["depegs"] = RecordTable(rows, ("coin", "start", "end", "days", "worst_price", "max_deviation_pct"))
+            return result
+
+        if aggregation == "series":
+            # One row per day rather than per (day, coin) keeps the default 5 coins x 30 days
+            # well inside the tool output budget; days without any price are left out
+            rows = []
+            for position, date in enumerate(dates):
+                day = [prices[position] for _, prices in slices]
+                if any(price == price for price in day):
+                    rows.append(TableRow(format_day(date), *(price if price == price else None for price in day)))
+            result["prices"] = RecordTable(rows, ("date", *(coin for coin, _ in slices)))
+            return result
+
+        rows = []
+        for coin, prices in slices:
+            present = [(price, date) for date, price in zip(dates, prices) if price == price]
+            if not present:
+                continue
+            if aggregation == "min":
+                price, date = min(present)
+                rows.append(TableRow(coin, price, format_day(date), len(present)))
+            elif aggregation == "max":
+                price, date = max(present)
+                rows.append(TableRow(coin, price, format_day(date), len(present)))
+            elif aggregation == "mean":
+                rows.append(TableRow(coin, math.fsum(price for price, _ in present) / len(present), len(present)))
+            else:
+                (first, first_date), (last, last_date) = present[0], present[-1]
+                change = (last / first - 1) * 100 if first else None
+                rows.append(TableRow(coin, format_day(first_date), first, format_day(last_date), last, change))
+        labels = {
+            "min": ("coin", "min_price", "date", "days"),
+            "max": ("coin", "max_price", "date", "days"),
+            "mean": ("coin", "mean_price", "days"),
+            "change": ("coin", "first_date", "first_price", "last_date", "last_price", "change_pct"),
+        }[aggregation]
+        result["prices"] = RecordTable(rows, labels)
+        return result
+
+
+def _depegs(coin: str, dates: array, prices: array, peg: float, bound: float) -> List[TableRow]:
+    """The maximal runs of days on which `coin` traded more than `bound` away from `peg`."""
+    rows = []
+    run_start = worst = None
+    for position in range(len(prices) + 1):
+        price = prices[position] if position < len(prices) else math.nan
+        if price == price and abs(price - peg) > bound:
+            if run_start is None:
+                run_start, worst = position, price
+            elif abs(price - peg) > abs(worst - peg):
+                worst = price
+            continue
+        if run_start is not None:
+            rows.append(TableRow(
+                coin, format_day(dates[run_start]), format_day(dates[position - 1]), position - run_start,
+                worst, abs(worst - peg) / peg * 100,
+            ))
+            run_start = None
+    return rows
+
+
+class PriceHistoryStore:
+    """
+    The current price history of this process, persisted so a restart does not download it again.
+
+    The dataset loader asks `needs_download` first: the history is only
+    fetched when a day is missing, and at most once per `resync` seconds while
+    upstream has not published that day yet. Each column is stored in SQLite as
+    the raw bytes of its array (the dates under the empty name), which load back
+    without any parsing.
+
+    Args:
+        path (Optional[str]): Location of the SQLite database file; None keeps the history in memory only.
+        resync (float): Minimum seconds between downloads while the newest day is missing.
+    """
+
+    def __init__(self, path: Optional[str], resync: float = 3600.0):
+        self.path = path
+        self.resync = resync
+        self._history: Optional[PriceHistory] = None
+        self._downloaded_at: Optional[float] = None
+        self._connection = sqlite_connector(path)
+        self._lock = threading.Lock()
+        self._counters = {"downloads": 0, "days_added": 0, "skipped": 0}
+        if path:
+            with self._connection() as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS price_columns (name TEXT PRIMARY KEY, data BLOB)")
+
+    def _load(self) -> PriceHistory:
+        if not self.path:
+            return PriceHistory()
+        dates = array("q")
+        columns: Dict[str, array] = {}
+        for name, data in self._connection().execute("SELECT name, data FROM price_columns"):
+            column = array("q" if name == "" else "d")
+            column.frombytes(data)
+            if name == "":
+                dates = column
+            else:
+                columns[name] = column
+        if any(len(column) != len(dates) for column in columns.values()) or any(date % DAY for date in dates):
+            # Not written by this version; start over from upstream
+            return PriceHistory()
+        return PriceHistory(dates, dict(sorted(columns.items())))
+
+    def _save(self, history: PriceHistory) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM price_columns")
+            conn.executemany(
+                "INSERT INTO price_columns VALUES (?, ?)",
+                [("", history.dates.tobytes())] + [(coin, column.tobytes()) for coin, column in history.columns.items()],
+            )
+
+    def current(self) -> PriceHistory:
+        """Returns the history held by this process, reading it from disk on first use."""
+        if self._history is None:
+            with self._lock:
+                if self._history is None:
+                    self._history = self._load()
+        return self._history
+
+    def needs_download(self) -> bool:
+        """Whether the loader should fetch the history from upstream now."""
+        now = time.time()
+        history = self.current()
+        if not history.is_due(now):
+            return False
+        return not history.dates or self._downloaded_at is None or now - self._downloaded_at >= self.resync
+
+    def skip(self) -> PriceHistory:
+        """Records a load that needed no download and returns the current history."""
+        with self._lock:
+            self._counters["skipped"] += 1
+        return self.current()
+
+    def ingest(self, entries: List[Dict[str, Any]]) -> PriceHistory:
+        """Merges a downloaded history, persists it if anything changed and returns it."""
+        current = self.current()
+        history = current.merge(entries)
+        with self._lock:
+            self._downloaded_at = time.time()
+            self._counters["downloads"] += 1
+            self._counters["days_added"] += len(history) - len(current)
+            self._history = history
+        if history is not current and self.path:
+            self._save(history)
+        return history
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the download counters and the extent of the history in memory."""
+        history = self._history
+        return {
+            **self._counters,
+            "days": len(history) if history is not None else None,
+            "coins": len(history.columns) if history is not None else None,
+            "last_date": format_day(history.last_date) if history is not None and history.dates else None,
+        }
+
+
+# Daily stablecoin prices behind Get_Stable_Coin_Prices; set PRICE_HISTORY_PATH to an empty
+# string to keep the history in memory only
+price_history = PriceHistoryStore(
+    os.getenv("PRICE_HISTORY_PATH", shared_path("price_history.sqlite3", "price_history.sqlite3")),
+    resync=float(os.getenv("PRICE_HISTORY_RESYNC", "3600")),
+)
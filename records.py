@@ -0,0 +1,145 @@
+import math
+from array import array
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+
+class PoolRecord:
+    """
+    Compact projection of one yields.llama.fi pool.
+
+    Only the fields the tools read are kept, so holding every pool of a
+    snapshot costs a fraction of the full decoded dictionaries.
+    """
+
+    __slots__ = ("project", "symbol", "tvl_usd", "apy", "chain")
+
+    def __init__(self, project: str, symbol: str, tvl_usd: float, apy: Optional[float], chain: str):
+        self.project = project
+        self.symbol = symbol
+        self.tvl_usd = tvl_usd
+        self.apy = apy
+        self.chain = chain
+
+    @classmethod
+    def from_api(cls, pool: Dict[str, Any]) -> "PoolRecord":
+        """Builds a record from a raw pool dictionary."""
+        return cls(
+            pool.get("project", "Unknown"),
+            pool.get("symbol", "Unknown"),
+            pool.get("tvlUsd") or 0,
+            pool.get("apy", "N/A"),
+            pool.get("chain", "Unknown"),
+        )
+
+    def values(self) -> Tuple:
+        return self.project, self.symbol, self.tvl_usd, self.apy, self.chain
+
+    def __repr__(self) -> str:
+        return f"PoolRecord({self.project!r}, {self.symbol!r}, {self.tvl_usd!r}, {self.apy!r}, {self.chain!r})"
+
+
+class StablecoinRecord:
+    """Compact projection of one stablecoins.llama.fi `peggedAssets` entry."""
+
+    __slots__ = ("name", "symbol", "price", "gecko_id")
+
+    def __init__(self, name: str, symbol: str, price: Optional[float], gecko_id: str):
+        self.name = name
+        self.symbol = symbol
+        self.price = price
+        self.gecko_id = gecko_id
+
+    @classmethod
+    def from_api(cls, coin: Dict[str, Any]) -> "StablecoinRecord":
+        """Builds a record from a raw `peggedAssets` dictionary."""
+        return cls(
+            coin.get("name", "Unknown"),
+            coin.get("symbol", "Unknown"),
+            coin.get("price", 0.0),
+            coin.get("gecko_id", "Unknown"),
+        )
+
+    def values(self) -> Tuple:
+        return self.name, self.symbol, self.price, self.gecko_id
+
+    def __repr__(self) -> str:
+        return f"StablecoinRecord({self.name!r}, {self.symbol!r}, {self.price!r}, {self.gecko_id!r})"
+
+
+class PriceSnapshot:
+    """
+    One stablecoinprices entry held as two parallel columns.
+
+    Coin ids are kept in a tuple and prices in a float array (missing prices
+    as NaN), instead of one boxed float per coin in a dictionary.
+    """
+
+    __slots__ = ("date", "coins", "prices")
+
+    def __init__(self, date: Optional[int], coins: Sequence[str], prices: Iterable[Optional[float]]):
+        self.date = date
+        self.coins = tuple(coins)
+        self.prices = array("d", (math.nan if price is None else price for price in prices))
+
+    @classmethod
+    def from_api(cls, entry: Dict[str, Any]) -> "PriceSnapshot":
+        """Builds a snapshot from a raw `{"date": ..., "prices": {...}}` entry."""
+        prices = entry.get("prices") or {}
+        return cls(entry.get("date"), prices.keys(), prices.values())
+
+    def __len__(self) -> int:
+        return len(self.coins)
+
+    def items(self) -> Iterable[Tuple[str, Optional[float]]]:
+        """Yields (coin, price) pairs, with None for missing prices."""
+        for coin, price in zip(self.coins, self.prices):
+            yield coin, None if math.isnan(price) else price
+
+    def select(self, coins: Iterable[str]) -> "PriceSnapshot":
+        """Returns a snapshot with only the given coin ids, in the given order; unknown ids are skipped."""
+        positions = {coin: i for i, coin in enumerate(self.coins)}
+        picked = [positions[coin] for coin in dict.fromkeys(coins) if coin in positions]
+        return PriceSnapshot(self.date, [self.coins[i] for i in picked], [self.prices[i] for i in picked])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the entry in the API's original shape."""
+        return {"date": self.date, "prices": dict(self.items())}
+
+
+class TableRow:
+    """A row computed on the fly, such as a price history aggregate, for use in a `RecordTable`."""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, *fields: Any):
+        self.fields = fields
+
+    def values(self) -> Tuple:
+        return self.fields
+
+    def __repr__(self) -> str:
+        return f"TableRow{self.fields!r}"
+
+
+class RecordTable:
+    """
+    Records of one type together with the keys a tool output shows them under.
+
+    Args:
+        records (Sequence): `PoolRecord`, `StablecoinRecord` or `TableRow` instances.
+        labels (Tuple[str, ...]): Output key for each position of `record.values()`.
+        key (Optional[str]): Wraps the rows in `{key: rows}` when set.
+    """
+
+    __slots__ = ("records", "labels", "key")
+
+    def __init__(self, records: Sequence, labels: Tuple[str, ...], key: Optional[str] = None):
+        self.records = records
+        self.labels = labels
+        self.key = key
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from functools import cached_property
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from shared_state import FileLock, shared_path
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_PATH = os.getenv("ASSISTANT_REGISTRY_PATH", shared_path("assistant_registry.json", ".assistant_registry.json"))
+
+
+def fingerprint(name: str, instructions: str, model: str, tools: List[Dict[str, Any]]) -> str:
+    """
+    Hashes everything that defines an assistant into a stable fingerprint.
+
+    Args:
+        name (str): Assistant name.
+        instructions (str): System instructions.
+        model (str): Model name.
+        tools (List[Dict[str, Any]]): Tool definitions, including their JSON schemas.
+
+    Returns:
+        str: Hex SHA-256 of the canonical JSON encoding.
+    """
+    payload = json.dumps(
+        {"name": name, "instructions": instructions, "model": model, "tools": tools},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AssistantRegistry:
+    """
+    Resolves the assistant id for a given configuration without creating one per process.
+
+    The id is looked up, in order, from the local registry file, the
+    OPENAI_ASSISTANT_ID environment variable and the account's assistants
+    (matched on the `fingerprint` metadata). A known id is checked with one
+    `retrieve` per process, and ignored if its assistant has been deleted. An
+    assistant is only created or updated when no match for the current
+    fingerprint exists. The result
+    is written back to the registry file so later processes skip the API.
+    Processes resolving at the same time take turns under a lock file next to
+    the registry, so workers starting together create at most one assistant.
+
+    Args:
+        name (str): Assistant name.
+        instructions (str): System instructions.
+        model (str): Model name.
+        tools (Union[List[Dict[str, Any]], Callable[[], List[Dict[str, Any]]]]): Tool definitions
+            passed to `assistants.create`, or a function returning them on first use.
+        path (str): Location of the persisted registry file.
+    """
+
+    def __init__(self, name: str, instructions: str, model: str,
+                 tools: Union[List[Dict[str, Any]], Callable[[], List[Dict[str, Any]]]], path: str = REGISTRY_PATH):
+        self.name = name
+        self.instructions = instructions
+        self.model = model
+        self._tools = tools
+        self.path = path
+        self._assistant_id: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @cached_property
+    def tools(self) -> List[Dict[str, Any]]:
+        return self._tools() if callable(self._tools) else self._tools
+
+    @cached_property
+    def fingerprint(self) -> str:
+        return fingerprint(self.name, self.instructions, self.model, self.tools)
+
+    @property
+    def assistant_id(self) -> Optional[str]:
+        """The resolved assistant id, or None before the first request."""
+        return self._assistant_id
+
+    def get_assistant_id(self, client) -> str:
+        """
+        Returns the id of an assistant matching the current fingerprint, resolving it on first use.
+
+        Args:
+            client: A sync `OpenAI` client.
+
+        Returns:
+            str: The assistant id.
+        """
+        if self._assistant_id is not None:
+            return self._assistant_id
+        with self._lock:
+            if self._assistant_id is None:
+                with FileLock(f"{self.path}.lock"):
+                    self._assistant_id = self._resolve(client)
+        return self._assistant_id
+
+    def _resolve(self, client) -> str:
+        registry = self._read()
+        entry = registry.get(self.name)
+
+        # A known assistant with an outdated configuration is updated in place
+        known_id = (entry or {}).get("id") or os.getenv("OPENAI_ASSISTANT_ID")
+        assistant_id = self._update(client, known_id) if known_id else None
+        if assistant_id is None:
+            assistant_id = self._find(client) or self._create(client)
+
+        resolved = {"id": assistant_id, "fingerprint": self.fingerprint}
+        if entry != resolved:
+            registry[self.name] = resolved
+            self._write(registry)
+        return assistant_id
+
+    def _params(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "instructions": self.instructions,
+            "tools": self.tools,
+            "model": self.model,
+            "metadata": {"fingerprint": self.fingerprint},
+        }
+
+    def _update(self, client, assistant_id: str) -> Optional[str]:
+        """Brings a known assistant to the current fingerprint; returns None if it no longer exists."""
+        from openai import NotFoundError
+        try:
+            current = client.beta.assistants.retrieve(assistant_id)
+        except NotFoundError:
+            logger.warning("assistant %s no longer exists, resolving another one", assistant_id)
+            return None
+        if (current.metadata or {}).get("fingerprint") != self.fingerprint:
+            logger.info("updating assistant %s to fingerprint %s", assistant_id, self.fingerprint[:12])
+            client.beta.assistants.update(assistant_id, **self._params())
+        return assistant_id
+
+    def _find(self, client) -> Optional[str]:
+        # Iterating the page fetches the following ones as needed
+        for assistant in client.beta.assistants.list(limit=100):
+            if (assistant.metadata or {}).get("fingerprint") == self.fingerprint:
+                return assistant.id
+        return None
+
+    def _create(self, client) -> str:
+        logger.info("creating assistant with fingerprint %s", self.fingerprint[:12])
+        return client.beta.assistants.create(**self._params()).id
+
+    def _read(self) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, registry: Dict[str, Dict[str, str]]) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            # Write to a temporary file first so concurrent readers never see a partial registry
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(registry, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("could not persist the assistant registry to %s: %s", self.path, e)
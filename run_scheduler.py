@@ -0,0 +1,223 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from tracing import span
+
+# Statuses after which a run needs no more polling
+TERMINAL_STATUSES = frozenset({"requires_action", "cancelled", "completed", "failed", "expired", "incomplete"})
+
+
+class SchedulerSaturated(Exception):
+    """Raised when a request cannot be admitted; `retry_after` is the suggested wait in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many assistant runs in flight, retry in {retry_after} s.")
+        self.retry_after = retry_after
+
+
+class RunScheduler:
+    """
+    Owns the assistant runs of this process: admits requests and polls their runs.
+
+    At most `max_runs` requests drive runs at once; up to `max_queue` more wait
+    for a slot for at most `queue_timeout` seconds, and anything beyond that is
+    rejected with `SchedulerSaturated` so the caller can answer 429.
+
+    Runs are polled with intervals that start at `poll_initial` and grow by
+    `poll_factor` up to `poll_max`, each with ±`poll_jitter` random spread, so
+    short runs finish quickly and long ones do not hammer the API. A rate-limited
+    poll jumps straight to the longest interval.
+
+    Args:
+        max_runs (int): Concurrent requests allowed to drive runs.
+        max_queue (int): Requests allowed to wait for a slot.
+        queue_timeout (float): Seconds a queued request waits before it is rejected.
+        poll_initial (float): First poll interval in seconds.
+        poll_max (float): Longest poll interval in seconds.
+        poll_factor (float): Growth of the interval after each unfinished poll.
+        poll_jitter (float): Relative random spread of each interval.
+    """
+
+    def __init__(self, max_runs: int = 32, max_queue: int = 64, queue_timeout: float = 30.0,
+                 poll_initial: float = 0.2, poll_max: float = 2.0, poll_factor: float = 1.5, poll_jitter: float = 0.2):
+        self.max_runs = max_runs
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.poll_factor = poll_factor
+        self.poll_jitter = poll_jitter
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._active = 0
+        self._waiting = 0
+        self._runs: Dict[str, str] = {}
+        # Smoothed seconds a request holds its slot, used for Retry-After
+        self._slot_seconds = 5.0
+        self._lock = threading.Lock()
+        self._counters = {"admitted": 0, "rejected": 0, "queue_timeouts": 0, "runs": 0, "polls": 0, "rate_limited": 0}
+
+    # Admission
+
+    def retry_after(self) -> int:
+        """Estimated seconds until a slot frees up for a new request."""
+        backlog = (self._waiting + 1) / self.max_runs
+        return max(1, min(60, round(backlog * self._slot_seconds)))
+
+    async def acquire(self) -> None:
+        """
+        Takes a run slot, waiting in the queue if all slots are busy.
+
+        Raises:
+            SchedulerSaturated: If the queue is full or the wait exceeds `queue_timeout`.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_runs)
+        if self._semaphore.locked():
+            if self._waiting >= self.max_queue:
+                self._counters["rejected"] += 1
+                raise SchedulerSaturated(self.retry_after())
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._counters["queue_timeouts"] += 1
+                raise SchedulerSaturated(self.retry_after())
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self._active += 1
+        self._counters["admitted"] += 1
+
+    def release(self, held: float) -> None:
+        """Frees a slot taken with `acquire` that was held for `held` seconds."""
+        self._active -= 1
+        self._slot_seconds = 0.8 * self._slot_seconds + 0.2 * held
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Holds a run slot for the duration of the block; see `acquire`."""
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    # Polling
+
+    def _intervals(self):
+        interval = self.poll_initial
+        while True:
+            yield interval * random.uniform(1 - self.poll_jitter, 1 + self.poll_jitter)
+            interval = min(self.poll_max, interval * self.poll_factor)
+
+    def _track(self, run: Any) -> bool:
+        """Records the run's latest status; returns True once it needs no more polling."""
+        done = run.status in TERMINAL_STATUSES
+        with self._lock:
+            if done:
+                self._runs.pop(run.id, None)
+            else:
+                self._runs[run.id] = run.status
+        return done
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def poll(self, client, run: Any) -> Any:
+        """
+        Polls `run` with `client` (OpenAI) until it reaches a terminal status.
+
+        Args:
+            client: The sync OpenAI client.
+            run: The run returned by create or submit_tool_outputs.
+
+        Returns:
+            The run in its terminal status.
+        """
+        # Imported on first poll rather than with the module, which keeps `openai` off the startup path
+        from openai import RateLimitError
+        intervals = self._intervals()
+        with span("run.poll"):
+            while not self._track(run):
+                time.sleep(next(intervals))
+                self._count("polls")
+                try:
+                    run = client.beta.threads.runs.retrieve(run.id, thread_id=run.thread_id)
+                except RateLimitError:
+                    self._count("rate_limited")
+                    time.sleep(self.poll_max)
+        return run
+
+    async def poll_async(self, client, run: Any) -> Any:
+        """Async counterpart of `poll` for the AsyncOpenAI client."""
+        from openai import RateLimitError
+        intervals = self._intervals()
+        with span("run.poll"):
+            while not self._track(run):
+                await asyncio.sleep(next(intervals))
+                self._count("polls")
+                try:
+                    run = await client.beta.threads.runs.retrieve(run.id, thread_id=run.thread_id)
+                except RateLimitError:
+                    self._count("rate_limited")
+                    await asyncio.sleep(self.poll_max)
+        return run
+
+    def create_and_poll(self, client, thread_id: str, **params) -> Any:
+        """Starts a run on `thread_id` and polls it; replaces `runs.create_and_poll`."""
+        with span("run.create"):
+            run = client.beta.threads.runs.create(thread_id=thread_id, **params)
+        self._count("runs")
+        return self.poll(client, run)
+
+    async def create_and_poll_async(self, client, thread_id: str, **params) -> Any:
+        """Async counterpart of `create_and_poll`."""
+        with span("run.create"):
+            run = await client.beta.threads.runs.create(thread_id=thread_id, **params)
+        self._count("runs")
+        return await self.poll_async(client, run)
+
+    def submit_tool_outputs_and_poll(self, client, thread_id: str, run_id: str, tool_outputs) -> Any:
+        """Submits tool outputs and polls the resumed run; replaces `runs.submit_tool_outputs_and_poll`."""
+        with span("run.submit_tool_outputs"):
+            run = client.beta.threads.runs.submit_tool_outputs(run_id, thread_id=thread_id, tool_outputs=tool_outputs)
+        return self.poll(client, run)
+
+    async def submit_tool_outputs_and_poll_async(self, client, thread_id: str, run_id: str, tool_outputs) -> Any:
+        """Async counterpart of `submit_tool_outputs_and_poll`."""
+        with span("run.submit_tool_outputs"):
+            run = await client.beta.threads.runs.submit_tool_outputs(run_id, thread_id=thread_id, tool_outputs=tool_outputs)
+        return await self.poll_async(client, run)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the slot usage, queue depth, polling counters and the runs being polled."""
+        with self._lock:
+            runs = self._counters["runs"]
+            return {
+                **self._counters,
+                "in_flight": self._active,
+                "queue_depth": self._waiting,
+                "max_runs": self.max_runs,
+                "max_queue": self.max_queue,
+                "polls_per_run": round(self._counters["polls"] / runs, 2) if runs else None,
+                "polling": dict(self._runs),
+            }
+
+
+# Shared scheduler for every assistant run of this process
+run_scheduler = RunScheduler(
+    max_runs=int(os.getenv("RUN_MAX_IN_FLIGHT", "32")),
+    max_queue=int(os.getenv("RUN_QUEUE_SIZE", "64")),
+    queue_timeout=float(os.getenv("RUN_QUEUE_TIMEOUT", "30")),
+    poll_initial=float(os.getenv("RUN_POLL_INITIAL", "0.2")),
+    poll_max=float(os.getenv("RUN_POLL_MAX", "2.0")),
+)
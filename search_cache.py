@@ -0,0 +1,204 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared_state import SHARED_STATE_DIR, shared_path, sqlite_connector
+
+_WHITESPACE = re.compile(r"\s+")
+_PRICE_LIKE = re.compile(r"\b(price|prices|usd|worth|cost|rate|market ?cap|value|trading at)\b|\$")
+_NEWS_LIKE = re.compile(r"\b(news|latest|today|announce\w*|update\w*|report\w*|launch\w*)\b")
+
+# `InternetSearchInput.max_results` when the model passes null
+DEFAULT_MAX_RESULTS = 5
+
+
+def normalize_query(query: str, region: Optional[str]) -> Tuple[str, str]:
+    """Lowercases and collapses whitespace so trivially different queries share a cache entry."""
+    return _WHITESPACE.sub(" ", query).strip().lower(), (region or "wt-wt").strip().lower()
+
+
+class SearchCacheEntry:
+    __slots__ = ("max_results", "results", "expires_at")
+
+    def __init__(self, max_results: int, results: List[Dict], expires_at: float):
+        self.max_results = max_results
+        self.results = results
+        self.expires_at = expires_at
+
+
+class MemoryBackend:
+    """In-process LRU store for search results."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, SearchCacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[SearchCacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: SearchCacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk store so warm search results survive restarts."""
+
+    def __init__(self, path: str, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._connection = sqlite_connector(path)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                " key TEXT PRIMARY KEY, max_results INTEGER, results TEXT,"
+                " expires_at REAL, used_at REAL)"
+            )
+
+    def get(self, key: str) -> Optional[SearchCacheEntry]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT max_results, results, expires_at FROM search_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE search_cache SET used_at = ? WHERE key = ?", (time.time(), key))
+        return SearchCacheEntry(row[0], json.loads(row[1]), row[2])
+
+    def set(self, key: str, entry: SearchCacheEntry) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?)",
+                (key, entry.max_results, json.dumps(entry.results), entry.expires_at, time.time()),
+            )
+            # Evict the least recently used rows beyond the size limit
+            conn.execute(
+                "DELETE FROM search_cache WHERE key IN ("
+                " SELECT key FROM search_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key: str) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+
+
+class SearchCache:
+    """
+    LRU + TTL cache for internet search results.
+
+    Keys are the normalized (query, region); an entry fetched with a larger
+    `max_results` also answers smaller requests. Price-like queries expire
+    quickly, news-like queries are kept longer.
+
+    Args:
+        backend: A `MemoryBackend` or `SQLiteBackend`.
+        default_ttl (float): TTL for ordinary queries, in seconds.
+        price_ttl (float): TTL for price-like queries.
+        news_ttl (float): TTL for news-like queries.
+    """
+
+    def __init__(self, backend, default_ttl: float = 300.0, price_ttl: float = 60.0, news_ttl: float = 900.0):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.price_ttl = price_ttl
+        self.news_ttl = news_ttl
+        self._counters = {"hits": 0, "superset_hits": 0, "misses": 0, "expired": 0}
+
+    def ttl_for(self, query: str) -> float:
+        """Returns the TTL for a normalized query."""
+        if _PRICE_LIKE.search(query):
+            return self.price_ttl
+        if _NEWS_LIKE.search(query):
+            return self.news_ttl
+        return self.default_ttl
+
+    @staticmethod
+    def _key(query: str, region: str) -> str:
+        return f"{region}\x1f{query}"
+
+    def get(self, query: str, region: Optional[str], max_results: Optional[int]) -> Optional[List[Dict]]:
+        """
+        Returns cached results for the request, or None on a miss.
+
+        Args:
+            query (str): The raw search query.
+            region (Optional[str]): The search region.
+            max_results (Optional[int]): The number of results requested; DEFAULT_MAX_RESULTS if None.
+
+        Returns:
+            Optional[List[Dict]]: Up to `max_results` cached results.
+        """
+        if max_results is None:
+            max_results = DEFAULT_MAX_RESULTS
+        key = self._key(*normalize_query(query, region))
+        entry = self.backend.get(key)
+        # Rows stored without a size by earlier versions never match
+        if entry is None or entry.max_results is None or entry.max_results < max_results:
+            self._counters["misses"] += 1
+            return None
+        if entry.expires_at <= time.time():
+            self._counters["expired"] += 1
+            self.backend.delete(key)
+            return None
+        self._counters["superset_hits" if entry.max_results > max_results else "hits"] += 1
+        return entry.results[:max_results]
+
+    def set(self, query: str, region: Optional[str], max_results: Optional[int], results: List[Dict]) -> None:
+        """Stores the results of a search performed with `max_results` (DEFAULT_MAX_RESULTS if None)."""
+        if max_results is None:
+            max_results = DEFAULT_MAX_RESULTS
+        normalized_query, normalized_region = normalize_query(query, region)
+        key = self._key(normalized_query, normalized_region)
+        existing = self.backend.get(key)
+        if (existing is not None and existing.max_results is not None and existing.max_results > max_results
+                and existing.expires_at > time.time()):
+            # Keep the larger entry; it still answers this request size
+            return
+        expires_at = time.time() + self.ttl_for(normalized_query)
+        self.backend.set(key, SearchCacheEntry(max_results, list(results), expires_at))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._counters, "entries": len(self.backend), "backend": type(self.backend).__name__}
+
+
+def _build_search_cache() -> SearchCache:
+    # Worker processes sharing a state directory share one on-disk cache
+    if os.getenv("SEARCH_CACHE_BACKEND", "sqlite" if SHARED_STATE_DIR else "memory") == "sqlite":
+        backend = SQLiteBackend(os.getenv("SEARCH_CACHE_PATH", shared_path("search_cache.sqlite3", "search_cache.sqlite3")))
+    else:
+        backend = MemoryBackend(int(os.getenv("SEARCH_CACHE_SIZE", "512")))
+    return SearchCache(
+        backend,
+        default_ttl=float(os.getenv("SEARCH_CACHE_TTL", "300")),
+        price_ttl=float(os.getenv("SEARCH_CACHE_PRICE_TTL", "60")),
+        news_ttl=float(os.getenv("SEARCH_CACHE_NEWS_TTL", "900")),
+    )
+
+
+search_cache = _build_search_cache()
@@ -0,0 +1,188 @@
+import json
+import math
+import os
+from typing import Any, Optional, Tuple
+
+from pydantic import BaseModel
+
+from records import PriceSnapshot, RecordTable
+
+# Pinned in requirements.txt; the json fallback is slower than model_dump() -> json.dumps
+# for some tools (see benchmarks/bench_serialize.py) and only keeps the tools working without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# "verbose" keeps the display keys and shapes the tools always returned;
+# "compact" sends tables as columns + rows, rounds floats and drops null fields
+TOOL_OUTPUT_FORMAT = os.getenv("TOOL_OUTPUT_FORMAT", "verbose")
+# Default size limit of one tool output, in UTF-8 bytes (roughly 4 bytes per token)
+TOOL_OUTPUT_BUDGET = int(os.getenv("TOOL_OUTPUT_BUDGET", "6000"))
+# Decimal places kept for floats below 1000 in compact output; larger values become integers
+TOOL_OUTPUT_DIGITS = int(os.getenv("TOOL_OUTPUT_DIGITS", "4"))
+
+
+def _verbose(obj: Any) -> Any:
+    """`default` hook: encodes the records types in their original tool output shape."""
+    if isinstance(obj, RecordTable):
+        labels = obj.labels
+        rows = [dict(zip(labels, record.values())) for record in obj.records]
+        return {obj.key: rows} if obj.key else rows
+    if isinstance(obj, PriceSnapshot):
+        return obj.to_dict()
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _round(value: float, scale: float) -> Any:
+    if value != value or value in (math.inf, -math.inf):
+        return None
+    # Amounts such as TVL gain nothing from decimals; prices and APYs keep `digits` places.
+    # floor(x + 0.5) is several times cheaper than round(x, n) and exact enough for display.
+    if value >= 1000 or value <= -1000:
+        return int(math.floor(value + 0.5))
+    return math.floor(value * scale + 0.5) / scale
+
+
+def _compact_value(value: Any, scale: float, digits: int) -> Any:
+    if type(value) is float:
+        return _round(value, scale)
+    if value is None or type(value) in (str, int, bool):
+        return value
+    return compact(value, digits)
+
+
+def compact(obj: Any, digits: int = TOOL_OUTPUT_DIGITS) -> Any:
+    """
+    Converts a tool result into its token-saving form.
+
+    Tables become `{"columns": [...], "rows": [[...]]}`, floats are rounded to
+    `digits` decimal places (integers from 1000 up) and null or empty fields are dropped.
+    """
+    scale = 10.0 ** digits
+    if isinstance(obj, float):
+        return _round(obj, scale)
+    if isinstance(obj, RecordTable):
+        table = {
+            "columns": list(obj.labels),
+            "rows": [[_compact_value(value, scale, digits) for value in record.values()] for record in obj.records],
+        }
+        return {obj.key: table} if obj.key else table
+    if isinstance(obj, PriceSnapshot):
+        prices = {coin: _round(price, scale) for coin, price in zip(obj.coins, obj.prices) if price == price}
+        return {"date": obj.date, "prices": prices}
+    if isinstance(obj, BaseModel):
+        return compact(obj.model_dump(), digits)
+    if isinstance(obj, dict):
+        return {
+            key: _compact_value(value, scale, digits)
+            for key, value in obj.items()
+            if value is not None and value != "" and value != [] and value != {}
+        }
+    if isinstance(obj, (list, tuple)):
+        return [_compact_value(value, scale, digits) for value in obj]
+    return obj
+
+
+def dumps(obj: Any) -> str:
+    """Encodes `obj` as compact JSON with orjson when it is installed, falling back to json."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_verbose).decode("utf-8")
+    return json.dumps(obj, default=_verbose, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode_tool_output(result: Any, output_format: str = TOOL_OUTPUT_FORMAT) -> str:
+    """
+    Serializes a tool result straight to the `output` string of submit_tool_outputs.
+
+    Args:
+        result (Any): Records, a `RecordTable`, a `PriceSnapshot`, a Pydantic model or plain JSON data.
+        output_format (str): "verbose" or "compact".
+
+    Returns:
+        str: The JSON text.
+    """
+    if output_format == "compact":
+        result = compact(result)
+    return dumps(result)
+
+
+def _prefix(result: Any, count: int) -> Any:
+    """Returns `result` with only the first `count` items of its main sequence."""
+    if isinstance(result, RecordTable):
+        return RecordTable(result.records[:count], result.labels, result.key)
+    if isinstance(result, PriceSnapshot):
+        return PriceSnapshot(result.date, result.coins[:count], result.prices[:count])
+    if isinstance(result, list):
+        return result[:count]
+    key = _main_key(result)
+    return {**result, key: _prefix(result[key], count)}
+
+
+def _main_key(result: dict) -> Optional[str]:
+    """The key of the largest shrinkable value of a dict result, e.g. "results" or "pools"."""
+    candidates = [key for key, value in result.items() if isinstance(value, (list, RecordTable, PriceSnapshot))]
+    return max(candidates, key=lambda key: len(result[key])) if candidates else None
+
+
+def _length(result: Any) -> Optional[int]:
+    if isinstance(result, (list, RecordTable, PriceSnapshot)):
+        return len(result)
+    if isinstance(result, dict):
+        key = _main_key(result)
+        return None if key is None else _length(result[key])
+    return None
+
+
+def _with_marker(text: str, shown: int, omitted: int) -> str:
+    """Appends a truncation marker as a last list item or a last object key."""
+    marker = dumps({"truncated": {"shown": shown, "omitted": omitted}})
+    if text.endswith("]"):
+        return f"{text[:-1]}{',' if text != '[]' else ''}{marker}]"
+    # Objects get the marker's key/value pair merged in
+    return f"{text[:-1]}{',' if text != '{}' else ''}{marker[1:]}"
+
+
+def fit_to_budget(result: Any, budget: Optional[int] = None, output_format: str = TOOL_OUTPUT_FORMAT) -> Tuple[str, int]:
+    """
+    Encodes a tool result and, if it exceeds `budget` bytes, keeps the longest
+    prefix of its main list (pools, coins, search results, prices) that fits,
+    followed by a `"truncated": {"shown", "omitted"}` marker.
+
+    Truncation is deterministic: the same result and budget always give the
+    same output. A result without a list to shorten is cut as plain text.
+
+    Args:
+        result (Any): The tool result.
+        budget (Optional[int]): Maximum output size in UTF-8 bytes; defaults to TOOL_OUTPUT_BUDGET.
+        output_format (str): "verbose" or "compact".
+
+    Returns:
+        Tuple[str, int]: The output text and the size in bytes before truncation.
+    """
+    budget = TOOL_OUTPUT_BUDGET if budget is None else budget
+    if isinstance(result, BaseModel):
+        result = result.model_dump()
+    text = encode_tool_output(result, output_format)
+    size = len(text.encode("utf-8"))
+    if size <= budget:
+        return text, size
+
+    total = _length(result)
+    if total:
+        # Largest prefix that still fits together with the marker
+        low, high, best = 0, total, None
+        while low <= high:
+            count = (low + high) // 2
+            candidate = _with_marker(encode_tool_output(_prefix(result, count), output_format), count, total - count)
+            if len(candidate.encode("utf-8")) <= budget:
+                best, low = candidate, count + 1
+            else:
+                high = count - 1
+        if best is not None:
+            return best, size
+
+    cut = text.encode("utf-8")[:max(0, budget - 64)].decode("utf-8", "ignore")
+    return dumps({"truncated_output": cut, "original_bytes": size}), size
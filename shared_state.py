@@ -0,0 +1,177 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Directory shared by every worker of one deployment (see gunicorn.conf.py). When it is set, the
+# DefiLlama snapshots, search cache, thread store and assistant registry all live there.
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", "")
+
+
+def private_directory(path: str) -> None:
+    """
+    Creates `path` readable and writable by this user only, or checks an existing one is.
+
+    The directory holds pickled snapshots that every worker loads, so nobody
+    else may be able to write to it.
+
+    Raises:
+        RuntimeError: If `path` is owned by another user or writable by group or others.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if hasattr(os, "getuid") and (info.st_uid != os.getuid() or info.st_mode & 0o022):
+        raise RuntimeError(
+            f"SHARED_STATE_DIR {path} must be owned by uid {os.getuid()} and not writable by group or others "
+            f"(owner uid {info.st_uid}, mode {info.st_mode & 0o777:o}); fix it or point SHARED_STATE_DIR elsewhere."
+        )
+
+
+if SHARED_STATE_DIR:
+    private_directory(SHARED_STATE_DIR)
+
+
+def shared_path(name: str, default: str) -> str:
+    """Returns `name` inside SHARED_STATE_DIR, or `default` when no shared directory is configured."""
+    return os.path.join(SHARED_STATE_DIR, name) if SHARED_STATE_DIR else default
+
+
+def sqlite_connector(path: str) -> Callable[[], sqlite3.Connection]:
+    """
+    Returns a function that gives each calling thread its own connection to `path`.
+
+    sqlite3 connections may not be shared across threads. Every connection
+    uses WAL mode, so readers in other processes do not block the writer,
+    and waits up to 5 seconds for a lock held by another process.
+    """
+    local = threading.local()
+
+    def connection() -> sqlite3.Connection:
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            local.conn = conn
+        return conn
+
+    return connection
+
+
+class FileLock:
+    """
+    Advisory lock on a file, held by at most one process at a time.
+
+    The operating system releases it when the holder exits, however it exits.
+    Where `fcntl` is unavailable (Windows) or the file cannot be opened, the
+    lock is always granted, which is correct for a single process.
+
+    Args:
+        path (str): Location of the lock file; created if missing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Takes the lock; with `blocking=False` returns False instead of waiting for another holder."""
+        if self._fd is not None or fcntl is None:
+            return True
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            logger.warning("could not open lock file %s: %s", self.path, e)
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class SnapshotStore:
+    """
+    SQLite store through which worker processes share the DefiLlama snapshots.
+
+    One process publishes each freshly loaded snapshot as a pickle together
+    with a version number and the wall-clock time it was fetched; the other
+    workers decode a snapshot once per new version and then serve it from
+    memory, so a refresh costs one upstream fetch per deployment rather than
+    one per worker. Only this app writes the file, which is why unpickling it
+    is safe.
+
+    Args:
+        path (str): Location of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite_connector(path)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                " key TEXT PRIMARY KEY, version INTEGER, fetched_at REAL, value BLOB)"
+            )
+
+    def publish(self, key: str, value: Any) -> int:
+        """Stores `value` as the newest snapshot for `key` and returns its version."""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO snapshots VALUES (?, 1, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET version = version + 1, fetched_at = excluded.fetched_at,"
+                " value = excluded.value",
+                (key, time.time(), blob),
+            )
+            return conn.execute("SELECT version FROM snapshots WHERE key = ?", (key,)).fetchone()[0]
+
+    def read(self, key: str, newer_than: int = 0) -> Optional[Tuple[int, float, Any]]:
+        """
+        Returns the snapshot for `key` if its version is above `newer_than`.
+
+        Returns:
+            Optional[Tuple[int, float, Any]]: The version, the snapshot's age in
+            seconds and the decoded value, or None when there is nothing newer.
+        """
+        row = self._connection().execute(
+            "SELECT version, fetched_at, value FROM snapshots WHERE key = ? AND version > ?", (key, newer_than)
+        ).fetchone()
+        if row is None:
+            return None
+        version, fetched_at, blob = row
+        return version, max(0.0, time.time() - fetched_at), pickle.loads(blob)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the version, age and encoded size of every published snapshot."""
+        now = time.time()
+        rows = self._connection().execute("SELECT key, version, fetched_at, length(value) FROM snapshots").fetchall()
+        return {
+            key: {"version": version, "age_seconds": round(now - fetched_at, 1), "bytes": size}
+            for key, version, fetched_at, size in rows
+        }
@@ -0,0 +1,179 @@
+import codecs
+import heapq
+import json
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from pool_index import DEFAULT_TOP_N
+from records import PoolRecord
+
+_WHITESPACE = " \t\n\r"
+
+
+class _ChunkBuffer:
+    """Text buffer fed from an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        # Offset that must survive the next fill (e.g. the start of a string being scanned)
+        self.mark: Optional[int] = None
+        self.exhausted = False
+
+    def fill(self) -> bool:
+        """Appends the next chunk and drops consumed text. Returns False at EOF."""
+        if self.exhausted:
+            return False
+        try:
+            chunk = next(self._chunks)
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            decoded = self._decoder.decode(chunk)
+        except StopIteration:
+            self.exhausted = True
+            decoded = self._decoder.decode(b"", final=True)
+
+        cut = self.pos if self.mark is None else min(self.pos, self.mark)
+        self.text = self.text[cut:] + decoded
+        self.pos -= cut
+        if self.mark is not None:
+            self.mark -= cut
+        return not self.exhausted or bool(decoded)
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it ("" at EOF)."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+
+def _seek_array(buffer: _ChunkBuffer, key: str) -> None:
+    """Advances `buffer` to just after the `[` that opens the top-level `key` array."""
+    depth = 0
+    in_string = False
+    escaped = False
+    pending_key = None
+
+    while True:
+        if buffer.pos >= len(buffer.text):
+            if not buffer.fill():
+                raise ValueError(f"Unexpected format: no '{key}' array in the response.")
+            continue
+
+        char = buffer.text[buffer.pos]
+        buffer.pos += 1
+
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+                if depth == 1:
+                    pending_key = buffer.text[buffer.mark:buffer.pos - 1]
+                buffer.mark = None
+            continue
+
+        if char == '"':
+            in_string = True
+            buffer.mark = buffer.pos
+        elif char in "{[":
+            if char == "[" and depth == 1 and pending_key == key:
+                return
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+        elif char == ",":
+            pending_key = None
+
+
+def iter_json_array(chunks: Iterable[bytes], key: str = "data") -> Iterator[Any]:
+    """
+    Incrementally decodes the items of the top-level `key` array of a JSON document.
+
+    Only one item is materialized at a time, so memory stays proportional to
+    the largest item rather than to the whole payload.
+
+    Args:
+        chunks (Iterable[bytes]): The response body, e.g. `response.iter_content(65536)`.
+        key (str): Name of the top-level array to walk.
+
+    Yields:
+        Any: Each decoded array item.
+
+    Raises:
+        ValueError: If the document is malformed or has no `key` array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = _ChunkBuffer(chunks)
+    _seek_array(buffer, key)
+
+    while True:
+        char = buffer.peek()
+        if char == "]":
+            return
+        if char == ",":
+            buffer.pos += 1
+            continue
+        if char == "":
+            raise ValueError(f"Unexpected end of data inside the '{key}' array.")
+
+        try:
+            item, end = decoder.raw_decode(buffer.text, buffer.pos)
+        except json.JSONDecodeError:
+            # Most likely the item is split across chunks; retry with more data
+            if not buffer.fill():
+                raise
+            continue
+        if end == len(buffer.text) and not buffer.exhausted:
+            # A number at the very end of the buffer may still continue in the next chunk
+            buffer.fill()
+            continue
+        buffer.pos = end
+        yield item
+
+
+def stream_pool_records(chunks: Iterable[bytes]) -> Iterator[PoolRecord]:
+    """Yields a compact `PoolRecord` for every pool in a yields.llama.fi/pools body."""
+    for pool in iter_json_array(chunks, "data"):
+        yield PoolRecord.from_api(pool)
+
+
+def stream_top_pools(
+    chunks: Iterable[bytes],
+    top_n: Optional[int],
+    predicate: Optional[Callable[[PoolRecord], bool]] = None,
+) -> List[PoolRecord]:
+    """
+    Keeps a bounded min-heap of the `top_n` pools by TVL while the body streams in.
+
+    Args:
+        chunks (Iterable[bytes]): The yields.llama.fi/pools response body.
+        top_n (Optional[int]): The number of pools to keep; DEFAULT_TOP_N if None.
+        predicate (Optional[Callable[[PoolRecord], bool]]): Optional filter applied to each pool.
+
+    Returns:
+        List[PoolRecord]: The `top_n` pools ordered by TVL, highest first.
+    """
+    if top_n is None:
+        top_n = DEFAULT_TOP_N
+    if top_n <= 0:
+        return []
+
+    heap: List = []
+    for seq, record in enumerate(stream_pool_records(chunks)):
+        if predicate is not None and not predicate(record):
+            continue
+        # Ties keep the earlier pool, matching a stable descending sort
+        entry = (record.tvl_usd, -seq, record)
+        if len(heap) < top_n:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    return [record for _, _, record in sorted(heap, key=lambda e: e[:2], reverse=True)]
@@ -0,0 +1,43 @@
+import json
+import random
+
+import pytest
+
+from price_history import DAY, PriceHistory
+from serialization import fit_to_budget
+from tool_registry import tool_registry
+from tools import PRICE_HISTORY_DAYS, PRICE_HISTORY_TOP_K, _query_prices
+
+COINS = ["tether", "usd-coin", "dai", "first-digital-usd", "ethena-usde", "paypal-usd", "true-usd", "frax"]
+
+
+def history(days=90):
+    rng = random.Random(3)
+    start = 1_700_000_000 // DAY * DAY
+    return PriceHistory().merge(
+        {"date": start + day * DAY, "prices": {coin: 1 + rng.uniform(-0.003, 0.003) for coin in COINS}}
+        for day in range(days)
+    )
+
+
+@pytest.mark.parametrize("output_format", ["verbose", "compact"])
+def test_default_series_fits_the_output_budget(output_format):
+    result = _query_prices(history(), None, None, None, None, None, "series", None)
+    budget = tool_registry.output_budget("Get_Stable_Coin_Prices")
+
+    text, size = fit_to_budget(result, budget, output_format)
+
+    assert len(text.encode("utf-8")) == size, "the default query was truncated"
+    output = json.loads(text)
+    assert "truncated" not in output
+    assert len(output["prices"]["rows"] if output_format == "compact" else output["prices"]) == PRICE_HISTORY_DAYS
+    assert list(result["prices"].labels) == ["date", *COINS[:PRICE_HISTORY_TOP_K]]
+
+
+def test_series_leaves_out_missing_prices():
+    partial = history(3).merge([{"date": history(3).last_date + DAY, "prices": {"tether": 1.001}}])
+
+    rows = [row.values() for row in partial.query(["tether", "dai"], None, None, "series")["prices"]]
+
+    assert len(rows) == 4
+    assert rows[-1][1:] == (1.001, None)
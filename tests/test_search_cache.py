@@ -0,0 +1,42 @@
+import sqlite3
+
+import pytest
+
+from search_cache import DEFAULT_MAX_RESULTS, MemoryBackend, SearchCache, SQLiteBackend
+
+RESULTS = [{"title": f"result {i}", "href": f"https://example.com/{i}", "body": "..."} for i in range(8)]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    backend = MemoryBackend() if request.param == "memory" else SQLiteBackend(str(tmp_path / "search.sqlite3"))
+    return SearchCache(backend)
+
+
+def test_null_max_results_uses_the_default(cache):
+    assert cache.get("usdt depeg", None, None) is None
+    cache.set("usdt depeg", None, None, RESULTS[:DEFAULT_MAX_RESULTS])
+
+    assert cache.get("usdt depeg", None, None) == RESULTS[:DEFAULT_MAX_RESULTS]
+    assert cache.get("USDT  depeg", None, 3) == RESULTS[:3]
+    # A larger request is not answered by the default-sized entry
+    assert cache.get("usdt depeg", None, 8) is None
+
+
+def test_null_max_results_is_answered_by_a_larger_entry(cache):
+    cache.set("usdc news", None, 8, RESULTS)
+    assert cache.get("usdc news", None, None) == RESULTS[:DEFAULT_MAX_RESULTS]
+    # Storing a default-sized search keeps the larger entry
+    cache.set("usdc news", None, None, RESULTS[:DEFAULT_MAX_RESULTS])
+    assert cache.get("usdc news", None, 8) == RESULTS
+
+
+def test_rows_stored_without_a_size_are_replaced(tmp_path):
+    path = str(tmp_path / "search.sqlite3")
+    cache = SearchCache(SQLiteBackend(path))
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO search_cache VALUES (?, NULL, '[]', 1e12, 0)", (cache._key("dai", "wt-wt"),))
+
+    assert cache.get("dai", None, None) is None
+    cache.set("dai", None, None, RESULTS[:DEFAULT_MAX_RESULTS])
+    assert cache.get("dai", None, None) == RESULTS[:DEFAULT_MAX_RESULTS]
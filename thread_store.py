@@ -0,0 +1,153 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from shared_state import SHARED_STATE_DIR, shared_path, sqlite_connector
+
+
+class ThreadState:
+    """What the app knows locally about one OpenAI thread."""
+
+    __slots__ = ("id", "last_message_id", "last_reply", "updated_at")
+
+    def __init__(self, id: str, last_message_id: Optional[str] = None, last_reply: Optional[str] = None,
+                 updated_at: Optional[float] = None):
+        self.id = id
+        self.last_message_id = last_message_id
+        self.last_reply = last_reply
+        self.updated_at = time.time() if updated_at is None else updated_at
+
+
+class MemoryBackend:
+    """In-process LRU of thread states."""
+
+    blocking = False
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, ThreadState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, thread_id: str) -> Optional[ThreadState]:
+        with self._lock:
+            state = self._entries.get(thread_id)
+            if state is not None:
+                self._entries.move_to_end(thread_id)
+            return state
+
+    def set(self, state: ThreadState) -> None:
+        with self._lock:
+            self._entries[state.id] = state
+            self._entries.move_to_end(state.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk store so known threads survive restarts and are shared between processes."""
+
+    # May wait up to the busy timeout for another worker's write
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._connection = sqlite_connector(path)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS threads ("
+                " id TEXT PRIMARY KEY, last_message_id TEXT, last_reply TEXT, updated_at REAL)"
+            )
+
+    def get(self, thread_id: str) -> Optional[ThreadState]:
+        row = self._connection().execute(
+            "SELECT id, last_message_id, last_reply, updated_at FROM threads WHERE id = ?", (thread_id,)
+        ).fetchone()
+        return ThreadState(*row) if row is not None else None
+
+    def set(self, state: ThreadState) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO threads VALUES (?, ?, ?, ?)",
+                (state.id, state.last_message_id, state.last_reply, state.updated_at),
+            )
+            # Forget the least recently updated threads beyond the size limit
+            conn.execute(
+                "DELETE FROM threads WHERE id IN ("
+                " SELECT id FROM threads ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+
+
+class ThreadStore:
+    """
+    Local record of the threads this app created or has already seen.
+
+    A known thread id is used as-is instead of calling `threads.retrieve`,
+    and the id and text of the last assistant reply are kept per thread.
+
+    Args:
+        backend: A `MemoryBackend` or `SQLiteBackend`.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._counters = {"hits": 0, "misses": 0, "replies": 0}
+
+    def get(self, thread_id: str) -> Optional[ThreadState]:
+        """Returns the state of a known thread, or None if it has to be retrieved from the API."""
+        state = self.backend.get(thread_id)
+        self._counters["hits" if state is not None else "misses"] += 1
+        return state
+
+    def add(self, thread_id: str) -> ThreadState:
+        """Records a thread that was just created or retrieved."""
+        state = self.backend.get(thread_id) or ThreadState(thread_id)
+        self.backend.set(state)
+        return state
+
+    def record_reply(self, thread_id: str, message_id: str, reply: Any) -> None:
+        """Stores the latest assistant message of a thread."""
+        self._counters["replies"] += 1
+        self.backend.set(ThreadState(thread_id, message_id, reply if isinstance(reply, str) else None))
+
+    async def _call(self, method, *args):
+        # An on-disk backend is used from a worker thread so lock waits never stall the event loop
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get_async(self, thread_id: str) -> Optional[ThreadState]:
+        """Async counterpart of `get`."""
+        return await self._call(self.get, thread_id)
+
+    async def add_async(self, thread_id: str) -> ThreadState:
+        """Async counterpart of `add`."""
+        return await self._call(self.add, thread_id)
+
+    async def record_reply_async(self, thread_id: str, message_id: str, reply: Any) -> None:
+        """Async counterpart of `record_reply`."""
+        await self._call(self.record_reply, thread_id, message_id, reply)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._counters, "threads": len(self.backend), "backend": type(self.backend).__name__}
+
+
+def _build_thread_store() -> ThreadStore:
+    # Follow-ups may reach any worker, so workers sharing a state directory share the store
+    if os.getenv("THREAD_STORE_BACKEND", "sqlite" if SHARED_STATE_DIR else "memory") == "sqlite":
+        return ThreadStore(SQLiteBackend(os.getenv("THREAD_STORE_PATH", shared_path("thread_store.sqlite3", "thread_store.sqlite3"))))
+    return ThreadStore(MemoryBackend(int(os.getenv("THREAD_STORE_SIZE", "10000"))))
+
+
+thread_store = _build_thread_store()
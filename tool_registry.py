@@ -0,0 +1,248 @@
+import asyncio
+import bisect
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from tracing import span
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class ToolStats:
+    """Latency histogram and error counters for one tool."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cache_hits = 0
+        self.total_ms = 0.0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.truncated = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, elapsed: float, error: bool) -> None:
+        elapsed_ms = elapsed * 1000
+        self.calls += 1
+        self.errors += error
+        self.total_ms += elapsed_ms
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def observe_output(self, before: int, after: int) -> None:
+        self.bytes_before += before
+        self.bytes_after += after
+        self.truncated += after < before
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["le_inf"]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "cache_hits": self.cache_hits,
+            "mean_ms": round(self.total_ms / self.calls, 1) if self.calls else None,
+            "output_bytes": {"before": self.bytes_before, "after": self.bytes_after, "truncated": self.truncated},
+            "latency_ms": dict(zip(labels, self.buckets)),
+        }
+
+
+class ToolSpec:
+    """
+    Everything the assistant needs to know about one tool.
+
+    Args:
+        name (str): Function name exposed to the model.
+        description (str): Function description exposed to the model.
+        input_model (Type[BaseModel]): Model that documents and validates the arguments.
+        func (Callable[..., Any]): Sync implementation, called with the validated fields as keyword arguments.
+        timeout (Optional[float]): Seconds the call may take, or None for the caller's default.
+        cache_ttl (Optional[float]): Seconds a result is reused for identical arguments, or None to never reuse it.
+        datasets (Tuple[str, ...]): Snapshot cache keys of the datasets the tool reads.
+        output_budget (Optional[int]): Maximum output size in bytes, or None for the global TOOL_OUTPUT_BUDGET.
+    """
+
+    def __init__(self, name: str, description: str, input_model: Type[BaseModel], func: Callable[..., Any],
+                 timeout: Optional[float] = None, cache_ttl: Optional[float] = None, datasets: Tuple[str, ...] = (),
+                 output_budget: Optional[int] = None):
+        self.name = name
+        self.description = description
+        self.input_model = input_model
+        self.func = func
+        self.async_func: Optional[Callable[..., Any]] = None
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.datasets = datasets
+        self.output_budget = output_budget
+        self.stats = ToolStats()
+
+    def schema(self) -> Dict[str, Any]:
+        """Returns the OpenAI function tool definition."""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.input_model.model_json_schema(),
+            },
+        }
+
+
+class ToolRegistry:
+    """
+    Name -> `ToolSpec` table for the assistant's tools.
+
+    Tools register themselves with the `tool` decorator and, optionally, an
+    async implementation with `async_tool`. The registry generates the tool
+    definitions for the assistant, validates arguments through the input model
+    once, dispatches by dictionary lookup, reuses results according to each
+    tool's cache policy, and keeps per-tool latency histograms.
+    """
+
+    def __init__(self, max_cached_results: int = 256):
+        self.specs: Dict[str, ToolSpec] = {}
+        self.max_cached_results = max_cached_results
+        self._results: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def tool(self, name: str, description: str, input_model: Type[BaseModel],
+             timeout: Optional[float] = None, cache_ttl: Optional[float] = None, datasets: Tuple[str, ...] = (),
+             output_budget: Optional[int] = None) -> Callable:
+        """Decorator registering a sync function as the tool `name`."""
+        def register(func: Callable[..., Any]) -> Callable[..., Any]:
+            if name in self.specs:
+                raise ValueError(f"Tool '{name}' is already registered.")
+            self.specs[name] = ToolSpec(name, description, input_model, func, timeout, cache_ttl, datasets, output_budget)
+            return func
+        return register
+
+    def async_tool(self, name: str) -> Callable:
+        """Decorator registering the async implementation of the already registered tool `name`."""
+        def register(func: Callable[..., Any]) -> Callable[..., Any]:
+            self.specs[name].async_func = func
+            return func
+        return register
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """Returns the tool definitions for `assistants.create`, in registration order."""
+        return [spec.schema() for spec in self.specs.values()]
+
+    def datasets(self, names: Iterable[str]) -> Set[str]:
+        """Returns the snapshot keys read by the given tools."""
+        return {dataset for name in names if name in self.specs for dataset in self.specs[name].datasets}
+
+    def timeout(self, name: str, default: float) -> float:
+        spec = self.specs.get(name)
+        return spec.timeout if spec is not None and spec.timeout is not None else default
+
+    def output_budget(self, name: str, default: Optional[int] = None) -> Optional[int]:
+        spec = self.specs.get(name)
+        return spec.output_budget if spec is not None and spec.output_budget is not None else default
+
+    def _prepare(self, name: str, arguments: Dict[str, Any]) -> Tuple[Optional[ToolSpec], Dict[str, Any], Any]:
+        """Looks up the tool and validates its arguments; the third item is an error output or a cached result."""
+        spec = self.specs.get(name)
+        if spec is None:
+            return None, {}, {"Error": f"Tool '{name}' is not recognized."}
+        try:
+            kwargs = spec.input_model.model_validate(arguments).model_dump()
+        except ValidationError as e:
+            spec.stats.observe(0.0, True)
+            return None, {}, {"Error": f"Invalid arguments for tool '{name}': {e}"}
+        if spec.cache_ttl:
+            cached = self._cached(spec, kwargs)
+            if cached is not None:
+                spec.stats.cache_hits += 1
+                spec.stats.observe(0.0, False)
+                return None, {}, cached
+        return spec, kwargs, None
+
+    def _cache_key(self, spec: ToolSpec, kwargs: Dict[str, Any]) -> Tuple[str, str]:
+        return spec.name, json.dumps(kwargs, sort_keys=True, default=str)
+
+    def _cached(self, spec: ToolSpec, kwargs: Dict[str, Any]) -> Any:
+        key = self._cache_key(spec, kwargs)
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._results.move_to_end(key)
+            return entry[1]
+
+    def _finish(self, spec: ToolSpec, kwargs: Dict[str, Any], result: Any, started: float, error: bool) -> Any:
+        spec.stats.observe(time.perf_counter() - started, error)
+        if spec.cache_ttl and not error:
+            with self._lock:
+                self._results[self._cache_key(spec, kwargs)] = (time.monotonic() + spec.cache_ttl, result)
+                while len(self._results) > self.max_cached_results:
+                    self._results.popitem(last=False)
+        return result
+
+    def execute(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """
+        Validates `arguments` and runs the sync implementation of the tool `name`.
+
+        Args:
+            name (str): The tool name from the tool call.
+            arguments (Dict[str, Any]): The decoded tool call arguments.
+
+        Returns:
+            Any: The tool result, or {"Error": ...} if the tool is unknown, the
+            arguments are invalid or the tool raised.
+        """
+        spec, kwargs, early = self._prepare(name, arguments)
+        if spec is None:
+            return early
+        started = time.perf_counter()
+        try:
+            with span("tool", name):
+                result = spec.func(**kwargs)
+        except Exception as e:
+            return self._finish(spec, kwargs, {"Error": f"Error executing {name}: {e}"}, started, True)
+        return self._finish(spec, kwargs, result, started, False)
+
+    async def execute_async(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """Async counterpart of `execute`; tools without an async implementation run in a worker thread."""
+        spec, kwargs, early = self._prepare(name, arguments)
+        if spec is None:
+            return early
+        started = time.perf_counter()
+        try:
+            with span("tool", name):
+                if spec.async_func is not None:
+                    result = await spec.async_func(**kwargs)
+                else:
+                    result = await asyncio.to_thread(spec.func, **kwargs)
+        except asyncio.CancelledError:
+            # Cancelled by the caller's timeout; still record how long it ran
+            spec.stats.observe(time.perf_counter() - started, True)
+            raise
+        except Exception as e:
+            return self._finish(spec, kwargs, {"Error": f"Error executing {name}: {e}"}, started, True)
+        return self._finish(spec, kwargs, result, started, False)
+
+    def record_timeout(self, name: str) -> None:
+        """Counts a call the caller abandoned after the tool's timeout."""
+        spec = self.specs.get(name)
+        if spec is not None:
+            spec.stats.timeouts += 1
+
+    def record_output(self, name: str, before: int, after: int) -> None:
+        """Records the size of a tool output before and after it was fitted to the tool's budget."""
+        spec = self.specs.get(name)
+        if spec is not None:
+            spec.stats.observe_output(before, after)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the latency histogram and counters of every tool."""
+        return {name: spec.stats.to_dict() for name, spec in self.specs.items()}
+
+
+# Registry of the tools defined in tools.py
+tool_registry = ToolRegistry()
@@ -1,55 +1,80 @@
-from fastapi import FastAPI
-from typing import List, Dict, Union , Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional
 from dotenv import load_dotenv
-from duckduckgo_search import DDGS
-from typing import List, Dict, Union , Optional
+import asyncio
+import os
+import httpx
 import requests
-import json
-from pydantic import BaseModel, Field
-from typing import List, Dict, Union, Optional
-from fastapi.middleware.cors import CORSMiddleware
 from models import *
+from cache import snapshot_cache
+from http_client import upstream
+from search_cache import DEFAULT_MAX_RESULTS, search_cache
+from pool_index import PoolIndex
+from price_history import DAY, PriceHistory, parse_day, price_history
+from prefetch import Dataset
+from tool_registry import tool_registry
+from records import PoolRecord, PriceSnapshot, RecordTable, StablecoinRecord
+from streaming import stream_pool_records, stream_top_pools
+from tracing import span
 load_dotenv()
 
-def fetch_stable_coins(top_m: int) -> List[Dict[str, Union[str, float]]]:
-    """
-    Fetches stablecoins data from the API and filters the top `top_m` stablecoins.
+# Base URLs can be pointed at local stand-ins for benchmarking
+STABLECOINS_API_URL = os.getenv("STABLECOINS_API_URL", "https://stablecoins.llama.fi")
+YIELDS_API_URL = os.getenv("YIELDS_API_URL", "https://yields.llama.fi")
+
+STABLECOINS_URL = f"{STABLECOINS_API_URL}/stablecoins?includePrices=true"
+POOLS_URL = f"{YIELDS_API_URL}/pools"
+STABLECOIN_PRICES_URL = f"{STABLECOINS_API_URL}/stablecoinprices"
+
+# Search result bodies are cut to this many characters before they reach the model
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "300"))
+# Coins priced by Get_Stable_Coin_Prices when the model does not name any
+PRICES_TOP_K = int(os.getenv("PRICES_TOP_K", "20"))
+# Coins and days covered by a historical price query that does not name them
+PRICE_HISTORY_TOP_K = int(os.getenv("PRICE_HISTORY_TOP_K", "5"))
+PRICE_HISTORY_DAYS = int(os.getenv("PRICE_HISTORY_DAYS", "30"))
+
+# duckduckgo_search.DDGS, imported by the first search (see _ddgs_class)
+DDGS = None
+
+
+def _ddgs_class():
+    """Returns the DDGS class, importing duckduckgo_search on first use to keep it out of startup."""
+    global DDGS
+    if DDGS is None:
+        from duckduckgo_search import DDGS as ddgs
+        DDGS = ddgs
+    return DDGS
+
 
-    Args:
-        top_m (int): The number of top stablecoins to retrieve.
+
+def _parse_stablecoins(response) -> List[StablecoinRecord]:
+    """Decodes a stablecoins response (requests or httpx) into compact records."""
+    stablecoins = response.json().get("peggedAssets", [])
+
+    # Validate that stablecoins is a list
+    if not isinstance(stablecoins, list):
+        raise ValueError("Unexpected format: 'peggedAssets' should be a list.")
+
+    return [StablecoinRecord.from_api(coin) for coin in stablecoins]
+
+
+def _load_stablecoins() -> List[StablecoinRecord]:
+    """
+    Downloads and parses the full stablecoins document from the API.
 
     Returns:
-        List[Dict[str, Union[str, float]]]: A list of dictionaries with stablecoin details or an error message.
+        List[StablecoinRecord]: The `peggedAssets` list, in API order, as compact records.
+
+    Raises:
+        RuntimeError: If the request fails or the response has an unexpected format.
     """
-    url = "https://stablecoins.llama.fi/stablecoins?includePrices=true"
-    
     try:
-        # Perform the GET request with a timeout
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Raise HTTPError for bad responses
+        # Perform the GET request through the pooled, retrying upstream client
+        response = upstream.get("stablecoins", STABLECOINS_URL, timeout=10)
 
         try:
-            # Parse JSON response
-            stablecoins_data = response.json()
-            stablecoins = stablecoins_data.get("peggedAssets", [])
-            
-            # Validate that stablecoins is a list
-            if not isinstance(stablecoins, list):
-                raise ValueError("Unexpected format: 'peggedAssets' should be a list.")
-
-            # Filter and process the top `top_m` stablecoins
-            stablecoins = stablecoins[:top_m]
-            filtered_stablecoins = [
-                {
-                    "Name": coin.get("name", "Unknown"),
-                    "Symbol": coin.get("symbol", "Unknown"),
-                    "Price": coin.get("price", 0.0),
-                    "GecKoId": coin.get("gecko_id", "Unknown")
-                }
-                for coin in stablecoins
-            ]
-
-            return filtered_stablecoins
+            with span("upstream.parse", "stablecoins"):
+                return _parse_stablecoins(response)
 
         except (ValueError, KeyError) as e:
             raise RuntimeError(f"Error processing the API response: {e}")
@@ -60,14 +85,102 @@ def fetch_stable_coins(top_m: int) -> List[Dict[str, Union[str, float]]]:
         raise RuntimeError(f"HTTP error occurred: {http_err}")
     except requests.exceptions.RequestException as req_err:
         raise RuntimeError(f"Request failed: {req_err}")
+    except RuntimeError:
+        raise
     except Exception as e:
         raise RuntimeError(f"An unexpected error occurred: {e}")
 
 
+def cached_stablecoins() -> List[StablecoinRecord]:
+    """Returns the parsed `peggedAssets` records from the shared snapshot cache."""
+    return snapshot_cache.get(STABLECOINS_URL, _load_stablecoins)
+
+
+async def _load_stablecoins_async() -> List[StablecoinRecord]:
+    """Async counterpart of `_load_stablecoins`."""
+    try:
+        response = await upstream.aget("stablecoins", STABLECOINS_URL, timeout=10)
+
+        try:
+            with span("upstream.parse", "stablecoins"):
+                # The document is several megabytes; decode it and build the records off the event loop
+                return await asyncio.to_thread(_parse_stablecoins, response)
+        except (ValueError, KeyError) as e:
+            raise RuntimeError(f"Error processing the API response: {e}")
+
+    except httpx.TimeoutException:
+        raise RuntimeError("The request timed out. Please try again later.")
+    except httpx.HTTPStatusError as http_err:
+        raise RuntimeError(f"HTTP error occurred: {http_err}")
+    except httpx.RequestError as req_err:
+        raise RuntimeError(f"Request failed: {req_err}")
+
+
+async def cached_stablecoins_async() -> List[StablecoinRecord]:
+    """Async counterpart of `cached_stablecoins`."""
+    return await snapshot_cache.get_async(STABLECOINS_URL, _load_stablecoins_async)
+
+
+def _top_stablecoins(stablecoins: List[StablecoinRecord], top_m: int, gecko_key: str) -> RecordTable:
+    """Returns the first `top_m` stablecoins, shown under the Name/Symbol/Price/`gecko_key` keys."""
+    return RecordTable(stablecoins[:top_m], ("Name", "Symbol", "Price", gecko_key))
+
+
+@tool_registry.tool(
+    "fetch_stable_coins_tool",
+    "Retrieve the top stablecoins by market cap.",
+    GetStableCoinsInput,
+    datasets=(STABLECOINS_URL,),
+)
+def fetch_stable_coins(top_m: int) -> RecordTable:
+    """
+    Returns the top `top_m` stablecoins from the cached stablecoins snapshot.
+
+    Args:
+        top_m (int): The number of top stablecoins to retrieve.
+
+    Returns:
+        RecordTable: The stablecoin records with their output keys.
+    """
+    return _top_stablecoins(cached_stablecoins(), top_m, "GecKoId")
+
+
+@tool_registry.async_tool("fetch_stable_coins_tool")
+async def fetch_stable_coins_async(top_m: int) -> RecordTable:
+    """Async counterpart of `fetch_stable_coins`."""
+    return _top_stablecoins(await cached_stablecoins_async(), top_m, "GecKoId")
+
+
 # Define the input schema for internet search
 
 
+def _trim_snippet(text: str, limit: int) -> str:
+    """Cuts `text` to at most `limit` characters at a word boundary, marking the cut with an ellipsis."""
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(" ", 1)[0] if " " in text[:limit] else text[:limit]
+    return cut.rstrip(" ,.;:") + "…"
+
+
+def _trim_results(results: List[Dict]) -> List[Dict]:
+    """Returns the search results with their "body" snippets trimmed to SEARCH_SNIPPET_CHARS."""
+    return [
+        {**result, "body": _trim_snippet(result["body"], SEARCH_SNIPPET_CHARS)}
+        if isinstance(result.get("body"), str) else result
+        for result in results
+    ]
+
+
 # Define the internet_search function
+@tool_registry.tool(
+    "internet_search_tool",
+    '''Perform an internet search for any news or information using DuckDuckGo.
+              Use this tool to search for information on the web from reliable and good sources.
+              Only use proper and good sources realted to crypto to get the information.
+              Also use this to fetch the price of any crypto coins''',
+    InternetSearchInput,
+    timeout=15,
+)
 def internet_search(query: str, region: Optional[str] = "wt-wt", max_results: Optional[int] = 5) -> InternetSearchOutput:
     """
     Performs an internet search using DuckDuckGo Search (DDGS).
@@ -86,7 +199,14 @@ def internet_search(query: str, region: Optional[str] = "wt-wt", max_results: Op
     """
     if not query:
         raise ValueError("Search query cannot be empty or None.")
-    
+    if max_results is None:
+        max_results = DEFAULT_MAX_RESULTS
+
+    # Serve repeated (normalized) queries from the search cache
+    cached = search_cache.get(query, region, max_results)
+    if cached is not None:
+        return InternetSearchOutput(results=_trim_results(cached))
+
     params = {
         "keywords": query,
         "region": region,
@@ -94,9 +214,10 @@ def internet_search(query: str, region: Optional[str] = "wt-wt", max_results: Op
     }
 
     try:
-        with DDGS() as ddg:
-            results = ddg.text(**params)
-            return InternetSearchOutput(results=list(results))
+        with span("search", "ddgs"), _ddgs_class()() as ddg:
+            results = list(ddg.text(**params))
+        search_cache.set(query, region, max_results, results)
+        return InternetSearchOutput(results=_trim_results(results))
     except ValueError as ve:
         raise ValueError(f"Invalid parameter provided: {ve}")
     except ConnectionError as ce:
@@ -104,48 +225,39 @@ def internet_search(query: str, region: Optional[str] = "wt-wt", max_results: Op
     except Exception as e:
         raise RuntimeError(f"An unexpected error occurred during the internet search: {e}")
 
+
+@tool_registry.async_tool("internet_search_tool")
+async def internet_search_async(query: str, region: Optional[str] = "wt-wt", max_results: Optional[int] = 5) -> InternetSearchOutput:
+    """Runs the blocking DDGS search in a worker thread so it does not stall the event loop."""
+    return await asyncio.to_thread(internet_search, query, region, max_results)
+
 # Define the input and output schemas for the new GetPools tool
 
-# Define the function to fetch top liquidity pools by TVL
-def get_and_display_top_pools_by_tvl(top_n: int = 5) -> GetPoolsOutput:
+
+# Set POOLS_INDEX_ENABLED=0 to answer each call with a bounded streaming heap instead of caching the index
+POOLS_INDEX_ENABLED = os.getenv("POOLS_INDEX_ENABLED", "1") != "0"
+
+
+def _stream_pools(consume: Callable[[Iterable[bytes]], Any]) -> Any:
     """
-    Fetches and displays the top pools by TVL (Total Value Locked) from a specified API.
+    Streams the pools dataset and hands the raw body chunks to `consume`.
 
     Args:
-        top_n (int): The number of top pools to retrieve. Default is 5.
+        consume (Callable[[Iterable[bytes]], Any]): Parser applied to the response body chunks.
 
     Returns:
-        GetPoolsOutput: An object containing the top pools or an error message.
+        Any: Whatever `consume` returns.
 
     Raises:
-        RuntimeError: If an unexpected error occurs during the process.
+        RuntimeError: If the request fails or the response has an unexpected format.
     """
-    url = "https://yields.llama.fi/pools"
     headers = {"accept": "application/json"}
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()  # Raise an HTTPError for bad status codes
-
-        pools_data = response.json()
-        pools = pools_data.get("data", [])
-        
-        # Ensure the data is in the expected format
-        if not isinstance(pools, list):
-            raise ValueError("Unexpected format: 'data' is not a list.")
-        
-        # Sort and filter the top pools
-        sorted_pools = sorted(pools, key=lambda x: x.get("tvlUsd", 0), reverse=True)[:top_n]
-        top_pools = [
-            {
-                "Project": pool.get('project', 'Unknown'),
-                "Symbol": pool.get('symbol', 'Unknown'),
-                "TVL (USD)": pool.get('tvlUsd', 0),
-                "APY": pool.get('apy', 'N/A'),
-                "Chain": pool.get('chain', 'Unknown')
-            } for pool in sorted_pools
-        ]
-        return GetPoolsOutput(pools=top_pools)
+        with upstream.get("pools", POOLS_URL, timeout=30, headers=headers, stream=True) as response:
+            # The body is downloaded while it is parsed, so this span covers both
+            with span("upstream.parse", "pools"):
+                return consume(response.iter_content(chunk_size=64 * 1024))
 
     except requests.exceptions.Timeout:
         raise RuntimeError("The request timed out. Please try again later.")
@@ -155,95 +267,139 @@ def get_and_display_top_pools_by_tvl(top_n: int = 5) -> GetPoolsOutput:
         raise RuntimeError(f"An error occurred while making the request: {req_err}")
     except ValueError as ve:
         raise RuntimeError(f"Data format error: {ve}")
+    except RuntimeError:
+        raise
     except Exception as e:
         raise RuntimeError(f"An unexpected error occurred: {e}")
 
-    
 
+def _load_pool_index() -> PoolIndex:
+    """Streams the pools dataset into compact records and wraps them in a `PoolIndex`."""
+    return _stream_pools(lambda chunks: PoolIndex(list(stream_pool_records(chunks))))
 
-# Function without using an output Pydantic model
-def get_stable_coins(top_m: int) -> List[Dict[str, Union[str, float]]]:
+
+def cached_pool_index() -> PoolIndex:
+    """Returns the `PoolIndex` for the current pools snapshot."""
+    return snapshot_cache.get(POOLS_URL, _load_pool_index)
+
+
+# Define the function to fetch top liquidity pools by TVL
+@tool_registry.tool(
+    "Get_Top_Pools_by_TVL",
+    "Retrieve the top liquidity pools by Total Value Locked (TVL), optionally filtered by chain or project.",
+    GetPoolsInput,
+    timeout=30,
+    # Without the cached index every call streams the whole dataset; reuse answers for a minute
+    cache_ttl=None if POOLS_INDEX_ENABLED else 60,
+    datasets=(POOLS_URL,),
+)
+def get_and_display_top_pools_by_tvl(top_n: int = 5, chain: Optional[str] = None, project: Optional[str] = None) -> RecordTable:
     """
-    Fetches stablecoins data from the API and filters the top `top_m` stablecoins.
+    Returns the top pools by TVL (Total Value Locked) from the cached pools index.
 
     Args:
-        top_m (int): Number of top stablecoins to retrieve.
+        top_n (int): The number of top pools to retrieve. Default is 5.
+        chain (Optional[str]): Only return pools on this chain.
+        project (Optional[str]): Only return pools of this project.
 
     Returns:
-        List[Dict[str, Union[str, float]]]: A list of dictionaries with stablecoin details or an error message.
+        RecordTable: The top pools, serialized in the `GetPoolsOutput` shape.
+
+    Raises:
+        RuntimeError: If an unexpected error occurs during the process.
     """
-    url = "https://stablecoins.llama.fi/stablecoins?includePrices=true"
+    if POOLS_INDEX_ENABLED:
+        sorted_pools = cached_pool_index().top(top_n, chain=chain, project=project)
+    else:
+        sorted_pools = _stream_pools(_top_pools_consumer(top_n, chain, project))
+    return _pools_output(sorted_pools)
 
-    try:
-        # Perform the GET request with a timeout
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Raise an HTTPError for bad responses
 
-        try:
-            # Parse JSON response
-            stablecoins_data = response.json()
-            stablecoins = stablecoins_data.get("peggedAssets", [])
-
-            # Validate that stablecoins is a list
-            if not isinstance(stablecoins, list):
-                raise ValueError("Unexpected data format: 'peggedAssets' is not a list.")
-
-            # Filter and process the top `top_m` stablecoins
-            stablecoins = stablecoins[:top_m]
-            filtered_stablecoins = [
-                {
-                    "Name": coin.get("name", "Unknown"),
-                    "Symbol": coin.get("symbol", "Unknown"),
-                    "Price": coin.get("price", 0.0),
-                    "GeckoId": coin.get("gecko_id", "Unknown")
-                }
-                for coin in stablecoins
-            ]
-
-            return filtered_stablecoins
+@tool_registry.async_tool("Get_Top_Pools_by_TVL")
+async def get_and_display_top_pools_by_tvl_async(top_n: int = 5, chain: Optional[str] = None, project: Optional[str] = None) -> RecordTable:
+    """
+    Async counterpart of `get_and_display_top_pools_by_tvl`.
 
-        except (ValueError, KeyError) as e:
-            raise RuntimeError(f"Error processing the API response: {e}")
+    Parsing the pools body is CPU-bound, so the streaming download and parse
+    run in a worker thread instead of on the event loop.
+    """
+    if POOLS_INDEX_ENABLED:
+        index = await snapshot_cache.get_async(POOLS_URL, lambda: asyncio.to_thread(_load_pool_index))
+        sorted_pools = index.top(top_n, chain=chain, project=project)
+    else:
+        sorted_pools = await asyncio.to_thread(_stream_pools, _top_pools_consumer(top_n, chain, project))
+    return _pools_output(sorted_pools)
 
-    except requests.exceptions.Timeout:
-        raise RuntimeError("The request timed out. Please try again later.")
-    except requests.exceptions.HTTPError as http_err:
-        raise RuntimeError(f"HTTP error occurred: {http_err}")
-    except requests.exceptions.RequestException as req_err:
-        raise RuntimeError(f"Request failed: {req_err}")
-    except Exception as e:
-        raise RuntimeError(f"An unexpected error occurred: {e}")
 
-    
+def _top_pools_consumer(top_n: int, chain: Optional[str], project: Optional[str]) -> Callable[[Iterable[bytes]], List[PoolRecord]]:
+    """Flat-memory mode: only the current top-N heap is kept while the body streams in."""
+    predicate = (lambda pool: PoolIndex.matches(pool, chain, project)) if chain or project else None
+    return lambda chunks: stream_top_pools(chunks, top_n, predicate)
+
+
+POOL_LABELS = ("Project", "Symbol", "TVL (USD)", "APY", "Chain")
+
 
+def _pools_output(sorted_pools: List[PoolRecord]) -> RecordTable:
+    """Wraps the pools in the `{"pools": [...]}` shape of `GetPoolsOutput`."""
+    return RecordTable(sorted_pools, POOL_LABELS, key="pools")
 
 
-def get_stable_coin_prices(dummy):
+# Function without using an output Pydantic model
+@tool_registry.tool(
+    "Get_Stable_Coins",
+    "Retrieve the top stablecoins by market cap.",
+    GetStableCoinsInput,
+    datasets=(STABLECOINS_URL,),
+)
+def get_stable_coins(top_m: int) -> RecordTable:
     """
-    Fetches stablecoin prices from the API.
+    Returns the top `top_m` stablecoins from the cached stablecoins snapshot.
 
     Args:
-        dummy: Placeholder argument for compatibility.
+        top_m (int): Number of top stablecoins to retrieve.
+
+    Returns:
+        RecordTable: The stablecoin records with their output keys.
+    """
+    return _top_stablecoins(cached_stablecoins(), top_m, "GeckoId")
+
+
+@tool_registry.async_tool("Get_Stable_Coins")
+async def get_stable_coins_async(top_m: int) -> RecordTable:
+    """Async counterpart of `get_stable_coins`."""
+    return _top_stablecoins(await cached_stablecoins_async(), top_m, "GeckoId")
+
+
+def _load_price_history() -> PriceHistory:
+    """
+    Returns the daily stablecoin price history, downloading it only when a day is missing.
+
+    Only the days after the last stored one are merged into the history, which
+    is persisted, so restarts and refreshes within the day stay off the network.
 
     Returns:
-        dict: Stablecoin prices or an error message.
+        PriceHistory: Daily prices of every stablecoin.
+
+    Raises:
+        RuntimeError: If the request fails or the response has an unexpected format.
     """
-    url = "https://stablecoins.llama.fi/stablecoinprices"
+    if not price_history.needs_download():
+        return price_history.skip()
     try:
-        # Perform the GET request with a timeout
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Raise an HTTPError for bad responses
+        # Perform the GET request through the pooled, retrying upstream client
+        response = upstream.get("stablecoin_prices", STABLECOIN_PRICES_URL, timeout=20)
 
         try:
-            # Parse JSON response
-            stablecoin_prices = response.json()
-            if not isinstance(stablecoin_prices, list) or not stablecoin_prices:
-                raise ValueError("Unexpected JSON format: Expected a non-empty list.")
-            return stablecoin_prices[0]
+            with span("upstream.parse", "stablecoin_prices"):
+                # Parse JSON response
+                stablecoin_prices = response.json()
+                if not isinstance(stablecoin_prices, list) or not stablecoin_prices:
+                    raise ValueError("Unexpected JSON format: Expected a non-empty list.")
+            with span("price_history.ingest"):
+                return price_history.ingest(stablecoin_prices)
         except ValueError as ve:
             raise RuntimeError(f"Error parsing JSON response: {ve}")
-        except IndexError:
-            raise RuntimeError("The JSON response is empty or does not contain expected data.")
 
     except requests.exceptions.Timeout:
         raise RuntimeError("The request timed out. Please try again later.")
@@ -251,5 +407,166 @@ def get_stable_coin_prices(dummy):
         raise RuntimeError(f"HTTP error occurred: {http_err}")
     except requests.exceptions.RequestException as req_err:
         raise RuntimeError(f"Request failed: {req_err}")
+    except RuntimeError:
+        raise
     except Exception as e:
         raise RuntimeError(f"An unexpected error occurred: {e}")
+
+
+async def _load_price_history_async() -> PriceHistory:
+    """Async counterpart of `_load_price_history`."""
+    # The first check reads the stored history from disk
+    if not await asyncio.to_thread(price_history.needs_download):
+        return price_history.skip()
+    try:
+        response = await upstream.aget("stablecoin_prices", STABLECOIN_PRICES_URL, timeout=20)
+
+        try:
+            with span("upstream.parse", "stablecoin_prices"):
+                # The price history is large; decode it off the event loop
+                stablecoin_prices = await asyncio.to_thread(response.json)
+                if not isinstance(stablecoin_prices, list) or not stablecoin_prices:
+                    raise ValueError("Unexpected JSON format: Expected a non-empty list.")
+            with span("price_history.ingest"):
+                return await asyncio.to_thread(price_history.ingest, stablecoin_prices)
+        except ValueError as ve:
+            raise RuntimeError(f"Error parsing JSON response: {ve}")
+
+    except httpx.TimeoutException:
+        raise RuntimeError("The request timed out. Please try again later.")
+    except httpx.HTTPStatusError as http_err:
+        raise RuntimeError(f"HTTP error occurred: {http_err}")
+    except httpx.RequestError as req_err:
+        raise RuntimeError(f"Request failed: {req_err}")
+
+
+def _resolve_coins(available: Iterable[str], stablecoins: Optional[List[StablecoinRecord]],
+                   coins: Optional[List[str]], top_k: int) -> List[str]:
+    """
+    Picks the CoinGecko ids among `available` that the model asked for.
+
+    Requested coins are matched by CoinGecko id, symbol or name (case-insensitive).
+    Without `coins`, the `top_k` largest stablecoins are picked, in the market cap
+    order of the stablecoins list, or the order of `available` if that list is unavailable.
+    """
+    available = list(available)
+    known = set(available)
+    if coins:
+        aliases = {coin.lower(): coin for coin in available}
+        for record in stablecoins or ():
+            if record.gecko_id in known:
+                aliases.setdefault(record.symbol.lower(), record.gecko_id)
+                aliases.setdefault(record.name.lower(), record.gecko_id)
+        return [aliases[coin.lower()] for coin in coins if coin.lower() in aliases]
+
+    if stablecoins:
+        ranked = [record.gecko_id for record in stablecoins if record.gecko_id in known]
+        return ranked[:top_k]
+    return available[:top_k]
+
+
+def _project_prices(snapshot: PriceSnapshot, stablecoins: Optional[List[StablecoinRecord]],
+                    coins: Optional[List[str]], top_k: Optional[int]) -> PriceSnapshot:
+    """Narrows a prices snapshot to the coins the model asked for; see `_resolve_coins`."""
+    return snapshot.select(_resolve_coins(snapshot.coins, stablecoins, coins, top_k or PRICES_TOP_K))
+
+
+def _query_prices(history: PriceHistory, stablecoins: Optional[List[StablecoinRecord]], coins: Optional[List[str]],
+                  top_k: Optional[int], start: Optional[str], end: Optional[str], aggregation: Optional[str],
+                  depeg_threshold: Optional[float]) -> Any:
+    """
+    Answers Get_Stable_Coin_Prices from the price history.
+
+    Without `start`, `end` or `aggregation` the latest day's prices are returned
+    as before. Otherwise the range defaults to the PRICE_HISTORY_DAYS days up to
+    `end` (or the latest day), the coins to the PRICE_HISTORY_TOP_K largest and
+    the aggregation to "series".
+    """
+    if start is None and end is None and aggregation is None:
+        return _project_prices(history.latest(), stablecoins, coins, top_k)
+
+    end_day = parse_day(end) if end else None
+    start_day = parse_day(start) if start else None
+    if start_day is None and history.last_date is not None:
+        start_day = (end_day or history.last_date) - (PRICE_HISTORY_DAYS - 1) * DAY
+    picked = _resolve_coins(history.coins, stablecoins, coins, top_k or PRICE_HISTORY_TOP_K)
+    return history.query(picked, start_day, end_day, aggregation or "series",
+                         threshold=depeg_threshold if depeg_threshold is not None else 0.005)
+
+
+def _stablecoins_or_none() -> Optional[List[StablecoinRecord]]:
+    # The ranking is only an ordering hint; the prices are still served if it is unavailable
+    try:
+        return cached_stablecoins()
+    except Exception:
+        return None
+
+
+async def _stablecoins_or_none_async() -> Optional[List[StablecoinRecord]]:
+    try:
+        return await cached_stablecoins_async()
+    except Exception:
+        return None
+
+
+@tool_registry.tool(
+    "Get_Stable_Coin_Prices",
+    "Retrieve the prices of stablecoins such as bitcoin, doge coin etc. "
+    "Pass `coins` (CoinGecko ids, symbols or names) to price specific coins; "
+    "otherwise the `top_k` largest stablecoins by market cap are returned. "
+    "For price movements over time, give a `start`/`end` range and/or an `aggregation` "
+    "(daily series, min, max, mean, change, or depeg periods).",
+    GetStableCoinsPriceInput,
+    datasets=(STABLECOIN_PRICES_URL, STABLECOINS_URL),
+)
+def get_stable_coin_prices(dummy, coins: Optional[List[str]] = None, top_k: Optional[int] = None,
+                           start: Optional[str] = None, end: Optional[str] = None, aggregation: Optional[str] = None,
+                           depeg_threshold: Optional[float] = None):
+    """
+    Returns stablecoin prices from the cached daily price history.
+
+    Args:
+        dummy: Placeholder argument for compatibility.
+        coins (Optional[List[str]]): Coins to keep, by CoinGecko id, symbol or name.
+        top_k (Optional[int]): Number of the largest stablecoins to keep when `coins` is not given.
+        start (Optional[str]): First day (YYYY-MM-DD) of a historical query.
+        end (Optional[str]): Last day (YYYY-MM-DD) of a historical query, inclusive.
+        aggregation (Optional[str]): "series", "min", "max", "mean", "change" or "depeg".
+        depeg_threshold (Optional[float]): Relative distance from $1 that counts as a depeg.
+
+    Returns:
+        PriceSnapshot | Dict[str, Any]: The latest prices of the selected coins, or the
+        result of the historical query.
+    """
+    history = snapshot_cache.get(STABLECOIN_PRICES_URL, _load_price_history)
+    return _query_prices(history, _stablecoins_or_none(), coins, top_k, start, end, aggregation, depeg_threshold)
+
+
+@tool_registry.async_tool("Get_Stable_Coin_Prices")
+async def get_stable_coin_prices_async(dummy, coins: Optional[List[str]] = None, top_k: Optional[int] = None,
+                                       start: Optional[str] = None, end: Optional[str] = None,
+                                       aggregation: Optional[str] = None, depeg_threshold: Optional[float] = None):
+    """Async counterpart of `get_stable_coin_prices`."""
+    history = await snapshot_cache.get_async(STABLECOIN_PRICES_URL, _load_price_history_async)
+    return _query_prices(history, await _stablecoins_or_none_async(), coins, top_k, start, end, aggregation,
+                         depeg_threshold)
+
+
+def prefetch_datasets() -> List[Dataset]:
+    """
+    Returns the DefiLlama datasets the background prefetcher keeps warm.
+
+    Intervals come from PREFETCH_<DATASET>_INTERVAL and should stay below
+    SNAPSHOT_CACHE_TTL so tool calls always find a fresh snapshot. The pools
+    index is sorted before it is swapped in, so no request pays for the sort.
+    """
+    datasets = [
+        Dataset("stablecoins", STABLECOINS_URL, _load_stablecoins,
+                interval=float(os.getenv("PREFETCH_STABLECOINS_INTERVAL", "120"))),
+        Dataset("stablecoin_prices", STABLECOIN_PRICES_URL, _load_price_history,
+                interval=float(os.getenv("PREFETCH_STABLECOIN_PRICES_INTERVAL", "240"))),
+    ]
+    if POOLS_INDEX_ENABLED:
+        datasets.append(Dataset("pools", POOLS_URL, _load_pool_index, prepare=PoolIndex.build,
+                                interval=float(os.getenv("PREFETCH_POOLS_INTERVAL", "240"))))
+    return datasets
@@ -0,0 +1,274 @@
+import bisect
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+# Upper bounds (seconds) of the stage latency histogram buckets; the last bucket is unbounded
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Set LOG_FORMAT=text for the plain logging format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Requests slower than this many ms log their full span list
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+# HTTP client libraries log every request at INFO (each run poll, each upstream fetch); keep them
+# at WARNING unless their level has been set explicitly
+QUIET_LOGGERS = ("httpx", "httpcore", "openai")
+# Set PROFILING_ENABLED=1 to let requests ask for a sampling profile with the X-Profile header
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Trace:
+    """The spans recorded while serving one request."""
+
+    __slots__ = ("trace_id", "started", "spans")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        # (stage, name, start ms, duration ms, error); list.append is atomic, so tool threads can add spans
+        self.spans: List[Tuple[str, Optional[str], float, float, bool]] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "spans": [
+                {"stage": stage, "name": name, "start_ms": start, "duration_ms": duration, "error": error}
+                for stage, name, start, duration, error in self.spans
+            ],
+        }
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def trace_id_from_headers(headers: Mapping[str, str]) -> str:
+    """Takes the trace id from a W3C `traceparent`, `X-Trace-Id` or `X-Request-Id` header, or makes a new one."""
+    match = _TRACEPARENT.match(headers.get("traceparent", ""))
+    if match:
+        return match.group(1)
+    for header in ("x-trace-id", "x-request-id"):
+        value = headers.get(header, "")
+        if _TRACE_ID.match(value):
+            return value
+    return uuid.uuid4().hex
+
+
+def start_trace(trace_id: str) -> Trace:
+    """Starts recording spans for the current request context."""
+    trace = Trace(trace_id)
+    _trace.set(trace)
+    return trace
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+class StageHistogram:
+    """Cumulative latency histograms keyed by (stage, name), rendered in the Prometheus text format."""
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, Optional[str]], List] = {}
+        self._errors: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, name: Optional[str], seconds: float, error: bool) -> None:
+        key = (stage, name)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [bucket counts..., +Inf count, sum]
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+            if error:
+                self._errors[key] += 1
+
+    def render(self) -> str:
+        """Returns the `app_stage_duration_seconds` histograms and `app_stage_errors_total` counters."""
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+            errors = dict(self._errors)
+
+        def labels(key):
+            stage, name = key
+            return f'stage="{stage}"' + (f',name="{name}"' if name else "")
+
+        def order(item):
+            return item[0][0], item[0][1] or ""
+
+        lines = [
+            "# HELP app_stage_duration_seconds Time spent per request stage.",
+            "# TYPE app_stage_duration_seconds histogram",
+        ]
+        for key, values in sorted(series.items(), key=order):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'app_stage_duration_seconds_bucket{{{labels(key)},le="{bound:g}"}} {cumulative}')
+            cumulative += values[len(self.buckets)]
+            lines.append(f'app_stage_duration_seconds_bucket{{{labels(key)},le="+Inf"}} {cumulative}')
+            lines.append(f"app_stage_duration_seconds_sum{{{labels(key)}}} {values[-1]:.6f}")
+            lines.append(f"app_stage_duration_seconds_count{{{labels(key)}}} {cumulative}")
+        lines += [
+            "# HELP app_stage_errors_total Stages that raised.",
+            "# TYPE app_stage_errors_total counter",
+        ]
+        for key, count in sorted(errors.items(), key=order):
+            lines.append(f"app_stage_errors_total{{{labels(key)}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+stage_histogram = StageHistogram()
+
+
+class span:
+    """
+    Times one stage of the current request, e.g. `with span("run.poll"):`.
+
+    The duration always goes to the stage histogram behind /metrics; it is
+    also added to the request's trace when one is active. Usable as a context
+    manager (sync or async) from sync code, async code and worker threads.
+
+    Args:
+        stage (str): Stage name such as "thread.create", "tool" or "upstream.fetch".
+        name (Optional[str]): Detail label such as the tool or endpoint name.
+    """
+
+    __slots__ = ("stage", "name", "started")
+
+    def __init__(self, stage: str, name: Optional[str] = None):
+        self.stage = stage
+        self.name = name
+
+    def __enter__(self) -> "span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        ended = time.perf_counter()
+        error = exc_type is not None
+        stage_histogram.observe(self.stage, self.name, ended - self.started, error)
+        trace = _trace.get()
+        if trace is not None:
+            trace.spans.append((
+                self.stage, self.name, round((self.started - trace.started) * 1000, 2),
+                round((ended - self.started) * 1000, 2), error,
+            ))
+        return False
+
+    async def __aenter__(self) -> "span":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        return self.__exit__(exc_type, exc, tb)
+
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per record, with the trace id and any `extra` fields."""
+
+    _RESERVED = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        trace_id = current_trace_id()
+        if trace_id is not None:
+            entry["trace_id"] = trace_id
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging() -> None:
+    """Sends the app's logs to stderr as JSON lines (or plain text with LOG_FORMAT=text)."""
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        handler.setFormatter(StructuredFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL)
+    for name in QUIET_LOGGERS:
+        library = logging.getLogger(name)
+        if library.level == logging.NOTSET:
+            library.setLevel(logging.WARNING)
+
+
+class SamplingProfiler:
+    """
+    Minimal wall-clock sampling profiler.
+
+    A daemon thread records the stacks of every other thread each `interval`
+    seconds and counts them in the collapsed ("folded") format read by
+    flamegraph.pl and speedscope. Because the event loop serves other
+    requests at the same time, a profile shows everything the process did
+    while the request ran.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def save(self, trace_id: str, directory: str = PROFILE_DIR) -> str:
+        """Writes the folded stacks to `<directory>/<trace_id>.folded` and returns the path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{trace_id}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path